@@ -1,6 +1,8 @@
 import argparse
 from builtins import map
+import os
 import re
+import sys
 import glob
 import presto.sifting as sifting
 from operator import itemgetter, attrgetter
@@ -22,6 +24,23 @@ parser.add_argument('-minDM', type=float, default=2.0, help='Lowest DM to consid
 parser.add_argument('-c_pow_threshold', type=float, default=100.0, help='Ignore candidates with a coherent power less than this.\nDefault=100.0')
 parser.add_argument('-harm_pow_cutoff', type=float, default=8.0, help='Ignore any candidates where at least one harmonic does exceed this power.\nDefault=8.0')
 parser.add_argument('-r_err', type=float, default=1.1, help='Consider it the same candidate (in Fourier bins).\nDefault=1.1')
+parser.add_argument('-birds', type=str, default=None, help='PRESTO .birds file of known RFI frequencies to reject candidates at.\nDefault=None')
+parser.add_argument('-workers', type=int, default=1, help='Number of processes used to read the ACCEL files in parallel.\nDefault=1')
+parser.add_argument('--no-cache', action='store_true', help='Do not use (or write) the binary cache of parsed ACCEL files.')
+parser.add_argument('--rebuild-cache', action='store_true', help='Re-parse all ACCEL files and rewrite their binary cache.')
+parser.add_argument('-cache_dir', type=str, default='.sift_cache', help='Directory of the binary cache of parsed ACCEL files.\nDefault=.sift_cache')
+parser.add_argument('-cache_size', type=float, default=4.0, help='Maximum size of the binary cache (GB). Least recently used files are evicted first.\nDefault=4.0')
+parser.add_argument('--profile', action='store_true', help='Time every sifting stage and write the report (stage times, peak memory, candidate and rejection counts) to cands_profile.json next to cands.txt.')
+parser.add_argument('-prometheus', type=str, default=None, help='With --profile, also write the report as a Prometheus textfile with this name.\nDefault=None')
+parser.add_argument('--gzip', action='store_true', help='Write the candidates gzipped, to cands.txt.gz instead of cands.txt.')
+parser.add_argument('-columns', type=str, default=None, help='Also write the candidates as columns to this binary file (.npz, or .parquet if pyarrow is installed).\nDefault=None')
+parser.add_argument('-state', type=str, default=None, help='Sift incrementally: keep the sifting state in this file and only read the ACCEL files not already in it (e.g. as chunks of DM trials finish).\nDefault=None')
+parser.add_argument('--watch', action='store_true', help='Sift while accelsearch is running: read the ACCEL and .inf files as they are finished and keep cands.txt (and the -state file) up to date.')
+parser.add_argument('-cadence', type=float, default=30.0, help='With --watch, the minimum time (s) between updates of cands.txt.\nDefault=30')
+parser.add_argument('-idle', type=float, default=None, help='With --watch, stop once no new files have been finished for this long (s). Otherwise stop with Ctrl-C.\nDefault=None')
+parser.add_argument('-beams', type=str, nargs='+', default=None, help='Sift these ACCEL directories (e.g. the 19 beams of a FAST pointing) in one run, with -workers processes shared by all beams. Writes cands.txt in every directory and a combined report of the signals seen in several beams to multibeam_report.txt.\nDefault=None')
+parser.add_argument('-max_beams', type=int, default=7, help='With -beams, signals seen in more beams than this are rejected as RFI.\nDefault=7')
+parser.add_argument('-beam_dDM', type=float, default=None, help='With -beams, only match detections in different beams whose DMs differ by at most this (pc/cc).\nDefault=None (match frequencies only)')
 
 args = parser.parse_args()
 
@@ -37,31 +56,68 @@ min_num_DMs = args.numDM
 # Lowest DM to consider as a "real" pulsar
 low_DM_cutoff = args.minDM
 # Ignore candidates with a sigma (from incoherent power summation) less than this
-sifting.sigma_threshold = args.minS
+sigma_threshold = args.minS
 # Ignore candidates with a coherent power less than this
-sifting.c_pow_threshold = args.c_pow_threshold
+c_pow_threshold = args.c_pow_threshold
 
 # If the birds file works well, the following shouldn't
 # be needed at all...  If they are, add tuples with the bad
 # values and their errors.
 #                (ms, err)
-sifting.known_birds_p = []
+known_birds_p = []
 #                (Hz, err)
-sifting.known_birds_f = []
+known_birds_f = []
+if args.birds is not None:
+    known_birds_f = sifting.BirdIndex.from_birds_file(args.birds)
 
-# The following are all defined in the sifting module.
-# But if we want to override them, uncomment and do it here.
+# The following all have defaults in the sifting module.
 # You shouldn't need to adjust them for most searches, though.
 
 # How close a candidate has to be to another candidate to 
 # consider it the same candidate (in Fourier bins)
-sifting.r_err = args.r_err
+r_err = args.r_err
 # Shortest period candidates to consider (s)
-sifting.short_period = args.minP / 1000
+short_period = args.minP / 1000
 # Longest period candidates to consider (s)
-sifting.long_period = args.maxP / 1000
+long_period = args.maxP / 1000
 # Ignore any candidates where at least one harmonic does exceed this power
-sifting.harm_pow_cutoff = args.harm_pow_cutoff
+harm_pow_cutoff = args.harm_pow_cutoff
+
+# The sifting parameters (the sifting module globals are left alone)
+config = sifting.SiftConfig(r_err=r_err, short_period=short_period,
+                            long_period=long_period,
+                            sigma_threshold=sigma_threshold,
+                            c_pow_threshold=c_pow_threshold,
+                            harm_pow_cutoff=harm_pow_cutoff,
+                            known_birds_p=known_birds_p,
+                            known_birds_f=known_birds_f)
+
+# Time the sifting stages and write a report next to cands.txt
+if args.profile:
+    sifting.profiler = sifting.SiftProfiler([sifting.StderrHook(),
+                                             sifting.JSONHook('cands_profile.json')])
+    if args.prometheus is not None:
+        sifting.profiler.add_hook(sifting.PrometheusHook(args.prometheus))
+
+if args.watch:
+    sifting.watch_directory('.', 'cands.txt.gz' if args.gzip else 'cands.txt',
+                            args.state, globaccel, globinf, min_num_DMs,
+                            low_DM_cutoff, workers=args.workers,
+                            cadence=args.cadence, idle_timeout=args.idle,
+                            config=config)
+    if sifting.profiler is not None:
+        sifting.profiler.finish()
+    sys.exit(0)
+
+if args.beams is not None:
+    sifting.sift_beams(args.beams, 'cands.txt.gz' if args.gzip else 'cands.txt',
+                       'multibeam_report.txt', globaccel, globinf, min_num_DMs,
+                       low_DM_cutoff, max_beams=args.max_beams,
+                       dm_err=args.beam_dDM, workers=args.workers,
+                       config=config)
+    if sifting.profiler is not None:
+        sifting.profiler.finish()
+    sys.exit(0)
 
 #--------------------------------------------------------------
 
@@ -86,24 +142,54 @@ dmstrs = [x for x, _ in sorted(
     [(s, float(s)) for s in valid_dmstrs], key=lambda t: t[1]
 )]
 
-# Read in all the candidates
-cands = sifting.read_candidates(candfiles)
+# Binary cache of the parsed ACCEL files, so re-sifting with
+# different parameters doesn't re-parse the text files
+if args.no_cache:
+    cache = None
+else:
+    cache = sifting.CandCache(args.cache_dir, maxbytes=int(args.cache_size*1024**3),
+                              rebuild=args.rebuild_cache)
+
+if args.state is not None:
+    # Merge the new ACCEL files into the saved sifting state
+    if os.path.exists(args.state):
+        try:
+            state = sifting.SiftState.load(args.state, config)
+        except ValueError as err:
+            parser.error(str(err))
+        if (state.numdms, state.low_DM_cutoff) != (min_num_DMs, low_DM_cutoff):
+            parser.error("the sift state in %s was made with -numDM %d -minDM %g" % \
+                         (args.state, state.numdms, state.low_DM_cutoff))
+    else:
+        state = sifting.SiftState(min_num_DMs, low_DM_cutoff, config=config)
+    state.add_files(candfiles, dmstrs, workers=args.workers, cache=cache)
+    state.save(args.state)
+    cands = state.candlist()
+else:
+    # Read in all the candidates
+    cands = sifting.read_candidates(candfiles, workers=args.workers, cache=cache,
+                                    config=config)
 
-# Remove candidates that are duplicated in other ACCEL files
-if len(cands):
-    cands = sifting.remove_duplicate_candidates(cands)
+    # Remove candidates that are duplicated in other ACCEL files
+    if len(cands):
+        cands = sifting.remove_duplicate_candidates(cands)
 
-# Remove candidates with DM problems
-if len(cands):
-    cands = sifting.remove_DM_problems(cands, min_num_DMs, dmstrs, low_DM_cutoff)
+    # Remove candidates with DM problems
+    if len(cands):
+        cands = sifting.remove_DM_problems(cands, min_num_DMs, dmstrs, low_DM_cutoff)
 
-# Remove candidates that are harmonically related to each other
-# Note:  this includes only a small set of harmonics
-if len(cands):
-    cands = sifting.remove_harmonics(cands)
+    # Remove candidates that are harmonically related to each other
+    # Note:  this includes only a small set of harmonics
+    if len(cands):
+        cands = sifting.remove_harmonics(cands)
 
 # Write candidates to STDOUT
 if len(cands):
     cands.sort(key=attrgetter('sigma'), reverse=True)
     # sifting.write_candlist(cands)
-    sifting.write_candlist(cands, 'cands.txt')
+    sifting.write_candlist(cands, 'cands.txt.gz' if args.gzip else 'cands.txt')
+    if args.columns is not None:
+        cands.to_columns(args.columns)
+
+if sifting.profiler is not None:
+    sifting.profiler.finish()
@@ -26,6 +26,9 @@ python ""${python_1}"" -ACCEL 320 -minP 2. -maxP 10.8 -rDM 3 -minS 1 -maxS 40 -c
 # Step 2: Generate prepfold commands using parallel Python script
 python3 <<EOF
 import glob
+import sys
+sys.path.insert(0, "${code_path}")
+from dm_index import DMIndex
 from multiprocessing import Pool
 import os
 
@@ -43,6 +46,8 @@ with open(pms_file) as f:
     pms = ["%.4f" % float(x) for x in f.read().split()]
 
 zmax = "${zmax}"
+# One scan of the directory for the .dat and .cand files of every DM
+index = DMIndex(".")
 
 # Function to generate prepfold command
 def generate_command(i):
@@ -50,8 +55,9 @@ def generate_command(i):
         dm = dms[i]
         cand = cands[i]
         pms_i = pms[i]
-        datfile = glob.glob(f"*{dm}*.dat")[0]
-        return f"prepfold -noxwin -nosearch -n 64 -npart 128 -accelcand {cand} -accelfile *{dm}*{zmax}.cand -o Pms{pms_i}-{datfile} {datfile}"
+        datfile = index.first(dm, ".dat")
+        accelfile = index.first(dm, f"{zmax}.cand")
+        return f"prepfold -noxwin -nosearch -n 64 -npart 128 -accelcand {cand} -accelfile {accelfile} -o Pms{pms_i}-{datfile} {datfile}"
     except Exception:
         return None
 
@@ -69,6 +75,9 @@ wait
 # Step 4: Generate image-merging Python commands
 python3 <<EOF
 import glob
+import sys
+sys.path.insert(0, "${code_path}")
+from dm_index import DMIndex
 from multiprocessing import Pool
 import os
 
@@ -81,6 +90,8 @@ with open(cand_file) as f:
     cands = f.read().split()
 
 python_2 = "${python_2}"
+# One scan of the directory for the prepfold plots of every DM
+index = DMIndex(".")
 os.makedirs("./ACCEL/DmSigmaFig", exist_ok=True)
 
 # Function to generate image merge command
@@ -88,7 +99,7 @@ def generate_merge_command(i):
     try:
         dm = dms[i]
         cand = cands[i]
-        fig1 = glob.glob(f"*{dm}*_Cand_{cand}.pfd.png")[0]
+        fig1 = index.first(dm, f"_Cand_{cand}.pfd.png")
         fig2 = f"./ACCEL/DmSigmaFig/{dm}_Cand_{cand}.png"
         return f"python {python_2} {fig1} {fig2} -output {fig1}"
     except Exception:
@@ -1,7 +1,8 @@
 #!/usr/bin/env python
 # @ Dejiang Yin -- 2025/01/04
 import pandas as pd
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 import numpy as np
 from multiprocessing import Pool
 import argparse
@@ -30,6 +31,8 @@ parser.add_argument('-cpu', type=int, default=10, help='Number of processes to u
 parser.add_argument('-c_pow_threshold', type=float, default=100.0, help='Ignore candidates with a coherent power less than this.\nDefault=100.0')
 parser.add_argument('-harm_pow_cutoff', type=float, default=8.0, help='Ignore any candidates where at least one harmonic does exceed this power.\nDefault=8.0')
 parser.add_argument('-r_err', type=float, default=1.1, help='How close a candidate has to be to another candidate to consider it the same candidate (in Fourier bins).\nDefault=1.1')
+parser.add_argument('-txt', action='store_true', help='Also write the sifted candidates to ./ACCEL/cands.txt.\nDefault=False')
+parser.add_argument('-csv', action='store_true', help='Also write the candidate and DM-hit tables to ./ACCEL/Cands.csv and ./ACCEL/Cands_all.csv.\nDefault=False')
 
 args = parser.parse_args()
 
@@ -49,30 +52,38 @@ min_num_DMs = args.numP
 # Lowest DM to consider as a "real" pulsar
 low_DM_cutoff = args.minDM
 # Ignore candidates with a sigma (from incoherent power summation) less than this
-sifting.sigma_threshold = args.minS
+sigma_threshold = args.minS
 # Ignore candidates with a coherent power less than this
-sifting.c_pow_threshold = args.c_pow_threshold
+c_pow_threshold = args.c_pow_threshold
 # How close a candidate has to be to another candidate to consider it the same candidate (in Fourier bins)
-sifting.r_err = args.r_err
+r_err = args.r_err
 # Ignore any candidates where at least one harmonic does exceed this power
-sifting.harm_pow_cutoff = args.harm_pow_cutoff
+harm_pow_cutoff = args.harm_pow_cutoff
 
 # If the birds file works well, the following shouldn't
 # be needed at all...  If they are, add tuples with the bad
 # values and their errors.
 #                (ms, err)
-sifting.known_birds_p = []
+known_birds_p = []
 #                (Hz, err)
-sifting.known_birds_f = []
+known_birds_f = []
 
-# The following are all defined in the sifting module.
-# But if we want to override them, uncomment and do it here.
+# The following all have defaults in the sifting module.
 # You shouldn't need to adjust them for most searches, though.
 
 # Shortest period candidates to consider (s)
-sifting.short_period = args.minP / 1000  # 转换为秒
+short_period = args.minP / 1000  # 转换为秒
 # Longest period candidates to consider (s)
-sifting.long_period = args.maxP / 1000  # 转换为秒
+long_period = args.maxP / 1000  # 转换为秒
+
+# The sifting parameters (the sifting module globals are left alone)
+config = sifting.SiftConfig(r_err=r_err, short_period=short_period,
+                            long_period=long_period,
+                            sigma_threshold=sigma_threshold,
+                            c_pow_threshold=c_pow_threshold,
+                            harm_pow_cutoff=harm_pow_cutoff,
+                            known_birds_p=known_birds_p,
+                            known_birds_f=known_birds_f)
 #--------------------------------------------------------------
 # Try to read the .inf files first, as _if_ they are present, all of
 # them should be there.  (if no candidates are found by accelsearch
@@ -105,7 +116,7 @@ dmstrs = [x for x, _ in sorted(
     [(s, float(s)) for s in valid_dmstrs], key=lambda t: t[1]
 )]
 # Read in all the candidates
-cands = sifting.read_candidates(candfiles)
+cands = sifting.read_candidates(candfiles, config=config)
 # Remove candidates that are duplicated in other ACCEL files
 if len(cands):
     cands = sifting.remove_duplicate_candidates(cands)
@@ -122,139 +133,91 @@ if os.path.exists("ACCEL"):
 os.makedirs("ACCEL")
 os.makedirs("./ACCEL/DmSigmaFig")
 os.makedirs("./ACCEL/ACCEL_fig")
-# Write candidates to STDOUT
+# Sort the candidates by sigma
 if len(cands):
     cands.sort(key=attrgetter('sigma'), reverse=True)
-    # sifting.write_candlist(cands)
-    sifting.write_candlist(cands, './ACCEL/cands.txt')  # add by Dejiang Yin
+    if args.txt:
+        sifting.write_candlist(cands, './ACCEL/cands.txt')  # add by Dejiang Yin
 
 ######----------------------------------------------------------------------------------
-# Process 'cands.txt' to generate 'Cands.txt' with required format
-with open("./ACCEL/cands.txt", "r") as fin, open("./ACCEL/Cands.txt", "w") as fout:
-    for line in fin:
-        # Check if the line contains a time pattern (e.g., 'HH:MM')
-        if re.search(r'\d+:\d+', line):
-            parts = line.strip().split()
-            if len(parts) >= 8:
-                fout.write(f"{parts[7]}_DM{parts[1]} {line}")
-
-# Open and read the contents of 'cands.txt'
-with open('./ACCEL/cands.txt', 'r') as f:
-    lines = f.readlines()
-# Step 1: Remove lines starting with '#' and capture the content after '#'
-filtered_lines = [line for line in lines if not line.startswith('#')]
-# Step 2: Handle the logic similar to AWK for processing 'DM=' lines
-last = ""
-processed_lines = []
-for line in filtered_lines:
-    if 'DM=' in line:
-        processed_lines.append(f"{last}\t{line}")
-    else:
-        processed_lines.append(line)
-        last = f"{line.split()[7]}{line.split()[10]}{line.split()[1]}"
-# Step 3: Remove lines containing '_ACCEL_'
-processed_lines = [line for line in processed_lines if '_ACCEL_' not in line]
-# Step 4: Use regular expressions to remove special characters (e.g., '*', 'DM=', 'SNR=', 'Sigma=')
-processed_lines = [re.sub(r'\*|DM=|SNR=|Sigma=', '', line) for line in processed_lines]
-# Step 5: Replace content inside parentheses with '_DM'
-processed_lines = [re.sub(r'\([^)]*\)', '_DM', line) for line in processed_lines]
-# Write the processed content to 'Cands_all.txt' in the './ACCEL' directory
-with open('./ACCEL/Cands_all.txt', 'w') as f:
-    f.writelines(processed_lines)
-# print("Processing complete. Output saved to './ACCEL'.")
-# read data to plot DM-Sigma or SNR 
-with open('./ACCEL/Cands_all.txt', 'r') as f:
-    lines = f.readlines()
-
-data = []
-for line in lines:
-    row = line.strip().split()
-    data.append(row)
-
-Df = pd.DataFrame(data, columns=['p_DM', 'DM', 'SNR', 'Sigma'])
-Df['DM'] = pd.to_numeric(Df['DM'], errors='coerce')
-Df['Sigma'] = pd.to_numeric(Df['Sigma'], errors='coerce')
-Df['SNR'] = pd.to_numeric(Df['SNR'], errors='coerce')
-Df.to_csv('./ACCEL/Cands_all.csv', index=False)
-#read  all information of  total candidates 
-with open('./ACCEL/Cands.txt', 'r') as f:
-    lines = f.readlines()
-
-data = []
-for line in lines:
-    row = line.strip().split()
-    data.append(row)
-
-df = pd.DataFrame(data, columns=['p_DM','file:candnum', 'DM', 'SNR', 'Sigma', 'numharm', 'ipow', 'cpow', 'P(ms)', 'r', 'z', 'numhits'])
-df.insert(12, 'DM1', 'DM' + df.iloc[:, 2].astype(str))
-
-df[['file','candnum']] = df['file:candnum'].str.split(':', expand=True)
-df.drop('file:candnum', axis=1, inplace=True)
-
-# Name of the new column for zmax
-new_col_name_zmax = 'zmax'
-# Name of the new column for wmax
-new_col_name_wmax = 'wmax'
-# List to store zmax values
-zmax_data = []
-# List to store wmax values
-wmax_data = []
-for index, row in df.iterrows():
-    fire = row['file']
-    firelist = fire.split('_')
-    if args.JERK is None:
-        # If JERK is not provided, take the last part of the split file name as zmax
-        zmax = firelist[-1]
-        # Set wmax to None when there is no JERK
-        wmax = None
+def candlist_to_frames(cands, jerk=False):
+    """Build the table of candidates (df) and the table of the DM hits
+    of all of them (Df) directly from the sifted candidates. A candidate
+    and its hits share the key p_DM, i.e. "<P(ms)>_DM<DM>". The numbers
+    are rounded to the precision they have in cands.txt.
+    """
+    cands = list(cands)
+    numhits = np.fromiter((len(cand.hits) for cand in cands), dtype=np.int64,
+                          count=len(cands))
+    # All the hits, those of each candidate in DM order
+    hits = sifting.sort_hits(cands, numhits, np.ones(len(cands), dtype=bool))
+    Pms = [("%12.6f" % (cand.p*1000)).strip() for cand in cands]
+    DM1 = ["DM" + ("%7.2f" % cand.DM).strip() for cand in cands]
+    p_DM = [p + "_" + dm for p, dm in zip(Pms, DM1)]
+    files = [cand.filename for cand in cands]
+    if jerk:
+        # ..._ACCEL_<zmax>_JERK_<wmax>
+        zmax = [fn.split('_')[-3] for fn in files]
+        wmax = [fn.split('_')[-1] for fn in files]
     else:
-        # If JERK is provided, take the third - last part of the split file name as zmax
-        zmax = firelist[-3]
-        # Take the last part of the split file name as wmax
-        wmax = firelist[-1]
-    zmax_data.append(zmax)
-    wmax_data.append(wmax)
+        zmax = [fn.split('_')[-1] for fn in files]
+        wmax = [None] * len(files)
+    df = pd.DataFrame({
+        'p_DM': p_DM,
+        'DM': np.round([cand.DM for cand in cands], 2),
+        'SNR': np.round([cand.snr for cand in cands], 2),
+        'Sigma': np.round([cand.sigma for cand in cands], 2),
+        'numharm': np.array([cand.numharm for cand in cands], dtype=np.int64),
+        'ipow': np.round([cand.ipow_det for cand in cands], 1),
+        'cpow': np.round([cand.cpow for cand in cands], 1),
+        'P(ms)': np.round([cand.p*1000 for cand in cands], 6),
+        'r': np.round([cand.r for cand in cands], 2),
+        'z': np.round([cand.z for cand in cands], 2),
+        'w': np.round([cand.w for cand in cands], 2),
+        'numhits': numhits,
+        'DM1': DM1,
+        'file': files,
+        'candnum': [repr(cand.candnum) for cand in cands],
+        'zmax': zmax,
+        'wmax': wmax,
+        'p': Pms,
+        'DM2': DM1})
+    Df = pd.DataFrame({
+        'p_DM': np.repeat(np.array(p_DM, dtype=object), numhits),
+        'DM': np.round(hits['DM'], 2),
+        'SNR': np.round(hits['snr'], 2),
+        'Sigma': np.round(hits['sigma'], 2)})
+    return df, Df
 
-# Add zmax column to the DataFrame
-df[new_col_name_zmax] = zmax_data
-# Add wmax column to the DataFrame
-df[new_col_name_wmax] = wmax_data
-# print(df)
-candidate_p = df
-candidate_P = candidate_p.copy()
-#candidate_P.loc[:, ['DM', 'Sigma','SNR']] = candidate_P.loc[:, ['DM', 'Sigma','SNR']].apply(pd.to_numeric)
-candidate_P[['DM', 'Sigma', 'SNR']] = candidate_P[['DM', 'Sigma', 'SNR']].apply(pd.to_numeric)
+# The candidates and all of their DM hits (to plot DM-Sigma or SNR)
+df, Df = candlist_to_frames(cands, jerk=args.JERK is not None)
+if args.csv:
+    Df.to_csv('./ACCEL/Cands_all.csv', index=False)
+    df.to_csv('./ACCEL/Cands.csv', index=False)
 candidate_p_DM = list(df["p_DM"])
-df[['p', 'DM2']] = df['p_DM'].str.split('_', expand=True)
-df.to_csv('./ACCEL/Cands.csv', index=False)
-# print(df)
 ##------------------------------------------------------
 # add another conditons for candidates selection, DM range.
 # This is effective for selecting faint millisecond pulsars with high dispersion measures.
-Df['DM'] = Df['DM'].astype(float)
-CAND = []
-Non_CAND = []
+# The DM span and peak sigma of every p_DM are reduced over all of the hits
+# in one pass, then looked up for each candidate (a candidate without any
+# hits gets NaN and is rejected).
+stats = Df.groupby("p_DM", sort=False).agg(DM_min=("DM", "min"), DM_max=("DM", "max"),
+                                           Sigma_max=("Sigma", "max"))
+stats = stats.reindex(candidate_p_DM)
+select = ((stats["DM_max"] - stats["DM_min"]) <= DM_range) \
+       & (stats["Sigma_max"] <= sigma_max)
+# You can add other conditions to 'select' here.
+select = select.to_numpy()
+CAND = list(np.asarray(candidate_p_DM, dtype=object)[select])
+Non_CAND = list(np.asarray(candidate_p_DM, dtype=object)[~select])
 
-for i in range(len(candidate_p_DM)):
-    if ( (max(Df[Df["p_DM"] == candidate_p_DM[i]].DM) - min(Df[Df["p_DM"] == candidate_p_DM[i]].DM))  <= DM_range ) \
-    and ( max(Df[Df["p_DM"] == candidate_p_DM[i]].Sigma)  <= sigma_max ):
-    # You can add other conditions here.
-        CAND.append(candidate_p_DM[i])
-    else:
-        Non_CAND.append(candidate_p_DM[i])
-
-p = []
-p_DM = []
-dm = []
-cand = []
+# The first row of df for each selected p_DM
+best = df.drop_duplicates("p_DM").set_index("p_DM", drop=False).loc[CAND]
+dm = list(best["DM1"])
+cand = list(best["candnum"])
+p_DM = list(best["p_DM"])
+p = list(best["p"])
 
-for i in CAND:
-    candi = df[df["p_DM"] == i ]
-    dm.append(candi["DM1"].values[0])
-    cand.append(candi["candnum"].values[0])
-    p_DM.append(candi["p_DM"].values[0])
-    p.append(candi["p"].values[0])
-       
 c ={"CAND":cand,
    "DM":dm,
    "p_DM":p_DM,
@@ -281,56 +244,70 @@ Pms_T = Pms.T
 Pms_T.to_csv('./ACCEL/'+str(len(CAND)) +'-ACCEL-Pms.txt',sep=' ',index=0,header=0)
 
 ###  DM - Sigma relation figure
-def generate_plot(i):
-    candidate_ = Df[Df["p_DM"] == CAND[i]]
-    candidate_1 = candidate_.copy()
-    #candidate_1.loc[:, ['DM', 'Sigma','SNR']] = candidate_1.loc[:, ['DM', 'Sigma','SNR']].apply(pd.to_numeric)
-    candidate_1[['DM', 'Sigma', 'SNR']] = candidate_1[['DM', 'Sigma', 'SNR']].apply(pd.to_numeric)
-    candi = candidate_P[candidate_P["p_DM"] == CAND[i]]
-    fig,ax = plt.subplots(1,1,figsize=(10, 3))
-    d = {'DM': candidate_1["DM"], 'Sigma': candidate_1["Sigma"], 'SNR':candidate_1["SNR"]}
-    df = pd.DataFrame(data=d)
-    df = df.sort_values(by='DM', ascending=True)
-    #ax0 = ax.scatter(df['DM'], df['Sigma'], c=df['SNR'], cmap="cool")
-    ax0 = ax.scatter(df['DM'], df['Sigma'], c=df['SNR'], cmap="jet")
-    ax.scatter(df['DM'], df['Sigma'], marker='o', facecolors='none', edgecolors='#000000', s=50,linewidths=1.5)
-    ax.plot(df['DM'], df['Sigma'],color="#791E94")
-    if args.JERK is None:
-   	 ax.axvline(candi["DM"].values[0],c="#791E94",linestyle='--', linewidth=1, \
-               label="DM / sigma: "+str(candi["DM"].values[0])+ " / "+ str(candi["Sigma"].values[0]) + "\n "
-               "period: " + candi["P(ms)"].values[0] + " (ms)\n"
-               "z: " + zmax_data[0] + "; " + "cand: " + candi["candnum"].values[0]+ "\n"
-               "harm: " + candi["numharm"].values[0] + "; " + "FFT'z': " + candi["z"].values[0])
-    else:
-    	ax.axvline(candi["DM"].values[0],c="#791E94",linestyle='--', linewidth=1, \
-               label="DM / sigma: "+str(candi["DM"].values[0])+ " / "+ str(candi["Sigma"].values[0]) + "\n "   
-               "period: " + candi["P(ms)"].values[0] + " (ms)\n"
-               "z / w: " + zmax_data[0] + " / " + wmax_data[0]+ "; " + "cand: " + candi["candnum"].values[0]+ "\n"
-               "harm: " + candi["numharm"].values[0] + "; " + "FFT'z': " + candi["z"].values[0])
-    ax.legend(fontsize=9)
+# Every plotting process draws all of its figures on the one figure made
+# by init_plot_worker(); only the data of its artists change per candidate.
+plot_artists = None
+
+def init_plot_worker():
+    global plot_artists
+    fig = Figure(figsize=(10, 3))
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot(1, 1, 1)
+    ax0 = ax.scatter([0.0], [0.0], c=[0.0], cmap="jet")
+    rings = ax.scatter([0.0], [0.0], marker='o', facecolors='none', edgecolors='#000000', s=50,linewidths=1.5)
+    line, = ax.plot([0.0], [0.0], color="#791E94")
+    vline = ax.axvline(0.0, c="#791E94", linestyle='--', linewidth=1)
     ax.set_xlabel("Trial DM" +" (cm$^{-3}$ pc)", fontsize=9)
     ax.set_ylabel("Sigma",fontsize=9)
     ax.tick_params(direction="in")
     ax.tick_params(axis='y', rotation=90)
     ax.yaxis.set_major_locator(MaxNLocator(nbins=3))
-    # ax.set_xlim(min(candidate_1["DM"])-0.05 ,max(candidate_1["DM"])+0.05)
     cbar = fig.colorbar(ax0, ax=ax, label="SNR",pad = 0.01, fraction=0.05)
-    cbar.set_label(label="SNR", size=9)   
-    plt.savefig("./ACCEL/DmSigmaFig/" +candi["DM1"].values[0]+ "_"+"Cand"+"_" + candi["candnum"].values[0] +".png",bbox_inches="tight",dpi=200 )
-    #plt.savefig("./ACCEL_PCSSP1/DmSigmaFig/" +candidate_P["DM1"][i]+ "_"+"Cand"+"_" + candidate_P["candnum"][i] +".jpg",bbox_inches="tight",dpi=200 )
-    plt.cla()
-    plt.clf()
-    plt.close("all")
+    cbar.set_label(label="SNR", size=9)
+    plot_artists = (fig, ax, ax0, rings, line, vline)
+
+def generate_plot(task):
+    # The hits (in DM order) and the labels of one candidate
+    DMs, sigmas, snrs, DM, label, figname = task
+    fig, ax, ax0, rings, line, vline = plot_artists
+    offsets = np.column_stack((DMs, sigmas))
+    ax0.set_offsets(offsets)
+    ax0.set_array(snrs)
+    ax0.autoscale()
+    rings.set_offsets(offsets)
+    line.set_data(DMs, sigmas)
+    vline.set_xdata([DM, DM])
+    vline.set_label(label)
+    ax.relim()
+    ax.autoscale_view()
+    ax.legend(fontsize=9)
+    fig.savefig(figname, bbox_inches="tight", dpi=200)
+
+def plot_tasks():
+    # The hit rows of each p_DM, grouped once
+    hitrows = Df.groupby("p_DM", sort=False).indices
+    hit_DM = Df["DM"].to_numpy()
+    hit_Sigma = Df["Sigma"].to_numpy()
+    hit_SNR = Df["SNR"].to_numpy()
+    for key, candi in zip(CAND, best.itertuples(index=False)):
+        rows = hitrows[key]
+        rows = rows[np.argsort(hit_DM[rows], kind="stable")]
+        if args.JERK is None:
+            zw = "z: " + candi.zmax
+        else:
+            zw = "z / w: " + candi.zmax + " / " + candi.wmax
+        label = "DM / sigma: "+str(candi.DM)+ " / "+ str(candi.Sigma) + "\n " \
+                "period: " + candi.p + " (ms)\n" + \
+                zw + "; " + "cand: " + candi.candnum + "\n" \
+                "harm: " + str(candi.numharm) + "; " + "FFT'z': " + "%.2f" % candi.z
+        figname = "./ACCEL/DmSigmaFig/" + candi.DM1 + "_"+"Cand"+"_" + candi.candnum +".png"
+        yield (hit_DM[rows], hit_Sigma[rows], hit_SNR[rows], candi.DM, label, figname)
 
 if __name__ == '__main__':
     # Define the number of processes to use
     num_processes = Num_processes  # You can adjust this as needed
-    # Create a pool of processes
-    pool = Pool(processes=num_processes)
-    # Define the range of iterations
-    iterations = range(len(CAND))
-    # Run the function in parallel
-    pool.map(generate_plot, iterations)
-    # Close the pool
-    pool.close()
-    pool.join()
+    # Hand the candidates to the workers a few at a time
+    chunksize = max(1, min(16, len(CAND) // (4 * num_processes)))
+    with Pool(processes=num_processes, initializer=init_plot_worker) as pool:
+        for _ in pool.imap_unordered(generate_plot, plot_tasks(), chunksize=chunksize):
+            pass
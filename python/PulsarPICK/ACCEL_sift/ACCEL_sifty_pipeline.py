@@ -0,0 +1,250 @@
+#!/usr/bin/env python
+# The ACCEL_sifty.bash pipeline (sift -> prepfold -> plot merge -> second sifting)
+# driven from Python.
+#
+# ACCEL_sifty.py sifts all of the ACCEL files first. Then every candidate goes
+# through prepfold, the merging of its prepfold and DM - Sigma plots, and the
+# second sifting on its own, as soon as its previous step is done, on one pool
+# of -cpu processes. Every finished step is written to a checkpoint file, so
+# that an interrupted run can be picked up again with -resume.
+#
+# e.g. python ACCEL_sifty_pipeline.py -ACCEL 320 -minP 2. -maxP 10.8 -rDM 3 -minS 1 -maxS 40 -cpu 45
+import argparse
+import heapq
+import json
+import os
+import shutil
+import subprocess
+import sys
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import pandas as pd
+
+# The PulsarPICK scripts are either all in one directory (the code_path of the
+# bash pipelines) or laid out as in the repository
+code_path = os.path.dirname(os.path.abspath(__file__))
+sys.path[1:1] = [code_path, os.path.dirname(code_path)]
+import combine_plots
+import second_sifting
+from dm_index import DMIndex
+
+# The steps done for each candidate, in order
+stages = ["prepfold", "merge", "second"]
+
+
+def prepfold_cand(cand, datfile, accelfile, prepfold_opts):
+    """Fold one candidate with prepfold.
+    Returns the name of its .pfd file.
+    """
+    outname = "Pms%s-%s" % (cand["Pms"], datfile)
+    cmd = ["prepfold"] + prepfold_opts + ["-accelcand", cand["CAND"], "-accelfile", accelfile,
+                                          "-o", outname, datfile]
+    proc = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                          universal_newlines=True)
+    if proc.returncode:
+        raise RuntimeError("'%s' failed: %s" % (" ".join(cmd), proc.stderr.strip()[-500:]))
+    for search in ("ACCEL", "JERK"):
+        pfd = "%s_%s_Cand_%s.pfd" % (outname, search, cand["CAND"])
+        if os.path.exists(pfd):
+            return pfd
+    raise FileNotFoundError("prepfold made no %s_ACCEL_Cand_%s.pfd" % (outname, cand["CAND"]))
+
+
+def merge_cand(pfd, dmsigma_fig, figdir):
+    """Put the DM - Sigma plot of a candidate under its prepfold plot, in figdir,
+    and move its .bestprof there too (its .pfd and .pfd.ps are deleted).
+    Returns the names of the merged plot and of the .bestprof.
+    """
+    png, bestprof = pfd + ".png", pfd + ".bestprof"
+    fig_png = os.path.join(figdir, os.path.basename(png))
+    fig_bestprof = os.path.join(figdir, os.path.basename(bestprof))
+    # The prepfold plot is only removed once the merged one is written, so
+    # that this can simply be run again after an interruption
+    if os.path.exists(png):
+        if os.path.exists(dmsigma_fig):
+            combine_plots.merge_plots(png, dmsigma_fig, fig_png)
+        else:
+            shutil.copy(png, fig_png)
+    elif not os.path.exists(fig_png):
+        raise FileNotFoundError("No prepfold plot %s" % png)
+    if os.path.exists(bestprof):
+        shutil.move(bestprof, fig_bestprof)
+    for name in (png, pfd, pfd + ".ps"):
+        if os.path.exists(name):
+            os.remove(name)
+    return [fig_png, fig_bestprof]
+
+
+def second_sift_cand(merged, outdir, thresholds):
+    """Score the profile of a candidate and copy its plot to outdir if it passes.
+    Returns the SNR, median and mean judgments and whether it passed.
+    """
+    fig_png, fig_bestprof = merged
+    scores = second_sifting.profile_scores(fig_bestprof)
+    passed = bool(second_sifting.passes(scores, *thresholds))
+    if passed:
+        shutil.copy(fig_png, outdir)
+    return [float(score) for score in scores] + [passed]
+
+
+class Checkpoint(object):
+    """The steps of a run that are done, kept in a file of JSON lines: first the
+    arguments of the run, then one line per (stage, key) with its result.
+    """
+    def __init__(self, filenm, argv, resume=False):
+        self.filenm = filenm
+        self.argv = argv
+        self.done = {}
+        if resume and os.path.exists(filenm):
+            with open(filenm) as f:
+                lines = f.read().splitlines()
+            try:
+                header = json.loads(lines[0])
+            except (IndexError, ValueError):
+                header = {}
+            if header.get("argv") == argv:
+                for line in lines[1:]:
+                    try:
+                        step = json.loads(line)
+                    except ValueError:
+                        # A line cut short when the run was stopped
+                        break
+                    self.done[(step["stage"], step["key"])] = step["result"]
+            else:
+                print("[INFO] %s is from a run with other arguments, starting over." % filenm)
+        self._rewrite()
+
+    def _rewrite(self):
+        tmpfilenm = self.filenm + ".tmp"
+        with open(tmpfilenm, "w") as f:
+            f.write(json.dumps({"argv": self.argv}) + "\n")
+            for (stage, key), result in self.done.items():
+                f.write(json.dumps({"stage": stage, "key": key, "result": result}) + "\n")
+        os.replace(tmpfilenm, self.filenm)
+        self.file = open(self.filenm, "a")
+
+    def reset(self):
+        self.file.close()
+        self.done = {}
+        self._rewrite()
+
+    def record(self, stage, key, result):
+        self.done[(stage, key)] = result
+        self.file.write(json.dumps({"stage": stage, "key": key, "result": result}) + "\n")
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def read_best_candidates(filenm):
+    # The candidates from ACCEL_sifty.py, by "<DM>_Cand_<CAND>"
+    best = pd.read_csv(filenm, dtype=str)
+    cands = {}
+    for row in best.itertuples(index=False):
+        key = "%s_Cand_%s" % (row.DM, row.CAND)
+        cands.setdefault(key, {"CAND": row.CAND, "DM": row.DM, "Pms": "%.4f" % float(row.p)})
+    return cands
+
+
+def main():
+    parser = argparse.ArgumentParser(description='The ACCEL_sifty.bash pipeline: ACCEL_sifty.py, then prepfold, the merging of the plots and the second sifting of each candidate, as soon as it is ready.',
+                                     epilog='Any other arguments are passed on to ACCEL_sifty.py.')
+    parser.add_argument('-ACCEL', type=int, default=20, help='The suffix of accelsearch results files from PRESTO.\nDefault=20')
+    parser.add_argument('-JERK', type=int, default=None, help='The suffix for JERK files.\nDefault=None')
+    parser.add_argument('-cpu', type=int, default=10, help='Number of processes to use (for ACCEL_sifty.py too).\nDefault=10')
+    parser.add_argument('-prepfold', type=str, default='-noxwin -nosearch -n 64 -npart 128', help='The prepfold options (besides -accelcand, -accelfile and -o).\nDefault="-noxwin -nosearch -n 64 -npart 128"')
+    parser.add_argument('-snr', type=float, default=9, help='The second sifting average profile SNR threshold.\nDefault=9')
+    parser.add_argument('-median', type=float, default=10, help='The second sifting average profile median judgment threshold.\nDefault=10')
+    parser.add_argument('-mean', type=float, default=100, help='The second sifting average profile mean judgment threshold.\nDefault=100')
+    parser.add_argument('-resume', action='store_true', help='Skip the steps that a previous run with the same arguments finished.\nDefault=False')
+    parser.add_argument('-checkpoint', type=str, default='ACCEL_sifty_pipeline.ckpt', help='The checkpoint file.\nDefault=ACCEL_sifty_pipeline.ckpt')
+    args, sift_args = parser.parse_known_args()
+
+    zmax = "_ACCEL_%d" % args.ACCEL
+    sift_argv = ["-ACCEL", str(args.ACCEL), "-cpu", str(args.cpu)]
+    if args.JERK is not None:
+        zmax += "_JERK_%d" % args.JERK
+        sift_argv += ["-JERK", str(args.JERK)]
+    sift_argv += sift_args
+    argv = {"sift": sift_argv, "prepfold": args.prepfold,
+            "second": [args.snr, args.median, args.mean]}
+    checkpoint = Checkpoint(args.checkpoint, argv, args.resume)
+
+    # Step 1: sift all of the candidates
+    best_csv = "./ACCEL/best_Candidate.csv"
+    if ("sift", "") in checkpoint.done and os.path.exists(best_csv):
+        print("[INFO] Sifting was done already.")
+    else:
+        # ACCEL_sifty.py makes ./ACCEL anew, so nothing after it is done either
+        checkpoint.reset()
+        subprocess.run([sys.executable, os.path.join(code_path, "ACCEL_sifty.py")] + sift_argv,
+                       check=True)
+        checkpoint.record("sift", "", best_csv)
+    cands = read_best_candidates(best_csv)
+    # The .dat and .cand files of every DM, from one scan of the directory
+    index = DMIndex(".")
+    figdir = "./ACCEL/ACCEL_fig"
+    outdir = os.path.join(figdir, "second_sifting")
+    os.makedirs(outdir, exist_ok=True)
+    prepfold_opts = args.prepfold.split()
+    thresholds = (args.snr, args.median, args.mean)
+
+    def task(stage, key):
+        cand = cands[key]
+        if stage == 0:
+            datfile = index.first(cand["DM"], ".dat")
+            accelfile = index.first(cand["DM"], zmax + ".cand")
+            return prepfold_cand, (cand, datfile, accelfile, prepfold_opts)
+        elif stage == 1:
+            dmsigma_fig = "./ACCEL/DmSigmaFig/%s.png" % key
+            return merge_cand, (checkpoint.done[("prepfold", key)], dmsigma_fig, figdir)
+        else:
+            return second_sift_cand, (checkpoint.done[("merge", key)], outdir, thresholds)
+
+    # Steps 2-4, per candidate: the later a step, the sooner it is run, so
+    # that candidates go all the way through rather than waiting for the
+    # others at each step
+    ready = []
+    for order, key in enumerate(cands):
+        for stage, name in enumerate(stages):
+            if (name, key) not in checkpoint.done:
+                heapq.heappush(ready, (-stage, order, key))
+                break
+    failed = []
+    inflight = {}
+    with ProcessPoolExecutor(max_workers=args.cpu) as pool:
+        while ready or inflight:
+            while ready and len(inflight) < args.cpu:
+                negstage, order, key = heapq.heappop(ready)
+                try:
+                    fn, fnargs = task(-negstage, key)
+                except FileNotFoundError as err:
+                    print("[WARNING] %s of %s failed: %s" % (stages[-negstage], key, err))
+                    failed.append((stages[-negstage], key))
+                    continue
+                inflight[pool.submit(fn, *fnargs)] = (-negstage, order, key)
+            finished, _ = wait(inflight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                stage, order, key = inflight.pop(future)
+                try:
+                    result = future.result()
+                except Exception as err:
+                    print("[WARNING] %s of %s failed: %s" % (stages[stage], key, err))
+                    failed.append((stages[stage], key))
+                    continue
+                checkpoint.record(stages[stage], key, result)
+                if stage + 1 < len(stages):
+                    heapq.heappush(ready, (-(stage + 1), order, key))
+    checkpoint.close()
+
+    numpassed = sum(checkpoint.done.get(("second", key), [False])[-1] for key in cands)
+    print("The numbers of candidate: %d" % len(cands))
+    print("The numbers of candidate after the second sifting: %d" % numpassed)
+    if failed:
+        print("[WARNING] %d steps failed; run again with -resume to retry them." % len(failed))
+    print("[INFO] All steps completed.")
+
+
+if __name__ == '__main__':
+    main()
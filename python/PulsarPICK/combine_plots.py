@@ -47,26 +47,21 @@ def vertical_merge_images(image1, image2):
     new_image.paste(image2, (0, height1))
     return new_image
 
-def main():
-    parser = argparse.ArgumentParser(description='Vertically merge two images and crop the first image if needed')
-    parser.add_argument('input_images', nargs=2, help='Paths of the two input images, in the order of [image1, image2]')
-    parser.add_argument('-output', required=True, help='Path of the output merged image')
-    parser.add_argument('-top', type=float, default=0.08, help='Percentage of cropping for the top side of the first image (default value: 0.08)')
-    parser.add_argument('-bottom', type=float, default=0.006, help='Percentage of cropping for the bottom side of the first image (default value: 0.006)')
-    parser.add_argument('-left', type=float, default=0.03, help='Percentage of cropping for the left side of the first image (default value: 0.03)')
-    parser.add_argument('-right', type=float, default=0.12, help='Percentage of cropping for the right side of the first image (default value: 0.12)')
-    args = parser.parse_args()
-    image_path1, image_path2 = args.input_images
-    output_path = args.output
-    top_percent_1 = args.top
-    bottom_percent_1 = args.bottom
-    left_percent_1 = args.left
-    right_percent_1 = args.right
+def merge_plots(image_path1, image_path2, output_path, top_percent=0.08, bottom_percent=0.006,
+                left_percent=0.03, right_percent=0.12):
+    """
+    Crop the first image, scale the second one to its width and save them merged vertically.
+    Args:
+        image_path1 (str): Path of the first (upper) image, e.g. the prepfold plot.
+        image_path2 (str): Path of the second (lower) image, e.g. the DM - Sigma plot.
+        output_path (str): Path of the output merged image (it may be image_path1).
+        top_percent, bottom_percent, left_percent, right_percent (float): The cropping of the first image.
+    """
     # Open the images
     image1 = Image.open(image_path1)
     image2 = Image.open(image_path2)
     # Crop the first image according to the percentage
-    image1 = crop_image_by_percentage(image1, top_percent_1, bottom_percent_1, left_percent_1, right_percent_1)
+    image1 = crop_image_by_percentage(image1, top_percent, bottom_percent, left_percent, right_percent)
     # Get the width of the cropped first image
     target_width = image1.width
     # Resize the second image to have the same width as the first image and scale the height proportionally
@@ -77,6 +72,18 @@ def main():
     merged_image = vertical_merge_images(image1, image2)
     # Save the merged image
     merged_image.save(output_path)
+
+def main():
+    parser = argparse.ArgumentParser(description='Vertically merge two images and crop the first image if needed')
+    parser.add_argument('input_images', nargs=2, help='Paths of the two input images, in the order of [image1, image2]')
+    parser.add_argument('-output', required=True, help='Path of the output merged image')
+    parser.add_argument('-top', type=float, default=0.08, help='Percentage of cropping for the top side of the first image (default value: 0.08)')
+    parser.add_argument('-bottom', type=float, default=0.006, help='Percentage of cropping for the bottom side of the first image (default value: 0.006)')
+    parser.add_argument('-left', type=float, default=0.03, help='Percentage of cropping for the left side of the first image (default value: 0.03)')
+    parser.add_argument('-right', type=float, default=0.12, help='Percentage of cropping for the right side of the first image (default value: 0.12)')
+    args = parser.parse_args()
+    image_path1, image_path2 = args.input_images
+    merge_plots(image_path1, image_path2, args.output, args.top, args.bottom, args.left, args.right)
     # print(f"Image has been saved to {output_path}")
 if __name__ == "__main__":
     main()
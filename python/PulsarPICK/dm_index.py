@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+# Look up the files of each trial DM (.dat, .cand, prepfold plots, ...) from one
+# scan of a directory, instead of globbing "*DM1.00*" for every candidate.
+# A file belongs to a DM only if its DM token is exactly that DM, so DM1.00
+# does not pick up the files of DM11.00 or DM1.005.
+import os
+import re
+
+# "DM" and the number after it, e.g. the DM30.10 of M13_20181006_s1_1-140fits_DM30.10_red.dat
+dm_re = re.compile(r"DM(\d+(?:\.\d+)?)")
+
+def dm_token(name):
+    """
+    The DM token of a file name, e.g. 'DM30.10' (the last one if there are several).
+    Returns None if there is none.
+    """
+    tokens = dm_re.findall(name)
+    if tokens:
+        return "DM" + tokens[-1]
+    return None
+
+class DMIndex(object):
+    """
+    The names of the files in a directory, by their DM token.
+    Args:
+        path (str): The directory to index (default: the current one).
+    """
+    def __init__(self, path="."):
+        self.path = path
+        self.files = {}
+        with os.scandir(path) as entries:
+            for entry in entries:
+                dm = dm_token(entry.name)
+                if dm is not None:
+                    self.files.setdefault(dm, []).append(entry.name)
+        for names in self.files.values():
+            names.sort()
+
+    def find(self, dm, suffix=""):
+        """
+        The names (sorted, relative to the directory) of the files of one DM ending with suffix.
+        Args:
+            dm (str): The DM, e.g. 'DM30.10' (or '30.10').
+            suffix (str): e.g. '.dat', '_ACCEL_20.cand' or '_Cand_7.pfd.png'.
+        """
+        if not dm.startswith("DM"):
+            dm = "DM" + dm
+        return [name for name in self.files.get(dm, []) if name.endswith(suffix)]
+
+    def first(self, dm, suffix=""):
+        """
+        The first of find(dm, suffix), as the bash pipelines pick it.
+        Raises FileNotFoundError if there is none.
+        """
+        names = self.find(dm, suffix)
+        if not names:
+            raise FileNotFoundError("No file of %s ending with '%s' in %s" % (dm, suffix, self.path))
+        return names[0]
@@ -0,0 +1,512 @@
+#!/usr/bin/env python
+# Benchmarks for the candidate sifting routines in sifting.py
+#
+# Writes a synthetic survey (one .inf and one ACCEL/JERK file per DM
+# trial, with noise candidates, injected pulsars and their harmonics,
+# and RFI birdies) and times every stage of the ACCEL_sift.py flow.
+# The results are written as JSON so they can be compared between
+# versions (-compare) and between candidate reading engines (-engines).
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from operator import attrgetter
+import numpy as np
+import sifting
+
+# Layout of the PRESTO accelsearch text output
+fund_header = \
+"""             Summed  Coherent  Num        Period          Frequency         FFT 'r'        Freq Deriv       FFT 'z'         Accel
+Cand  Sigma   Power    Power   Harm        (ms)              (Hz)            (bin)          (Hz/s)          (bins)         (m/s^2)      Notes
+-----------------------------------------------------------------------------------------------------------------------------------------------------------
+"""
+harm_header = \
+"""
+                  Power /          Raw           FFT 'r'          Pred 'r'       FFT 'z'     Pred 'z'     FFT 'w'      Phase       Centroid     Purity
+Cand    Harm  Loc Pow    Power             (bin)            (bin)          (bins)      (bins)      (bins)       (rad)        (0-1)        <p> = 1
+-----------------------------------------------------------------------------------------------------------------------------------------------------------
+"""
+inf_template = \
+""" Data file name without suffix          =  %(basenm)s
+ Telescope used                         =  Synthetic
+ Instrument used                        =  sift_bench
+ Object being observed                  =  Synthetic
+ J2000 Right Ascension (hh:mm:ss.ssss)  =  00:00:00.0000
+ J2000 Declination     (dd:mm:ss.ssss)  =  00:00:00.0000
+ Data observed by                       =  Unknown
+ Epoch of observation (MJD)             =  60000.000000000000000
+ Barycentered?           (1=yes, 0=no)  =  0
+ Number of bins in the time series      =  %(numsamp)d
+ Width of each time series bin (sec)    =  %(dt).10g
+ Any breaks in the data? (1=yes, 0=no)  =  0
+ Type of observation (EM band)          =  Radio
+ Beam diameter (arcsec)                 =  180
+ Dispersion measure (cm-3 pc)           =  %(DM).2f
+ Central freq of low channel (MHz)      =  1000
+ Total bandwidth (MHz)                  =  500
+ Number of channels                     =  4096
+ Channel bandwidth (MHz)                =  0.1220703125
+ Data analyzed by                       =  sift_bench.py
+ Any additional notes:
+    Synthetic time series for benchmarking
+
+"""
+
+# Modules sifting should not import until they are needed
+deferred_modules = ["matplotlib", "presto"]
+
+# The stages of the ACCEL_sift.py flow, in order
+stages = ["read_candidates", "remove_duplicate_candidates",
+          "remove_DM_problems", "remove_harmonics", "write_candlist"]
+
+
+def write_accel_file(filenm, rs, zs, harm_pows, harm_phases, ws=None,
+                     numsamp=2**23, dt=6.4e-5):
+    """Write a synthetic ACCEL (or, if ws is given, JERK) file.
+
+        Inputs:
+            filenm: The name of the file to write.
+            rs: Fourier frequencies (bins) of the candidates.
+            zs: Fourier f-dots (bins) of the candidates.
+            harm_pows: A list with an array of harmonic powers
+                for each candidate.
+            harm_phases: A list with an array of harmonic phases
+                for each candidate.
+            ws: Fourier f-dot-dots (bins) of the candidates.
+                (Default: write an ACCEL file without 'w')
+            numsamp: Number of samples in the time series.
+                (Default: 2**23)
+            dt: Sample time (s). (Default: 64 us)
+
+        Output:
+            None
+    """
+    T = numsamp*dt
+    out = [fund_header]
+    for ii, (r, z, pows) in enumerate(zip(rs, zs, harm_pows)):
+        f = r/T
+        wstr = "" if ws is None else "%10.1f(5)  " % ws[ii]
+        out.append("%-7d%7.2f%10.2f%9.2f%4d  %13.6f(12)  %13.6f(9)  "
+                   "%13.2f(3)  %.2f(19)e-05  %9.2f(19)  %s%7.2f(2)\n" %
+                   (ii+1, 2.0+np.sum(pows)/10.0, np.sum(pows),
+                    np.max(pows)*1.5, len(pows), 1000.0/f, f, r,
+                    z/T**2*1e5, z, wstr, z/T))
+    out.append(harm_header)
+    for ii, (r, z, pows, phases) in \
+            enumerate(zip(rs, zs, harm_pows, harm_phases)):
+        for jj, (pow, phase) in enumerate(zip(pows, phases)):
+            candstr = " %-4d" % (ii+1) if jj == 0 else "     "
+            w = 0.0 if ws is None else ws[ii]
+            out.append("%s  %-4d  %8.2f  %10.2f(13)  %13.2f(33)  %13.2f  "
+                       "%7.1f(19)  %7.1f  %7.1f(5)  %6.2f(13)  0.50(1)  "
+                       "1.02\n" % (candstr, jj+1, pow/2.0, pow, r*(jj+1),
+                                   r*(jj+1), z*(jj+1), z*(jj+1), w*(jj+1),
+                                   phase))
+    out.append("\n\n Number of bins in the time series              =  %d\n"
+               % numsamp)
+    out.append(" Width of each time series bin (sec)            =  %.10g\n"
+               % dt)
+    out.append(" Total time of the observation (sec)            =  %.10g\n"
+               % T)
+    with open(filenm, "w") as accelfile:
+        accelfile.writelines(out)
+
+
+def write_inf_file(filenm, DM, numsamp=2**23, dt=6.4e-5):
+    """Write a PRESTO .inf file for a synthetic dedispersed time series.
+
+        Inputs:
+            filenm: The name of the file to write (ending in '.inf').
+            DM: The DM of the time series.
+            numsamp: Number of samples in the time series.
+                (Default: 2**23)
+            dt: Sample time (s). (Default: 64 us)
+
+        Output:
+            None
+    """
+    basenm = os.path.basename(filenm)[:-len(".inf")]
+    with open(filenm, "w") as inffile:
+        inffile.write(inf_template % {'basenm': basenm, 'numsamp': numsamp,
+                                      'dt': dt, 'DM': DM})
+
+
+def random_accel_file(filenm, numcands, jerk=False, seed=0):
+    """Write an ACCEL/JERK file with 'numcands' random candidates.
+    """
+    rng = np.random.default_rng(seed)
+    numharms = rng.choice([1, 2, 4, 8, 16], numcands)
+    harm_pows = [rng.exponential(5.0, numharm) + 1.0 for numharm in numharms]
+    harm_phases = [rng.uniform(-np.pi, np.pi, numharm) for numharm in numharms]
+    ws = rng.normal(0.0, 50.0, numcands) if jerk else None
+    write_accel_file(filenm, rng.uniform(100.0, 1e6, numcands),
+                     rng.normal(0.0, 20.0, numcands), harm_pows,
+                     harm_phases, ws)
+
+
+def random_pulsars(numpulsars, DMs, rng):
+    """Return 'numpulsars' random pulsars to inject, as a list of
+        dictionaries with their spin frequency (Hz), DM, fundamental
+        power, number of harmonics and DM width of their detections.
+    """
+    dDM = DMs[1] - DMs[0] if len(DMs) > 1 else 1.0
+    pulsars = []
+    for ii in range(numpulsars):
+        pulsars.append({'f': float(10.0**rng.uniform(-0.5, 2.7)),
+                        'DM': float(rng.uniform(DMs[0], DMs[-1])),
+                        'pow': float(rng.uniform(20.0, 200.0)),
+                        'numharm': int(rng.choice([2, 4, 8, 16])),
+                        'width': float(rng.uniform(2.0, 10.0)*dDM)})
+    return pulsars
+
+
+def synthetic_survey(outdir, DMs, numcands=200, harms=(1, 2, 4, 8, 16),
+                     pulsars=(), birdies=(), zmax=20, wmax=None,
+                     numsamp=2**23, dt=6.4e-5, basenm="bench", seed=0):
+    """Write the .inf and ACCEL (or JERK) files of a synthetic search.
+
+        Inputs:
+            outdir: Directory to write the files in.
+            DMs: The DM trials.
+            numcands: Number of noise candidates per ACCEL file.
+                (Default: 200)
+            harms: The numbers of harmonics noise candidates can have.
+                (Default: 1, 2, 4, 8 and 16)
+            pulsars: Pulsars to inject, as returned by random_pulsars().
+                Each one is detected (with its harmonics summed) in the
+                DM trials around its DM, together with candidates at
+                twice and half its frequency. (Default: none)
+            birdies: Frequencies (Hz) of RFI birdies to inject. They
+                are detected at every DM with the same power.
+                (Default: none)
+            zmax: The zmax of the search (the ACCEL file suffix).
+                (Default: 20)
+            wmax: The wmax of the search. If not None, JERK files are
+                written. (Default: None)
+            numsamp: Number of samples in the time series.
+                (Default: 2**23)
+            dt: Sample time (s). (Default: 64 us)
+            basenm: Base name of the files. (Default: "bench")
+            seed: Seed of the random number generator. (Default: 0)
+
+        Output:
+            candfiles: The names of the ACCEL files written.
+            inffiles: The names of the .inf files written.
+    """
+    rng = np.random.default_rng(seed)
+    T = numsamp*dt
+    suffix = "_ACCEL_%d" % zmax
+    if wmax is not None:
+        suffix += "_JERK_%d" % wmax
+    candfiles, inffiles = [], []
+    for DM in DMs:
+        rs = list(rng.uniform(0.1*T, 0.5/dt*T, numcands))
+        zs = list(rng.normal(0.0, zmax/3.0 + 1e-3, numcands))
+        numharms = rng.choice(harms, numcands)
+        harm_pows = [rng.exponential(5.0, numharm) + 1.0
+                     for numharm in numharms]
+        for psr in pulsars:
+            scale = np.exp(-0.5*((DM - psr['DM'])/psr['width'])**2)
+            if psr['pow']*scale < 5.0:
+                continue
+            numharm = psr['numharm']
+            pows = psr['pow']*scale/np.arange(1.0, numharm+1.0)**0.5 + 1.0
+            z = rng.normal(0.0, 0.5)
+            # The pulsar and two of its harmonically related candidates
+            for factor, numh, pscale in [(1.0, numharm, 1.0),
+                                         (2.0, max(numharm//2, 1), 0.6),
+                                         (0.5, min(numharm*2, 16), 0.4)]:
+                rs.append(psr['f']*factor*T + rng.normal(0.0, 0.1))
+                zs.append(z*factor)
+                harm_pows.append(np.resize(pows*pscale, numh) + 1.0)
+        for fbird in birdies:
+            rs.append(fbird*T + rng.normal(0.0, 0.05))
+            zs.append(0.0)
+            harm_pows.append(np.array([rng.uniform(80.0, 120.0)]))
+        # accelsearch lists the candidates in decreasing sigma
+        isort = np.argsort([-np.sum(pows) for pows in harm_pows],
+                           kind='stable')
+        harm_pows = [harm_pows[ii] for ii in isort]
+        harm_phases = [rng.uniform(-np.pi, np.pi, len(pows))
+                       for pows in harm_pows]
+        ws = None
+        if wmax is not None:
+            ws = rng.normal(0.0, wmax/3.0 + 1e-3, len(isort))
+        filenm = os.path.join(outdir, "%s_DM%.2f" % (basenm, DM))
+        write_inf_file(filenm + ".inf", DM, numsamp, dt)
+        write_accel_file(filenm + suffix, np.asarray(rs)[isort],
+                         np.asarray(zs)[isort], harm_pows, harm_phases,
+                         ws, numsamp, dt)
+        candfiles.append(filenm + suffix)
+        inffiles.append(filenm + ".inf")
+    return candfiles, inffiles
+
+
+def bench_parse(filenm, repeat=3):
+    """Time candlist_from_candfile against the single-pass
+        columnar_candlist_from_candfile parser for one file.
+
+        Output:
+            times: Dictionary of the best time (s) for each parser.
+    """
+    times = {}
+    for name, parser in [("candlist_from_candfile",
+                          sifting.candlist_from_candfile),
+                         ("columnar_candlist_from_candfile",
+                          sifting.columnar_candlist_from_candfile)]:
+        best = np.inf
+        for ii in range(repeat):
+            start = time.perf_counter()
+            parser(filenm)
+            best = min(best, time.perf_counter() - start)
+        times[name] = best
+    return times
+
+
+def bench_import(repeat=5):
+    """Time 'import sifting' in fresh interpreters.
+
+        Inputs:
+            repeat: Number of interpreters to start (the best time
+                is kept). (Default: 5)
+
+        Outputs:
+            seconds: The best import time (s).
+            loaded: Those of deferred_modules that the import loaded.
+    """
+    code = "import sys, time\n" \
+           "start = time.perf_counter()\n" \
+           "import sifting\n" \
+           "seconds = time.perf_counter() - start\n" \
+           "print(seconds, ' '.join(name for name in %r\n" \
+           "                        if name in sys.modules))" % deferred_modules
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        [os.path.dirname(os.path.abspath(sifting.__file__))] +
+        ([env["PYTHONPATH"]] if env.get("PYTHONPATH") else []))
+    best, loaded = np.inf, []
+    for ii in range(repeat):
+        out = subprocess.check_output([sys.executable, "-c", code],
+                                      env=env).decode().split()
+        best = min(best, float(out[0]))
+        loaded = out[1:]
+    return best, loaded
+
+
+def bench_flow(candfiles, dmstrs, outfilenm, min_num_DMs=2,
+               low_DM_cutoff=2.0, read_kwargs={}):
+    """Run (and time) the stages of the ACCEL_sift.py flow once.
+
+        Inputs:
+            candfiles: The ACCEL files to sift.
+            dmstrs: The DMs searched (as strings).
+            outfilenm: The name of the candidate file to write.
+            min_num_DMs: In how many DMs a candidate must be detected.
+                (Default: 2)
+            low_DM_cutoff: Lowest DM to consider as a "real" pulsar.
+                (Default: 2.0)
+            read_kwargs: Extra keyword arguments of read_candidates.
+                (Default: none)
+
+        Outputs:
+            times: Dictionary of the time (s) of each stage.
+            counts: Dictionary of the number of candidates left after
+                each stage.
+    """
+    times, counts = {}, {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        cands = sifting.read_candidates(candfiles, **read_kwargs)
+        times["read_candidates"] = time.perf_counter() - start
+        counts["read_candidates"] = len(cands)
+        for stage, args in [("remove_duplicate_candidates", ()),
+                            ("remove_DM_problems",
+                             (min_num_DMs, dmstrs, low_DM_cutoff)),
+                            ("remove_harmonics", ())]:
+            start = time.perf_counter()
+            if len(cands):
+                cands = getattr(sifting, stage)(cands, *args)
+            times[stage] = time.perf_counter() - start
+            counts[stage] = len(cands)
+        start = time.perf_counter()
+        if len(cands):
+            cands.sort(key=attrgetter('sigma'), reverse=True)
+            sifting.write_candlist(cands, outfilenm)
+        times["write_candlist"] = time.perf_counter() - start
+        counts["write_candlist"] = len(cands)
+    return times, counts
+
+
+def code_version():
+    """Return the git revision of the sifting code (if available).
+    """
+    try:
+        return subprocess.check_output(
+                    ["git", "describe", "--always", "--dirty"],
+                    cwd=os.path.dirname(os.path.abspath(sifting.__file__)),
+                    stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare_results(old, new):
+    """Print the per-stage speed-up of 'new' relative to 'old'
+        (both benchmark results as written to JSON) for each
+        engine they share.
+    """
+    for engine in new["engines"]:
+        if engine not in old["engines"]:
+            continue
+        print("%s (%s -> %s)" % (engine, old["version"], new["version"]))
+        for stage in stages + ["total"]:
+            told = old["engines"][engine]["times"][stage]
+            tnew = new["engines"][engine]["times"][stage]
+            print("  %-28s %9.4f s %9.4f s %8.2fx" %
+                  (stage, told, tnew, told/tnew if tnew else np.inf))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the stages of ACCEL_sift.py on a synthetic search and write the timings as JSON.')
+    parser.add_argument('-numDMs', type=int, default=100, help='Number of DM trials.\nDefault=100')
+    parser.add_argument('-loDM', type=float, default=0.0, help='Lowest DM trial.\nDefault=0.0')
+    parser.add_argument('-dDM', type=float, default=0.5, help='DM step.\nDefault=0.5')
+    parser.add_argument('-numcands', type=int, default=200, help='Number of noise candidates per ACCEL file.\nDefault=200')
+    parser.add_argument('-harms', type=str, default="1,2,4,8,16", help='Comma separated numbers of harmonics noise candidates can have.\nDefault=1,2,4,8,16')
+    parser.add_argument('-pulsars', type=int, default=5, help='Number of pulsars to inject.\nDefault=5')
+    parser.add_argument('-birdies', type=int, default=3, help='Number of RFI birdies to inject.\nDefault=3')
+    parser.add_argument('-ACCEL', type=int, default=20, help='zmax of the synthetic search (the ACCEL file suffix).\nDefault=20')
+    parser.add_argument('-JERK', type=int, default=None, help='wmax of the synthetic search. If given, JERK files are written.\nDefault=None')
+    parser.add_argument('-numsamp', type=int, default=2**23, help='Number of samples in the time series.\nDefault=8388608')
+    parser.add_argument('-dt', type=float, default=6.4e-5, help='Sample time (s).\nDefault=6.4e-5')
+    parser.add_argument('-seed', type=int, default=0, help='Seed of the random number generator.\nDefault=0')
+    parser.add_argument('-engines', type=str, default="candlist,columnar", help='Comma separated candidate reading engines to time: candlist, columnar, parallel (-workers processes) and cached (warm binary cache).\nDefault=candlist,columnar')
+    parser.add_argument('-workers', type=int, default=os.cpu_count(), help='Number of processes of the parallel engine.\nDefault=number of CPUs')
+    parser.add_argument('-repeat', type=int, default=3, help='Number of times the flow is run for each engine (the best time of each stage is kept).\nDefault=3')
+    parser.add_argument('-parse', action='store_true', help='Also time the two ACCEL file parsers on the largest file.')
+    parser.add_argument('-dir', type=str, default=None, help='Write the synthetic files to (and keep them in) this directory.\nDefault=a temporary directory')
+    parser.add_argument('-o', type=str, default="sift_bench.json", help='Name of the JSON file to write.\nDefault=sift_bench.json')
+    parser.add_argument('-import_budget', type=float, default=0.5, help='Fail if importing sifting takes longer than this (s), or if it imports matplotlib or presto.\nDefault=0.5')
+    parser.add_argument('-startup', action='store_true', help='Only run the import time (startup) benchmark.')
+    parser.add_argument('-compare', type=str, default=None, help='JSON file of an earlier run to compare against.\nDefault=None')
+    args = parser.parse_args()
+
+    # The ACCEL_sift.py defaults
+    sifting.sigma_threshold = 4.0
+    sifting.c_pow_threshold = 100.0
+    sifting.harm_pow_cutoff = 8.0
+    sifting.r_err = 1.1
+    sifting.short_period = 0.0005
+    sifting.long_period = 15.0
+
+    # Startup: sift jobs are short, so the import has to be cheap
+    import_seconds, loaded = bench_import(args.repeat)
+    print("import sifting: %.3f s (budget %.3f s)" %
+          (import_seconds, args.import_budget))
+    if loaded:
+        raise AssertionError("importing sifting loaded %s" % ", ".join(loaded))
+    if import_seconds > args.import_budget:
+        raise AssertionError("importing sifting took %.3f s (> %.3f s)" %
+                             (import_seconds, args.import_budget))
+    if args.startup:
+        return
+
+    rng = np.random.default_rng(args.seed)
+    DMs = args.loDM + args.dDM*np.arange(args.numDMs)
+    T = args.numsamp*args.dt
+    pulsars = random_pulsars(args.pulsars, DMs, rng)
+    birdies = list(rng.uniform(1.0, 0.25/args.dt, args.birdies))
+    harms = [int(numharm) for numharm in args.harms.split(",")]
+    engines = args.engines.split(",")
+
+    with contextlib.ExitStack() as stack:
+        if args.dir is None:
+            outdir = stack.enter_context(tempfile.TemporaryDirectory())
+        else:
+            outdir = args.dir
+            if not os.path.isdir(outdir):
+                os.makedirs(outdir)
+        start = time.perf_counter()
+        candfiles, inffiles = synthetic_survey(outdir, DMs, args.numcands,
+                                               harms, pulsars, birdies,
+                                               args.ACCEL, args.JERK,
+                                               args.numsamp, args.dt,
+                                               seed=args.seed)
+        print("Wrote %d ACCEL files in %.1f s" %
+              (len(candfiles), time.perf_counter() - start))
+        dmstrs = ['%.2f' % DM for DM in DMs]
+
+        results = {"version": code_version(),
+                   "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                   "python": platform.python_version(),
+                   "numpy": np.__version__,
+                   "machine": platform.machine(),
+                   "cpus": os.cpu_count(),
+                   "import_seconds": import_seconds,
+                   "config": {"numDMs": args.numDMs, "loDM": args.loDM,
+                              "dDM": args.dDM, "numcands": args.numcands,
+                              "harms": harms, "pulsars": pulsars,
+                              "birdies": birdies, "zmax": args.ACCEL,
+                              "wmax": args.JERK, "numsamp": args.numsamp,
+                              "dt": args.dt, "T": T, "seed": args.seed,
+                              "repeat": args.repeat,
+                              "numfiles": len(candfiles),
+                              "numbytes": sum(os.path.getsize(filenm)
+                                              for filenm in candfiles)},
+                   "engines": {}}
+        for engine in engines:
+            if engine == "candlist":
+                read_kwargs = {}
+            elif engine == "columnar":
+                read_kwargs = {"columnar": True}
+            elif engine == "parallel":
+                read_kwargs = {"workers": args.workers}
+            elif engine == "cached":
+                cachedir = os.path.join(outdir, ".sift_cache")
+                read_kwargs = {"cache": sifting.CandCache(cachedir)}
+            else:
+                parser.error("unknown engine '%s'" % engine)
+            best, counts = {}, None
+            for ii in range(args.repeat):
+                times, counts = bench_flow(candfiles, dmstrs,
+                                           os.path.join(outdir, "cands.txt"),
+                                           read_kwargs=read_kwargs)
+                for stage in stages:
+                    best[stage] = min(best.get(stage, np.inf), times[stage])
+            best["total"] = sum(best[stage] for stage in stages)
+            results["engines"][engine] = {"times": best, "counts": counts}
+        if args.parse:
+            largest = max(candfiles, key=os.path.getsize)
+            results["parse"] = bench_parse(largest, args.repeat)
+
+    with open(args.o, "w") as jsonfile:
+        json.dump(results, jsonfile, indent=2)
+
+    baseline = engines[0]
+    print("%d DMs x %d candidates, %d pulsars, %d birdies (best of %d)" %
+          (args.numDMs, args.numcands, args.pulsars, args.birdies,
+           args.repeat))
+    for engine in engines:
+        print(engine)
+        for stage in stages + ["total"]:
+            tbest = results["engines"][engine]["times"][stage]
+            tbase = results["engines"][baseline]["times"][stage]
+            count = results["engines"][engine]["counts"].get(stage, "")
+            print("  %-28s %9.4f s %8.2fx %8s" %
+                  (stage, tbest, tbase/tbest if tbest else np.inf, count))
+    if "parse" in results:
+        for name, tbest in results["parse"].items():
+            print("  %-32s %8.3f s" % (name, tbest))
+    print("Wrote %s" % args.o)
+    if args.compare is not None:
+        with open(args.compare) as jsonfile:
+            compare_results(json.load(jsonfile), results)
+
+
+if __name__ == '__main__':
+    main()
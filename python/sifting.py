@@ -2,13 +2,13 @@
 from builtins import zip, str, range, object
 from operator import attrgetter
 import sys, re, os, copy
+import struct
+import contextlib, functools, json, time
 import numpy as np
-import matplotlib
-import matplotlib.pyplot as plt
 import os.path
 import glob
-from presto import infodata
-from presto.presto import candidate_sigma
+# Note: matplotlib (see sifting_plot.py) and presto are only
+#       imported when they are first needed
 
 # Note: the following are global variables that can
 #       (and should) be set in whatever module
@@ -28,19 +28,53 @@ sigma_threshold = 6.0
 c_pow_threshold = 100.0
 # Ignore any candidates where at least one harmonic does not exceed this power
 harm_pow_cutoff = 8.0
+# Accuracy of the candidate sigmas, which are interpolated from tables
+# of candidate_sigma (see SigmaTable). If None, call candidate_sigma
+# for every candidate
+sigma_tol = 1e-6
 
 # If the birds file works well, the following shouldn't
-# be needed at all...
+# be needed at all...  Either can also be a BirdIndex,
+# e.g. BirdIndex.from_birds_file("zerodm.birds")
 #                (ms, err)
 known_birds_p = []
 #                (Hz, err)
 known_birds_f = []
+# Set to a SiftProfiler to time (and count the candidates of) the
+# sifting stages
+profiler = None
 #---------------------------------------------------
 
 fund_re = re.compile("^\d")
 harms_re = re.compile("^[ ]\d")
 DM_re = re.compile("DM(\d+\.\d{2})")
 
+# Names of the bad-lists every candidate list keeps track of
+badlist_names = ['knownbirds', 'longperiod', 'shortperiod', 'threshold',
+                 'harmpowcutoff', 'rogueharmpow', 'harmonic', 'dmproblem']
+
+# Per-candidate columns stored by ColumnarCandlist
+cand_dtype = np.dtype([('candnum', np.int64),
+                       ('sigma', np.float64),
+                       ('numharm', np.int32),
+                       ('ipow', np.float64),
+                       ('cpow', np.float64),
+                       ('r', np.float64),
+                       ('f', np.float64),
+                       ('p', np.float64),
+                       ('z', np.float64),
+                       ('w', np.float64),
+                       ('DM', np.float64),
+                       ('T', np.float64),
+                       ('snr', np.float64),
+                       ('fileidx', np.int32)])
+
+# A DM hit of a candidate: (DM, SNR, sigma)
+hit_dtype = np.dtype([('DM', np.float64),
+                      ('snr', np.float64),
+                      ('sigma', np.float64)])
+hit_struct = struct.Struct("=3d")
+
 # Add some functions to maintain support for the old
 # sifting API
 def remove_duplicate_candidates(candlist, *args, **kwargs):
@@ -104,29 +138,71 @@ def write_candlist(candlist, *args, **kwargs):
     candlist.to_file(*args, **kwargs)
 
 
-def sigma_to_size(sigmas):
-    """Given a numpy array of sigma values, return an array
-        of same size with sizes of markers to plot.
+def print_sift_globals(config=None):
+    if config is None:
+        config = SiftConfig()
+    print("r_err =", config.r_err)
+    print("short_period =", config.short_period)     
+    print("long_period =", config.long_period)     
+    print("sigma_threshold =", config.sigma_threshold) 
+    print("c_pow_threshold =", config.c_pow_threshold) 
+    print("harm_pow_cutoff =", config.harm_pow_cutoff) 
+    print("sigma_tol =", config.sigma_tol)
+    print("known_birds_p =", config.known_birds_p)   
+    print("known_birds_f =", config.known_birds_f)
 
-        Inputs:
-            sigmas: Numpy array of sigma values.
 
-        Output:
-            sizes: Numpy array of marker sizes.
+class SiftConfig(object):
+    """The parameters of a sifting. Passing one to the candidate
+        lists (and read_candidates) lets siftings with different
+        parameters run in the same interpreter, e.g. one per beam
+        in threads, without touching the module globals.
+
+        A parameter that isn't given falls back to the module global
+        of the same name (e.g. sifting.sigma_threshold), read when
+        it is used, so code that sets the globals keeps working.
+
+        Inputs:
+            ** Any of the parameters in SiftConfig.names.
     """
-    # return 8+sigmas**1.7
-    return np.clip(20**(sigmas/6), 5, 400)
+    names = ['r_err', 'long_period', 'short_period', 'sigma_threshold',
+             'c_pow_threshold', 'harm_pow_cutoff', 'sigma_tol',
+             'known_birds_p', 'known_birds_f']
+
+    def __init__(self, **params):
+        for name, value in params.items():
+            if name not in self.names:
+                raise TypeError("Unknown sifting parameter '%s'" % name)
+            setattr(self, name, value)
+
+    def __getattr__(self, name):
+        # Only called for parameters that weren't given
+        if name in SiftConfig.names:
+            return globals()[name]
+        raise AttributeError(name)
+
+    def __repr__(self):
+        return "SiftConfig(%s)" % ", ".join("%s=%r" % (name, value) for \
+                    name, value in sorted(self.__dict__.items()))
+
+    def as_dict(self):
+        """Return all the parameters (given or not) as a dictionary.
+        """
+        return dict((name, getattr(self, name)) for name in self.names)
 
+    def resolved(self):
+        """Return a copy with the current values of the globals
+            filled in for the parameters that weren't given. This
+            is what gets sent to worker processes and saved.
+        """
+        return SiftConfig(**self.as_dict())
 
-def print_sift_globals():
-    print("r_err =", r_err)
-    print("short_period =", short_period)     
-    print("long_period =", long_period)     
-    print("sigma_threshold =", sigma_threshold) 
-    print("c_pow_threshold =", c_pow_threshold) 
-    print("harm_pow_cutoff =", harm_pow_cutoff) 
-    print("known_birds_p =", known_birds_p)   
-    print("known_birds_f =", known_birds_f)
+    def replace(self, **params):
+        """Return a copy with some parameters changed.
+        """
+        newparams = dict(self.__dict__)
+        newparams.update(params)
+        return SiftConfig(**newparams)
 
 
 def parse_power(pow):
@@ -140,10 +216,658 @@ def parse_power(pow):
     return power
 
 
+class SigmaTable(object):
+    """candidate_sigma(power, numharm, 1) for one numharm, linearly
+        interpolated (in sqrt(power)) from a table of exact values.
+
+        The table is refined until the interpolated sigmas at the
+        quarters of every interval are within 'tol' of candidate_sigma
+        there, and is extended (doubling its sqrt(power) range)
+        whenever a larger power is asked for. Tables are memoized:
+        use SigmaTable.get.
+    """
+    tables = {}
+
+    def __init__(self, numharm, tol):
+        self.numharm = numharm
+        self.tol = tol
+        self.grid = self._build(0.0, 8.0)
+
+    @classmethod
+    def get(cls, numharm, tol):
+        """Return the (memoized) table for numharm and tol.
+        """
+        key = (numharm, tol)
+        table = cls.tables.get(key)
+        if table is None:
+            table = cls.tables[key] = cls(numharm, tol)
+        return table
+
+    def _exact(self, xs):
+        from presto.presto import candidate_sigma
+        return np.array([candidate_sigma(x*x, self.numharm, 1) \
+                            for x in xs.tolist()], dtype=np.float64)
+
+    def _build(self, x0, x1):
+        xs = np.linspace(x0, x1, int(round((x1 - x0)/0.25)) + 1)
+        sigmas = self._exact(xs)
+        unchecked = np.ones(len(xs)-1, dtype=bool)
+        # Check every interval at its quarters, not only its middle,
+        # so the kink where sigma reaches 0 isn't missed
+        fracs = np.array([0.25, 0.5, 0.75])
+        while unchecked.any():
+            idx = np.flatnonzero(unchecked)
+            widths = xs[idx+1] - xs[idx]
+            checkxs = xs[idx][:,np.newaxis] + widths[:,np.newaxis]*fracs
+            exact = self._exact(checkxs.ravel()).reshape(checkxs.shape)
+            interp = sigmas[idx][:,np.newaxis] + fracs * \
+                        (sigmas[idx+1] - sigmas[idx])[:,np.newaxis]
+            bad = (np.fabs(interp - exact) > self.tol).any(axis=1)
+            # Give up on intervals this narrow (e.g. at a discontinuity)
+            bad &= widths > 1e-9*x1
+            ibad = idx[bad]
+            xs = np.insert(xs, ibad+1, checkxs[bad,1])
+            sigmas = np.insert(sigmas, ibad+1, exact[bad,1])
+            # Both halves of the split intervals get checked next
+            unchecked = np.zeros(len(xs)-1, dtype=bool)
+            ileft = ibad + np.arange(len(ibad))
+            unchecked[ileft] = True
+            unchecked[ileft+1] = True
+        return xs, sigmas
+
+    def extend(self, xmax):
+        """Extend the table up to at least sqrt(power) = xmax.
+        """
+        xs, sigmas = self.grid
+        top = newtop = xs[-1]
+        while newtop < xmax:
+            newtop *= 2.0
+        newxs, newsigmas = self._build(top, newtop)
+        # Replaced at once, so threads sharing the table never see
+        # the old and new grids mixed
+        self.grid = (np.concatenate([xs, newxs[1:]]),
+                     np.concatenate([sigmas, newsigmas[1:]]))
+
+    def __call__(self, powers):
+        xs = np.sqrt(np.maximum(np.asarray(powers, dtype=np.float64), 0.0))
+        if len(xs) and xs.max() > self.grid[0][-1]:
+            self.extend(xs.max())
+        gridxs, gridsigmas = self.grid
+        return np.interp(xs, gridxs, gridsigmas)
+
+
+def candidate_sigmas(powers, numharms, tol=None):
+    """Return candidate_sigma(power, numharm, 1) (i.e. the sigmas of
+        candidates assuming _1_ trial) for arrays of powers, one
+        array operation per numharm.
+
+        Inputs:
+            powers: The incoherent powers of the candidates.
+            numharms: Their numbers of harmonics (or a single number).
+            tol: Accuracy of the sigmas, interpolated from a SigmaTable.
+                If None, candidate_sigma is called for every candidate.
+                (Default: None)
+
+        Outputs:
+            sigmas: The sigmas of the candidates.
+    """
+    powers = np.asarray(powers, dtype=np.float64)
+    numharms = np.broadcast_to(np.asarray(numharms, dtype=np.int64),
+                               powers.shape)
+    if tol is None:
+        from presto.presto import candidate_sigma
+        return np.array([candidate_sigma(power, numharm, 1) for power, \
+                            numharm in zip(powers.tolist(), numharms.tolist())],
+                        dtype=np.float64)
+    sigmas = np.zeros(len(powers), dtype=np.float64)
+    for numharm in np.unique(numharms).tolist():
+        icands = np.flatnonzero(numharms == numharm)
+        sigmas[icands] = SigmaTable.get(numharm, tol)(powers[icands])
+    return sigmas
+
+
+# Integer harmonic factors and other common (numer, denom) frequency
+# ratios checked by remove_harmonics
+harm_factors = np.arange(1.0, 17.0)
+harm_ratios = list(zip([3.0, 5.0, 2.0, 4.0, 5.0, 3.0, 5.0, 2.0, 3.0, 4.0],
+                       [2.0, 2.0, 3.0, 3.0, 3.0, 4.0, 4.0, 5.0, 5.0, 5.0]))
+
+
+def find_harmonic_pairs(freqs, f_err, chunksize=4096):
+    """Find all pairs of candidates whose frequencies are harmonically
+        related, using the same tests as Candlist.remove_harmonics.
+
+        Each candidate's frequency is projected onto all tested
+        ratios and matches within f_err are found by binary search
+        in the sorted frequencies, so the cost scales as
+        O(N*H*log(N)) rather than O(N^2*H). Potential matches are
+        then confirmed with the exact original comparisons.
+
+        Inputs:
+            freqs: Numpy array of candidate frequencies (Hz), in the
+                order candidates are considered as fundamentals.
+            f_err: The frequency tolerance (Hz).
+            chunksize: Number of fundamentals searched at once.
+                (Default: 4096)
+
+        Outputs:
+            ifund: Indices of the fundamental of each pair.
+            iharm: Indices of the harmonic of each pair (> ifund).
+                Pairs are sorted by ifund, then by decreasing iharm.
+            intkind: 1 if the pair matched "1/kth", 2 if it matched
+                "kth" for an integer factor, 0 otherwise.
+            intfactor: The matching integer factor (if any).
+            iratio: Index into harm_ratios of the matching ratio,
+                or -1 if none matched.
+    """
+    freqs = np.asarray(freqs, dtype=np.float64)
+    numcands = len(freqs)
+    numers = np.array([numer for numer, denom in harm_ratios])
+    denoms = np.array([denom for numer, denom in harm_ratios])
+    # Harmonic freq = fundamental freq * mult (within f_err)
+    mults = np.concatenate((1.0/harm_factors, harm_factors, denoms/numers))
+    isort = np.argsort(freqs, kind='stable')
+    sorted_freqs = freqs[isort]
+    ifunds = []
+    iharms = []
+    for lo in range(0, numcands, chunksize):
+        hi = min(lo+chunksize, numcands)
+        targets = freqs[lo:hi,np.newaxis] * mults
+        # Widen the windows a little, the exact tests are done below
+        tol = f_err*1.001 + np.fabs(targets)*1e-12
+        ilo = np.searchsorted(sorted_freqs, targets-tol, side='left')
+        ihi = np.searchsorted(sorted_freqs, targets+tol, side='right')
+        counts = (ihi - ilo).ravel()
+        total = counts.sum()
+        if not total:
+            continue
+        starts = np.cumsum(counts) - counts
+        ipos = np.repeat(ilo.ravel() - starts, counts) + np.arange(total)
+        ifund = np.repeat(np.arange(lo, hi).repeat(len(mults)), counts)
+        iharm = isort[ipos]
+        keep = iharm > ifund
+        ifunds.append(ifund[keep])
+        iharms.append(iharm[keep])
+    if ifunds:
+        # Unique pairs, sorted by ifund, then by decreasing iharm
+        keys = np.unique(np.concatenate(ifunds)*numcands + \
+                         (numcands-1-np.concatenate(iharms)))
+    else:
+        keys = np.zeros(0, dtype=np.int64)
+    ifund = keys // numcands
+    iharm = numcands-1 - keys % numcands
+
+    # Exact tests, identical to those in the original pairwise loop
+    fund_f = freqs[ifund]
+    harm_f = freqs[iharm]
+    factors = harm_factors[:,np.newaxis]
+    below = np.fabs(fund_f - harm_f*factors) < f_err*factors
+    above = np.fabs(fund_f - harm_f/factors) < f_err/factors
+    intmatch = below | above
+    hasint = intmatch.any(axis=0)
+    ifactor = np.argmax(intmatch, axis=0)
+    intkind = np.where(below[ifactor, np.arange(len(ifund))], 1, 2)
+    intkind[~hasint] = 0
+    intfactor = harm_factors[ifactor].astype(np.int64)
+    ratiomatch = np.zeros((len(harm_ratios), len(ifund)), dtype=bool)
+    for ii, (numer, denom) in enumerate(harm_ratios):
+        factor = numer/denom
+        ratiomatch[ii] = np.fabs(fund_f - harm_f*factor) < f_err*factor
+    hasratio = ratiomatch.any(axis=0)
+    iratio = np.where(hasratio, np.argmax(ratiomatch, axis=0), -1)
+    matched = hasint | hasratio
+    return ifund[matched], iharm[matched], intkind[matched], \
+                intfactor[matched], iratio[matched]
+
+
+def peak_rss():
+    """Return the peak resident set size (bytes) of this process and
+        of its (finished) child processes, or None if the resource
+        module isn't available.
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # ru_maxrss is in kilobytes, except on macOS
+    return peak if sys.platform == "darwin" else peak*1024
+
+
+class SiftHook(object):
+    """Base class of the destinations of a SiftProfiler's records.
+        Subclasses override the methods they need.
+    """
+    def stage_start(self, name):
+        pass
+
+    def stage_end(self, record):
+        pass
+
+    def update(self, report):
+        """Called with the report so far after every stage.
+        """
+        pass
+
+    def finish(self, report):
+        self.update(report)
+
+
+class StderrHook(SiftHook):
+    """Print each stage to stderr as it starts and ends.
+    """
+    def stage_start(self, name):
+        sys.stderr.write("[sift] %s...\n" % name)
+
+    def stage_end(self, record):
+        rejected = ", ".join("%s: %d" % item for item in
+                             sorted(record['rejected'].items()))
+        sys.stderr.write("[sift] %s: %.3f s, %d -> %d cands%s%s\n" % \
+                         (record['stage'], record['seconds'],
+                          record['numin'], record['numout'],
+                          " (%s)" % rejected if rejected else "",
+                          "" if record['peak_rss'] is None else
+                          ", peak RSS %.1f MB" % (record['peak_rss']/1e6)))
+
+    def finish(self, report):
+        sys.stderr.write("[sift] total: %.3f s\n" % report['seconds'])
+
+
+class JSONHook(SiftHook):
+    """Write the profiler report to a JSON file. It is rewritten
+        after every stage, so the file shows how far a run got.
+    """
+    def __init__(self, filenm):
+        self.filenm = filenm
+
+    def update(self, report):
+        tmpfilenm = self.filenm + ".tmp"
+        with open(tmpfilenm, "w") as jsonfile:
+            json.dump(report, jsonfile, indent=2)
+        os.replace(tmpfilenm, self.filenm)
+
+
+class PrometheusHook(SiftHook):
+    """Write the profiler report as a Prometheus textfile (e.g. for
+        node_exporter's textfile collector). It is rewritten after
+        every stage.
+    """
+    def __init__(self, filenm, prefix="presto_sift", labels=None):
+        self.filenm = filenm
+        self.prefix = prefix
+        self.labels = {} if labels is None else labels
+
+    def _labels(self, **labels):
+        labels = dict(self.labels, **labels)
+        if not labels:
+            return ""
+        return "{%s}" % ",".join('%s="%s"' % (key, labels[key])
+                                 for key in sorted(labels))
+
+    def update(self, report):
+        metrics = [("stage_seconds", "Wall time of a sifting stage.",
+                    "seconds"),
+                   ("stage_candidates_in",
+                    "Number of candidates going into a sifting stage.",
+                    "numin"),
+                   ("stage_candidates_out",
+                    "Number of candidates left after a sifting stage.",
+                    "numout")]
+        out = []
+        for metric, help, key in metrics:
+            name = self.prefix + "_" + metric
+            out.append("# HELP %s %s\n# TYPE %s gauge\n" % (name, help, name))
+            for record in report['stages']:
+                out.append("%s%s %r\n" % (name, self._labels(stage=record['stage']),
+                                          record[key]))
+        name = self.prefix + "_rejected_candidates"
+        out.append("# HELP %s Number of candidates a sifting stage moved to "
+                   "a bad-list.\n# TYPE %s gauge\n" % (name, name))
+        for record in report['stages']:
+            for badlist, num in sorted(record['rejected'].items()):
+                out.append("%s%s %d\n" % (name, self._labels(stage=record['stage'],
+                                                            badlist=badlist), num))
+        for metric, help, value in \
+                [("peak_rss_bytes", "Peak resident set size of the sifting "
+                  "process.", report['peak_rss']),
+                 ("seconds", "Wall time of the sifting run so far.",
+                  report['seconds']),
+                 ("start_time_seconds", "Unix time the sifting run started.",
+                  report['start'])]:
+            if value is None:
+                continue
+            name = self.prefix + "_" + metric
+            out.append("# HELP %s %s\n# TYPE %s gauge\n%s%s %r\n" % \
+                       (name, help, name, name, self._labels(), value))
+        tmpfilenm = self.filenm + ".tmp"
+        with open(tmpfilenm, "w") as promfile:
+            promfile.writelines(out)
+        os.replace(tmpfilenm, self.filenm)
+
+
+class SiftStage(object):
+    """A stage being timed by a SiftProfiler. If the stage replaces
+        the candidate list it was given (or wasn't given one), the
+        resulting list should be passed to output().
+    """
+    def __init__(self, name, candlist=None):
+        self.name = name
+        self.candlist = candlist
+        self.numin = 0 if candlist is None else len(candlist)
+        self.numbad = {} if candlist is None else dict(candlist.numbad)
+        self.start = time.time()
+        self.tstart = time.perf_counter()
+
+    def output(self, candlist):
+        self.candlist = candlist
+
+    def record(self):
+        seconds = time.perf_counter() - self.tstart
+        numout, rejected = 0, {}
+        if self.candlist is not None:
+            numout = len(self.candlist)
+            for key, num in self.candlist.numbad.items():
+                if num - self.numbad.get(key, 0):
+                    rejected[key] = num - self.numbad.get(key, 0)
+        return {'stage': self.name, 'start': self.start,
+                'seconds': seconds, 'numin': self.numin, 'numout': numout,
+                'rejected': rejected, 'peak_rss': peak_rss()}
+
+
+class SiftProfiler(object):
+    """Collects the wall time, peak RSS, number of candidates in
+        and out, and number of candidates moved to each bad-list for
+        the stages of a sifting run, and passes them to its hooks.
+
+        Stages are timed with the stage() context manager:
+
+            with profiler.stage("remove_harmonics", candlist):
+                candlist.remove_harmonics()
+
+        When the module variable 'profiler' is set to a SiftProfiler,
+        read_candidates() and the Candlist sifting methods are timed
+        automatically.
+    """
+    def __init__(self, hooks=None):
+        self.hooks = [] if hooks is None else list(hooks)
+        self.start = time.time()
+        self.tstart = time.perf_counter()
+        self.stages = []
+
+    def add_hook(self, hook):
+        self.hooks.append(hook)
+
+    @contextlib.contextmanager
+    def stage(self, name, candlist=None):
+        for hook in self.hooks:
+            hook.stage_start(name)
+        stage = SiftStage(name, candlist)
+        try:
+            yield stage
+        finally:
+            record = stage.record()
+            self.stages.append(record)
+            report = self.report()
+            for hook in self.hooks:
+                hook.stage_end(record)
+                hook.update(report)
+
+    def report(self):
+        """Return the records of all stages so far, with the total
+            wall time and peak RSS of the run.
+        """
+        return {'start': self.start,
+                'seconds': time.perf_counter() - self.tstart,
+                'peak_rss': peak_rss(),
+                'stages': list(self.stages)}
+
+    def finish(self):
+        """Pass the final report to the hooks and return it.
+        """
+        report = self.report()
+        for hook in self.hooks:
+            hook.finish(report)
+        return report
+
+
+def profiled(func):
+    """Decorator timing a sifting stage with the module 'profiler'
+        (if one is set). The stage works on the candidate list that
+        is its first argument, or on the one it returns.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if profiler is None:
+            return func(*args, **kwargs)
+        candlist = args[0] if args and hasattr(args[0], 'numbad') else None
+        with profiler.stage(func.__name__, candlist) as stage:
+            result = func(*args, **kwargs)
+            if hasattr(result, 'numbad'):
+                stage.output(result)
+        return result
+    return wrapper
+
+
+class BirdIndex(object):
+    """A sorted-interval index of known birdies.
+
+        Each bird is a (<centre>, <one-sided width>) tuple. The
+        intervals are sorted once by their lower edge, so matching N
+        values against B birds costs O(N*log(B)) plus the number of
+        overlapping intervals, instead of O(N*B).
+
+        A BirdIndex can be used anywhere a list of bird tuples is
+        accepted (e.g. for 'known_birds_f' or 'known_birds_p').
+    """
+    def __init__(self, birds=[]):
+        birds = list(birds)
+        self.centres = np.array([bird for bird, err in birds], dtype=np.float64)
+        self.errs = np.array([err for bird, err in birds], dtype=np.float64)
+        los = self.centres - self.errs
+        self.isort = np.argsort(los, kind='stable')
+        self.sorted_los = los[self.isort]
+        self.maxwidth = 2.0*self.errs.max() if len(birds) else 0.0
+
+    @classmethod
+    def from_birds_file(cls, birdsfilenm):
+        """Build an index from a PRESTO .birds file.
+
+            Each non-comment line of a .birds file contains
+                <freq (Hz)> <width (Hz)> [<#harm> [<grow?> [<bary?>]]]
+            If #harm > 1, harmonics of the bird are added too (with
+            widths that grow with harmonic number if 'grow?' is 1).
+            The 'bary?' column is ignored, so the birds should be in
+            the same (topocentric or barycentric) frame as the
+            candidates.
+
+            Inputs:
+                birdsfilenm: The name of the .birds file.
+
+            Output:
+                birdindex: A BirdIndex of (<freq (Hz)>, <one-sided
+                    width (Hz)>) intervals.
+        """
+        return cls(read_birds_file(birdsfilenm))
+
+    def __len__(self):
+        return len(self.centres)
+
+    def __iter__(self):
+        return iter(zip(self.centres.tolist(), self.errs.tolist()))
+
+    def __getitem__(self, key):
+        return (float(self.centres[key]), float(self.errs[key]))
+
+    def __repr__(self):
+        return "BirdIndex(<%d birds>)" % len(self)
+
+    def first_match(self, values, chunksize=65536):
+        """Find the first bird (in the order the birds were given)
+            that each value falls within, i.e. the same bird a loop
+            testing np.fabs(value-bird) < err would find.
+
+            Inputs:
+                values: Numpy array of values to test.
+                chunksize: Number of values tested at once.
+                    (Default: 65536)
+
+            Output:
+                ibirds: Index of the matched bird for each value,
+                    or -1 if it matches none.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        ibirds = np.full(len(values), -1, dtype=np.int64)
+        if not len(self):
+            return ibirds
+        for lo in range(0, len(values), chunksize):
+            vals = values[lo:lo+chunksize]
+            # Only birds whose lower edge is within one (widened)
+            # maximum width below the value can contain it
+            tol = 1e-9*np.maximum(np.fabs(vals), 1.0)
+            ilo = np.searchsorted(self.sorted_los, vals-self.maxwidth-tol, \
+                                  side='left')
+            ihi = np.searchsorted(self.sorted_los, vals+tol, side='right')
+            counts = ihi - ilo
+            total = counts.sum()
+            if not total:
+                continue
+            starts = np.cumsum(counts) - counts
+            ivals = np.repeat(np.arange(len(vals)), counts)
+            ibird = self.isort[np.repeat(ilo - starts, counts) + \
+                               np.arange(total)]
+            # Exact test
+            match = np.fabs(vals[ivals] - self.centres[ibird]) < self.errs[ibird]
+            first = np.full(len(vals), len(self), dtype=np.int64)
+            np.minimum.at(first, ivals[match], ibird[match])
+            first[first == len(self)] = -1
+            ibirds[lo:lo+chunksize] = first
+        return ibirds
+
+
+def read_birds_file(birdsfilenm):
+    """Read a PRESTO .birds file. See BirdIndex.from_birds_file.
+
+        Inputs:
+            birdsfilenm: The name of the .birds file.
+
+        Output:
+            birds: A list of (<freq (Hz)>, <one-sided width (Hz)>)
+                tuples, including any harmonics.
+    """
+    birds = []
+    with open(birdsfilenm) as birdsfile:
+        for line in birdsfile:
+            split_line = line.split("#")[0].split()
+            if len(split_line) < 2:
+                continue
+            freq = float(split_line[0])
+            width = float(split_line[1])
+            numharm = int(split_line[2]) if len(split_line) > 2 else 1
+            grow = int(split_line[3]) if len(split_line) > 3 else 0
+            for harm in range(1, numharm+1):
+                if grow:
+                    birds.append((freq*harm, 0.5*width*harm))
+                else:
+                    birds.append((freq*harm, 0.5*width))
+    return birds
+
+
+class Hits(object):
+    """The DM hits of a candidate, packed into a single bytes
+        object of (DM, SNR, sigma) records (see hit_dtype) instead
+        of a list of 3-tuples. It behaves like that list: iterating
+        and indexing give 3-tuples of floats, and append, extend and
+        sort work as usual. The records are available as a
+        (read-only) structured array through 'data'.
+    """
+    __slots__ = ('_buf',)
+
+    def __init__(self, hits=()):
+        self.data = hits
+
+    @property
+    def data(self):
+        return np.frombuffer(self._buf, dtype=hit_dtype)
+
+    @data.setter
+    def data(self, hits):
+        if isinstance(hits, Hits):
+            self._buf = hits._buf
+        elif isinstance(hits, np.ndarray):
+            if hits.dtype != hit_dtype:
+                hits = np.ascontiguousarray(hits, dtype=np.float64)
+            self._buf = hits.tobytes()
+        else:
+            self._buf = b"".join([hit_struct.pack(*hit) for hit in hits])
+
+    def __len__(self):
+        return len(self._buf) // hit_dtype.itemsize
+
+    def __iter__(self):
+        return hit_struct.iter_unpack(self._buf)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return list(self)[key]
+        num = len(self)
+        if not -num <= key < num:
+            raise IndexError("hit index out of range")
+        return hit_struct.unpack_from(self._buf,
+                                      (key % num) * hit_dtype.itemsize)
+
+    def __setitem__(self, key, value):
+        hits = list(self)
+        hits[key] = value
+        self.data = hits
+
+    def __eq__(self, other):
+        try:
+            return list(self) == list(other)
+        except TypeError:
+            return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return repr(list(self))
+
+    def __array__(self, dtype=None, copy=None):
+        # An (N, 3) array of (DM, SNR, sigma)
+        hits = self.data.view(np.float64).reshape(-1, 3)
+        return hits if dtype is None else hits.astype(dtype)
+
+    @classmethod
+    def join(cls, hitlists):
+        """Concatenate several Hits instances into a new one.
+        """
+        hits = cls()
+        hits._buf = b"".join([hitlist._buf for hitlist in hitlists])
+        return hits
+
+    def append(self, hit):
+        self._buf += hit_struct.pack(*hit)
+
+    def extend(self, hits):
+        self._buf += Hits(hits)._buf
+
+    def sort(self, key=None, reverse=False):
+        self.data = sorted(self, key=key, reverse=reverse)
+
+
 class Candidate(object):
+    # Slots instead of a per-instance __dict__: many thousands of
+    # these are alive at once when a full beam is sifted
+    __slots__ = ('path', 'filename', 'candnum', 'sigma', 'numharm',
+                 'ipow_det', 'cpow', 'r', 'f', 'z', 'w', 'T', 'p',
+                 'DMstr', 'DM', 'harm_pows', 'harm_phases', '_harm_amps',
+                 'snr', '_hits', 'note')
+
     def __init__(self, candnum, sigma, numharm, ipow, cpow, bin, z,
-                 DMstr, filename, T):
-        self.path, self.filename = os.path.split(filename)
+                 DMstr, filename, T, w=0.0):
+        # Candidates from one file share their path, name and DM strings
+        self.path, self.filename = [sys.intern(name) for name in
+                                        os.path.split(filename)]
         self.candnum = candnum
         self.sigma = sigma
         self.numharm = numharm
@@ -152,27 +876,51 @@ class Candidate(object):
         self.r = bin
         self.f = bin/T
         self.z = z
-        self.w = 0.0          # default: ACCEL=0.0, JERK will overwrite
+        self.w = w            # ACCEL=0.0, JERK gives the w of the search
         self.T = T
         self.p = 1.0/self.f
-        self.DMstr = DMstr
+        self.DMstr = sys.intern(DMstr)
         self.DM = float(DMstr)
         self.harm_pows = None
-        self.harm_amps = None
+        self.harm_phases = None
+        self._harm_amps = None
         self.snr = 0.0
-        self.hits = []
+        self._hits = Hits()
         self.note = ""
 
+    @property
+    def hits(self):
+        return self._hits
+
+    @hits.setter
+    def hits(self, hits):
+        self._hits = hits if isinstance(hits, Hits) else Hits(hits)
+
+    @property
+    def harm_amps(self):
+        """The complex amplitudes of the harmonics. Unless they have
+            been set explicitly they are only computed (from harm_pows
+            and harm_phases) when first asked for.
+        """
+        if self._harm_amps is None and self.harm_phases is not None:
+            self._harm_amps = (np.sqrt(self.harm_pows) * \
+                               np.exp(self.harm_phases*1.0j)).astype(np.complex64)
+        return self._harm_amps
+
+    @harm_amps.setter
+    def harm_amps(self, harm_amps):
+        self._harm_amps = harm_amps
+
     def add_as_hit(self, other):
         self.hits.extend(other.hits)
 
+    def add_as_hits(self, others):
+        self.hits = Hits.join([self.hits] + [other.hits for other in others])
+
     def __str__(self):
         cand = self.filename + ':' + repr(self.candnum)
-        return "%-65s   %7.2f  %6.2f  %6.2f  %s   %7.1f  %7.1f  " \
-                "%12.6f  %10.2f  %8.2f " % \
-                        (cand, self.DM, self.snr, self.sigma, \
-                        "%2d".center(7)%self.numharm,
-                        self.ipow_det, self.cpow, self.p*1000, self.r, self.z)
+        return cand_fmt % (cand, self.DM, self.snr, self.sigma, self.numharm,
+                           self.ipow_det, self.cpow, self.p*1000, self.r, self.z)
 
     def harms_to_snr(self):
         # Remove the average power level
@@ -182,23 +930,331 @@ class Candidate(object):
         self.snr = np.sum(np.sqrt(harmamps))
 
 
+def harms_to_snrs(harm_pows, offsets):
+    """Compute the S/Ns of many candidates at once, as
+        Candidate.harms_to_snr does for one.
+
+        Inputs:
+            harm_pows: The harmonic powers of all the candidates, one
+                after the other.
+            offsets: The index of the first harmonic of each candidate
+                in harm_pows, followed by len(harm_pows).
+
+        Outputs:
+            snrs: The S/N of each candidate.
+    """
+    offsets = np.asarray(offsets, dtype=np.int64)
+    numharms = np.diff(offsets)
+    # Remove the average power level, setting the S/N to 0.0 for
+    # harmonics with "negative" amplitudes
+    harmamps = np.sqrt(np.maximum(np.asarray(harm_pows, dtype=np.float64) \
+                                  - 1.0, 0.0))
+    # The candidates are summed in groups with the same numharm, as
+    # rows of a 2-D array: unlike np.add.reduceat, this adds their
+    # harmonics in the same order as np.sum on each of them
+    snrs = np.zeros(len(numharms), dtype=np.float64)
+    for numharm in np.unique(numharms).tolist():
+        icands = np.flatnonzero(numharms == numharm)
+        snrs[icands] = np.sum(harmamps[offsets[icands][:,np.newaxis] + \
+                                       np.arange(numharm)], axis=1)
+    return snrs
+
+
+# The candidate columns of Candidate.__str__, cands.txt and the reports
+cand_fmt = "%-65s   %7.2f  %6.2f  %6.2f  " + "%2d".center(7) + \
+           "   %7.1f  %7.1f  %12.6f  %10.2f  %8.2f "
+report_header = "#" + "file:candnum".center(66) + "DM".center(9) + \
+                "SNR".center(8) + "sigma".center(8) + "numharm".center(9) + \
+                "ipow".center(9) + "cpow".center(9) +  "P(ms)".center(14) + \
+                "r".center(12) + "z".center(8) + "numhits".center(9) + "\n"
+candfile_header = report_header[:-len("numhits".center(9))-1] + \
+                  "w".center(8) + "numhits".center(9) + "\n"
+
+
+def _cand_columns(cands):
+    """Return the columns of cand_fmt for a list of candidates.
+    """
+    return [[cand.filename + ':' + repr(cand.candnum) for cand in cands],
+            [cand.DM for cand in cands], [cand.snr for cand in cands],
+            [cand.sigma for cand in cands], [cand.numharm for cand in cands],
+            [cand.ipow_det for cand in cands], [cand.cpow for cand in cands],
+            [cand.p*1000 for cand in cands], [cand.r for cand in cands],
+            [cand.z for cand in cands]]
+
+
+# A '%' conversion of _format_text: flag, width, precision, type
+_field_re = re.compile(r"%(-?)(\d*)(?:\.(\d+))?([sdf%])")
+
+
+def _format_fixed(values, width, prec):
+    """Format floats like '%<width>.<prec>f' as rows of ASCII codes.
+        The digits are computed from the values rounded to integers
+        (in units of 10**-prec). Values that are not finite, are too
+        close to a rounding tie to be sure of the last digit, or
+        don't fit in 'width' are flagged as not formatted.
+
+        Inputs:
+            values: An array of floats.
+            width: The field width.
+            prec: The number of decimal places.
+
+        Outputs:
+            chars: A (len(values), width) uint8 array of characters.
+            ok: A boolean array, False for the values not formatted.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    scaled = np.abs(values) * 10.0**prec
+    with np.errstate(invalid='ignore'):
+        ints = np.rint(scaled)
+        ok = np.isfinite(scaled) & (ints < 2.0**52) & \
+             (np.abs(scaled - np.floor(scaled) - 0.5) > 4*np.spacing(scaled))
+    # (Narrow fields fit in 32 bit integers, which are faster)
+    ok &= (ints < 10.0**width) & (width >= prec + 1 + (prec > 0))
+    rem = np.where(ok, ints, 0).astype(np.int32 if width <= 9 else np.int64)
+    unsigned = ~np.signbit(values)
+    chars = np.empty((width, len(values)), dtype=np.uint8)
+    # Fill in the digits from the right
+    for col in range(width-1, -1, -1):
+        if prec and col == width-1-prec:
+            chars[col] = ord('.')
+            continue
+        rem, digit = np.divmod(rem, 10)
+        if col >= width-1-prec-(prec > 0):
+            chars[col] = digit + ord('0')
+        else:
+            # Leading digits, then the sign, then blanks
+            isdigit = (rem > 0) | (digit > 0)
+            issign = ~isdigit & ~unsigned
+            chars[col] = np.where(isdigit, digit + ord('0'),
+                                  np.where(issign, ord('-'), ord(' ')))
+            unsigned |= issign
+    ok &= unsigned & (rem == 0)
+    return chars.T, ok
+
+
+def _format_strings(strs, width, left):
+    """Format byte strings like '%<width>s' (or '%-<width>s' if
+        'left') as rows of ASCII codes.
+
+        Outputs:
+            chars: A (len(strs), max(width, itemsize)) uint8 array.
+            lengths: The lengths of the formatted strings.
+    """
+    strs = np.asarray(strs)
+    itemsize = strs.dtype.itemsize
+    raw = strs.view(np.uint8).reshape(len(strs), itemsize)
+    lengths = np.char.str_len(strs).astype(np.int64)
+    chars = np.full((len(strs), max(width, itemsize)), ord(' '), dtype=np.uint8)
+    if left:
+        chars[:,:itemsize] = np.where(raw, raw, ord(' '))
+    else:
+        rows, cols = np.nonzero(np.arange(itemsize) < lengths[:,np.newaxis])
+        pad = np.maximum(width - lengths, 0)
+        chars[rows, cols + pad[rows]] = raw[rows, cols]
+    return chars, np.maximum(lengths, width)
+
+
+def _format_row(linefmt, columns, ii):
+    """Format row 'ii' of some columns with '%'.
+    """
+    return linefmt % tuple(value.decode() if isinstance(value, bytes) \
+                            else value for value in \
+                                [column[ii] for column in columns])
+
+
+def _format_rows(linefmt, columns):
+    """Format all rows of some columns with '%'.
+
+        Outputs:
+            text: The formatted rows, concatenated.
+            linelens: An array of the lengths of the rows.
+    """
+    rowtexts = [_format_row(linefmt, columns, ii) for ii in range(len(columns[0]))]
+    return "".join(rowtexts), np.fromiter((len(rowtext) for rowtext in rowtexts),
+                                         dtype=np.int64, count=len(rowtexts))
+
+
+def _format_text(linefmt, columns, chunksize=65536):
+    """Format the rows of some columns with 'linefmt' (a format
+        string ending in a newline). This gives the same text as
+        'linefmt % row' for every row, but whole columns are
+        formatted at a time with array operations: floats ('%W.Pf')
+        digit by digit, integers ('%d') and strings ('%s', given as
+        str or bytes) as arrays of bytes. Rows that can't be done
+        this way (e.g. non-ASCII text or numbers wider than their
+        field) are formatted with '%'.
+
+        Inputs:
+            linefmt: The format of a row.
+            columns: A list of equally long sequences of values.
+            chunksize: The number of rows formatted at a time.
+                (Default: 65536)
+
+        Outputs:
+            text: The formatted rows, concatenated.
+            ends: An array of the offsets in 'text' where each row ends.
+    """
+    numrows = len(columns[0])
+    fields = list(_field_re.finditer(linefmt))
+    if len(fields) != len(columns) or \
+            any(field.group(4) == '%' for field in fields):
+        text, linelens = _format_rows(linefmt, columns)
+        return text, np.cumsum(linelens)
+    texts, linelens = [], [np.zeros(0, dtype=np.int64)]
+    for lo in range(0, numrows, chunksize):
+        chunk = [column[lo:lo+chunksize] for column in columns]
+        num = len(chunk[0])
+        # The (characters, lengths) of the pieces of the lines.
+        # Fixed-width pieces have lengths of None.
+        pieces = []
+        ok = np.ones(num, dtype=bool)
+        pos = 0
+        try:
+            for field, column in zip(fields, chunk):
+                literal = linefmt[pos:field.start()].encode('ascii')
+                pieces.append((np.frombuffer(literal, dtype=np.uint8), None))
+                left, width, prec, conv = field.groups()
+                width = int(width or 0)
+                if conv == 'f':
+                    chars, fixed = _format_fixed(column, width,
+                                                 6 if prec is None else int(prec))
+                    ok &= fixed
+                    pieces.append((chars, None))
+                else:
+                    if conv == 'd':
+                        strs = np.asarray(column, dtype=np.int64).astype('S')
+                    else:
+                        strs = np.asarray(column)
+                        if strs.dtype.kind != 'S':
+                            strs = strs.astype('S')
+                    pieces.append(_format_strings(strs, width, left))
+                pos = field.end()
+            literal = linefmt[pos:].encode('ascii')
+            pieces.append((np.frombuffer(literal, dtype=np.uint8), None))
+        except UnicodeEncodeError:
+            text, chunklens = _format_rows(linefmt, chunk)
+            texts.append(text)
+            linelens.append(chunklens)
+            continue
+        widths = [chars.shape[-1] for chars, length in pieces]
+        offsets = np.concatenate(([0], np.cumsum(widths)))
+        allchars = np.empty((num, offsets[-1]), dtype=np.uint8)
+        mask = None
+        chunklens = np.zeros(num, dtype=np.int64)
+        for (chars, length), start, end in zip(pieces, offsets[:-1], offsets[1:]):
+            allchars[:,start:end] = chars
+            if length is None:
+                chunklens += end - start
+            else:
+                # Keep the characters of the piece up to its length
+                if mask is None:
+                    mask = np.ones((num, offsets[-1]), dtype=bool)
+                mask[:,start:end] = np.arange(end-start) < length[:,np.newaxis]
+                chunklens += length
+        if mask is not None:
+            allchars = allchars[mask]
+        text = allchars.tobytes().decode('ascii')
+        if not ok.all():
+            # Replace the rows not formatted by '%'
+            ends = np.cumsum(chunklens).tolist()
+            segments = []
+            prev = 0
+            for ii in np.flatnonzero(~ok).tolist():
+                rowtext = _format_row(linefmt, chunk, ii)
+                segments.append(text[prev:ends[ii]-chunklens[ii]])
+                segments.append(rowtext)
+                prev = ends[ii]
+                chunklens[ii] = len(rowtext)
+            segments.append(text[prev:])
+            text = "".join(segments)
+        texts.append(text)
+        linelens.append(chunklens)
+    return "".join(texts), np.cumsum(np.concatenate(linelens))
+
+
+def _format_lines(linefmt, columns):
+    """Format the rows of some columns with 'linefmt' (see
+        _format_text), returning a list of lines.
+    """
+    text, ends = _format_text(linefmt, columns)
+    ends = ends.tolist()
+    return [text[start:end] for start, end in zip([0] + ends[:-1], ends)]
+
+
+def _write_text_output(filenm, text, compress=None):
+    """Write some text to a file (or stdout) in one go.
+
+        Inputs:
+            filenm: Name of file to write to. If None write to stdout.
+            text: The text to write.
+            compress: If True, gzip the file. (Default: compress
+                if filenm ends with '.gz')
+
+        Outputs:
+            None
+    """
+    if filenm is None:
+        sys.stdout.write(text)
+        return
+    if compress is None:
+        compress = filenm.endswith(".gz")
+    if compress:
+        import gzip
+        outfile = gzip.open(filenm, "wt")
+    else:
+        outfile = open(filenm, "w")
+    with outfile:
+        outfile.write(text)
+
+
+def sort_hits(cands, numhits, tosort):
+    """Sort the hits of candidates by DM (stably, like sorting each
+        of them with 'key=lambda hit: float(hit[0])').
+
+        Inputs:
+            cands: A list of Candidates.
+            numhits: An array of the number of hits of each candidate.
+            tosort: A boolean array of the candidates whose own hits
+                should be left sorted.
+
+        Outputs:
+            hits: The hits of all the candidates, concatenated, as an
+                array of hit_dtype, with those of each candidate
+                sorted by DM.
+    """
+    hits = Hits.join([cand.hits for cand in cands]).data
+    if not len(hits):
+        return hits
+    candidx = np.repeat(np.arange(len(cands)), numhits)
+    uniqdms, dmranks = np.unique(hits['DM'], return_inverse=True)
+    order = np.argsort(candidx*len(uniqdms) + dmranks.ravel(), kind='stable')
+    nonempty = numhits > 0
+    offsets = np.concatenate(([0], np.cumsum(numhits)[:-1])).astype(np.int64)
+    unsorted = np.zeros(len(cands), dtype=bool)
+    unsorted[nonempty] = np.logical_or.reduceat( \
+                    order != np.arange(len(hits)), offsets[nonempty])
+    hits = hits[order]
+    for ii, off, num in zip(*[arr[tosort & unsorted].tolist() for arr in \
+                            (np.arange(len(cands)), offsets, numhits)]):
+        cands[ii].hits = hits[off:off+num]
+    return hits
+
+
 class Candlist(object):
-    def __init__(self, cands=None, trackbad=False, trackdupes=False):
+    def __init__(self, cands=None, trackbad=False, trackdupes=False,
+                 config=None):
         if cands is None:
             self.cands = []
         else:
             self.cands = cands
         self.trackbad = trackbad # Should we keep track of bad candidates
         self.trackdupes = trackdupes # Should we keep track of duplicates
+        # The sifting parameters (see SiftConfig)
+        self.config = SiftConfig() if config is None else config
         # Set default badlists
-        self.badlists = {'knownbirds': [], \
-                         'longperiod': [], \
-                         'shortperiod': [], \
-                         'threshold': [], \
-                         'harmpowcutoff': [], \
-                         'rogueharmpow': [], \
-                         'harmonic': [], \
-                         'dmproblem': []}
+        self.badlists = dict((key, []) for key in badlist_names)
+        # Number of candidates moved to each bad-list (tracked or not)
+        self.numbad = dict((key, 0) for key in badlist_names)
         self.duplicates = []
 
     def __iter__(self):
@@ -213,285 +1269,86 @@ class Candlist(object):
     def sort(self, *args, **kwargs):
         self.cands.sort(*args, **kwargs)
 
-    def plot_summary(self, usefreqs=True):
+    def plot_summary(self, usefreqs=True, headless=False):
         """Produce a plot summarizing the sifiting performed.
 
             Input:
                 usefreqs: If True, the horizontal axis will use
                     frequency. If False, use period.
+                headless: If True, draw the figure with Agg, without
+                    pyplot (see sifting_plot.new_figure).
             
             Output:
                 fig: A matplotlib figure instance.
         """
-        import matplotlib
-        import matplotlib.pyplot as plt
-
-        fig = plt.figure(figsize=(10,8)) 
-        ax = plt.axes((0.08, 0.18, 0.87, 0.80)) 
-        
-        # Get all candidates and sort by sigma
-        allcands = self.get_all_cands()
-        sigmas = np.array([c.sigma for c in allcands])
-        isort = sigmas.argsort()
-        sigmas = sigmas[isort]
-
-        if usefreqs:
-            xdata = np.array([c.f for c in allcands])[isort]
-            xlabel = "Freq (Hz)"
-            xscale = "log"
-        else:
-            xdata = np.array([c.p for c in allcands])[isort]
-            xlabel = "Period (s)"
-            xscale = "loglin"
-
-        dms = np.array([c.DM for c in allcands])[isort]
-        numharms = np.array([c.numharm for c in allcands])[isort]
-
-        # Plot the all candidates 
-        scatt = plt.scatter(xdata, dms, s=sigma_to_size(sigmas), \
-                                c=np.log2(numharms), \
-                                marker='o', alpha=0.7, zorder=-1) 
-        plt.set_cmap("Spectral") 
-  
-        # Add colorbar 
-        fmtr = matplotlib.ticker.FuncFormatter(lambda x, pos: "%d" % 2**x)
-        cax = plt.axes((0.18, 0.06, 0.67, 0.035))
-        cb = plt.colorbar(scatt, cax=cax, ticks=(0,1,2,3,4), format=fmtr, \
-                            orientation="horizontal")
-        cb.set_label("Num harmonics summed") 
-        
-        plt.axes(ax) # Set scatter plot's axes as current
-        plt.xscale(xscale)
-        plt.xlabel(xlabel)
-        mindm = np.min(dms)
-        maxdm = np.max(dms)
-        dmrange = np.ptp(dms)
-
-        # Use log-scale y-axis if max DM > 2000
-        yscale = "log" if maxdm > 2000.0 else "linear"
-        plt.yscale(yscale)
-
-        if yscale is "log":
-            plt.ylim(1.0, maxdm+0.1*dmrange)
-        else:
-            plt.ylim(mindm-0.1*dmrange, maxdm+0.1*dmrange)
-
-        plt.ylabel(r"DM (pc cm$^{-3}$)") 
-        if not usefreqs:
-            plt.gca().xaxis.set_ticks(np.concatenate((\
-                                        np.logspace(-4,0,4, endpoint=False), \
-                                        np.linspace(1,15,8))))
-            plt.gca().xaxis.set_ticks(np.logspace(-4,0,40), minor=True)
-            plt.gca().xaxis.set_ticklabels([r"10$^{-4}$", r"10$^{-3}$", \
-                        r"10$^{-2}$", r"10$^{-1}$", "1", "3", "5", "7", \
-                        "9", "11", "13", "15"])
-            plt.xlim(max(short_period/5.0, min(xdata)/5.0), \
-                        min(long_period+0.5, max(xdata)+0.5))
-        else:
-            plt.xlim(min(xdata)/5.0, max(xdata)*2.0)
-            
-        ax.format_coord = lambda x,y: "x=%g, y=%g" % (x,y)
-        return fig
+        return _plotting().plot_summary(self, usefreqs,
+                        self.config.short_period, self.config.long_period,
+                        headless)
 
-    def plot_rejects(self, usefreqs=True):
+    def plot_rejects(self, usefreqs=True, headless=False):
         """Produce a plot showing why candidates were rejected by
             the sifiting performed.
 
             Input:
                 usefreqs: If True, the horizontal axis will use
                     frequency. If False, use period.
+                headless: If True, draw the figure with Agg, without
+                    pyplot (see sifting_plot.new_figure).
             
             Output:
                 fig: A matplotlib figure instance.
         """
-        import matplotlib
-        import matplotlib.pyplot as plt
+        return _plotting().plot_rejects(self, usefreqs,
+                        self.config.short_period, self.config.long_period,
+                        headless)
 
-        fig = plt.figure(figsize=(10,8)) 
-        ax = plt.axes((0.08, 0.18, 0.87, 0.80)) 
-        
-        # Plot bad candidates
-        candlists = [self.badlists['knownbirds'], self.badlists['longperiod'], \
-                     self.badlists['shortperiod'], self.badlists['threshold'], \
-                     self.badlists['harmpowcutoff'], self.badlists['rogueharmpow'], \
-                     self.badlists['harmonic'], self.badlists['dmproblem'], \
-                     self.cands, self.duplicates]
-        labels = ['Known birdires', 'Long period', 'Short period', \
-                    'Threshold', 'Harm power cutoff', 'Rogue harm power', \
-                    'Harmonic cand', 'DM problem', 'Good cands', 'Hits']
-        colours = ['#FF0000', '#800000', '#008000', '#00FF00', \
-                    '#00FFFF', '#0000FF', '#FF00FF', '#800080', 'r', 'k']
-        markers = ['o', 'o', 'o', 'o', 'o', 'o', 'o', 'o', 'x', 's']
-        zorders = [-2, -2, -2, -2, -2, -2, -2, -2, 0, 0]
-        sizes = [50, 50, 50, 50, 50, 50, 50, 50, 100, 10]
-        fixedsizes = [0, 0, 0, 0, 0, 0, 0, 0, 1, 1]
-        lws = [1,1,1,1,1,1,1,1,2,1]
-        handles = []
-        for cands, colour, marker, zorder, size, fixedsize, lw in \
-                zip(candlists, colours, markers, zorders, sizes, fixedsizes, lws):
-            if len(cands):
-                sigmas = np.array([c.sigma for c in cands])
-                isort = sigmas.argsort()
-                sigmas = sigmas[isort]
-                if usefreqs:
-                    xdata = np.array([c.f for c in cands])[isort]
-                    xlabel = "Freq (Hz)"
-                    xscale = "log"
-                else:
-                    xdata = np.array([c.p for c in cands])[isort]
-                    xlabel = "Period (s)"
-                    xscale = "loglin"
-                dms = np.array([c.DM for c in cands])[isort]
-                
-                # Plot the candidates
-                if fixedsize:
-                    plt.scatter(xdata, dms, s=size, lw=lw, \
-                                c=colour, marker=marker, alpha=0.7, zorder=zorder)
-                else:
-                    plt.scatter(xdata, dms, s=sigma_to_size(sigmas), lw=lw, \
-                                c=colour, marker=marker, alpha=0.7, zorder=zorder)
-            handles.append(plt.scatter([0], [0], s=size, c=colour, \
-                                    marker=marker, alpha=0.7))
-
-        fig.legend(handles, labels, 'lower center', \
-                        prop={'size':'x-small'}, ncol=4)
-
-        plt.xscale(xscale) 
-        plt.xlabel(xlabel)
-
-        alldms = np.array([c.DM for c in self.get_all_cands()])
-        mindm = np.min(alldms)
-        maxdm = np.max(alldms)
-        dmrange = np.ptp(alldms)
-
-        # Use log-scale y-axis if max DM > 2000
-        yscale = "log" if maxdm > 2000.0 else "linear"
-        plt.yscale(yscale)
-
-        if yscale is "log":
-            plt.ylim(1.0, maxdm+0.1*dmrange)
-        else:
-            plt.ylim(mindm-0.1*dmrange, maxdm+0.1*dmrange)
-
-        plt.ylabel(r"DM (pc cm$^{-3}$)") 
-        if not usefreqs:
-            all_xdata = np.array([c.p for c in self.get_all_cands()])
-            plt.gca().xaxis.set_ticks(np.concatenate((\
-                                        np.logspace(-4,0,4, endpoint=False), \
-                                        np.linspace(1,15,8))))
-            plt.gca().xaxis.set_ticks(np.logspace(-4,0,40), minor=True)
-            plt.gca().xaxis.set_ticklabels([r"10$^{-4}$", r"10$^{-3}$", \
-                        r"10$^{-2}$", r"10$^{-1}$", "1", "3", "5", "7", \
-                        "9", "11", "13", "15"])
-            plt.xlim(max(short_period/5.0, min(all_xdata)/5.0), \
-                        min(long_period+0.5, max(all_xdata)+0.5))
-        else:
-            all_xdata = np.array([c.f for c in self.get_all_cands()])
-            plt.xlim(min(all_xdata)/5.0, max(all_xdata)*2.0)
-
-        return fig
-
-    def plot_goodcands(self, usefreqs=True):
+    def plot_goodcands(self, usefreqs=True, headless=False):
         """Produce a plot highlighting good candidates as selected by
             the sifiting performed.
 
             Input:
                 usefreqs: If True, the horizontal axis will use
                     frequency. If False, use period.
+                headless: If True, draw the figure with Agg, without
+                    pyplot (see sifting_plot.new_figure).
             
             Output:
                 fig: A matplotlib figure instance.
         """
-        import matplotlib
-        import matplotlib.pyplot as plt
-
-        fig = plt.figure(figsize=(10,8)) 
-        ax = plt.axes((0.08, 0.18, 0.87, 0.80)) 
-        
-        # Plot candidates
-        labels = []
-        candlists = []
-        for key in self.badlists:
-            labels.append(key.title())
-            candlists.append(self.badlists[key])
-        candlists.append(self.cands)
-        labels.append('Good cands')
-        colours = ['#FF0000', '#800000', '#008000', '#00FF00', \
-                    '#00FFFF', '#0000FF', '#FF00FF', '#800080', 'r']
-        markers = ['o', 'o', 'o', 'o', 'o', 'o', 'o', 'o', 'o']
-        zorders = [-2, -2, -2, -2, -2, -2, -2, -2, 0]
-        sizes = [10, 10, 10, 10, 10, 10, 10, 10, 50]
-        fixedsizes = [1, 1, 1, 1, 1, 1, 1, 1, 0]
-        lws = [1,1,1,1,1,1,1,1,1,1]
-        ecs = ['none', 'none', 'none', 'none', 'none', 'none', 'none', 'none', 'k']
-        alphas = [1,1,1,1,1,1,1,1,0.7]
-        handles = []
-        for cands, colour, marker, zorder, size, fixedsize, lw, alpha, ec in \
-                zip(candlists, colours, markers, zorders, sizes, fixedsizes, lws, alphas, ecs):
-            sigmas = []
-            dms = []
-            xdata = []
-            for c in cands:
-                sigmas.extend([h.sigma for h in c.hits])
-                dms.extend([h[0] for h in c.hits])
-                if usefreqs:
-                    xval = c.f
-                else:
-                    xval = c.p
-                xdata.extend([xval]*len(c.hits))
-            sigmas = np.array(sigmas)
-            dms = np.array(dms)
-            xdata = np.array(xdata)
-
-            isort = sigmas.argsort()
-            sigmas = sigmas[isort]
-            dms = dms[isort]
-            xdata = xdata[isort]
-            if usefreqs:
-                xlabel = "Freq (Hz)"
-                xscale = "log"
-            else:
-                xlabel = "Period (s)"
-                xscale = "loglin"
-            
-            # Plot the candidates
-            if fixedsize:
-                plt.scatter(xdata, dms, s=size, lw=lw, edgecolors=ec, \
-                            c=colour, marker=marker, alpha=alpha, zorder=zorder)
-            else:
-                plt.scatter(xdata, dms, s=sigma_to_size(sigmas), lw=lw, edgecolors=ec, \
-                            c=colour, marker=marker, alpha=alpha, zorder=zorder)
-            handles.append(plt.scatter([], [], s=size, c=colour, \
-                                    marker=marker, alpha=0.7))
-
-        fig.legend(handles, labels, 'lower center', \
-                        prop={'size':'x-small'}, ncol=4)
-
-        plt.xscale(xscale) 
-        plt.xlabel(xlabel) 
-        mindm = np.min(dms)
-        maxdm = np.max(dms)
-        dmrange = np.ptp(dms)
-        plt.ylim(mindm-0.1*dmrange, maxdm+0.1*dmrange)
-        plt.ylabel(r"DM (pc cm$^{-3}$)")
-        if not usefreqs:
-            plt.gca().xaxis.set_ticks(np.concatenate((\
-                                        np.logspace(-4,0,4, endpoint=False), \
-                                        np.linspace(1,15,8))))
-            plt.gca().xaxis.set_ticks(np.logspace(-4,0,40), minor=True)
-            plt.gca().xaxis.set_ticklabels([r"10$^{-4}$", r"10$^{-3}$", \
-                        r"10$^{-2}$", r"10$^{-1}$", "1", "3", "5", "7", \
-                        "9", "11", "13", "15"])
-            plt.xlim(max(short_period/5.0, min(xdata)/5.0), \
-                        min(long_period+0.5, max(xdata)+0.5))
-        return fig
+        return _plotting().plot_goodcands(self, usefreqs,
+                        self.config.short_period, self.config.long_period,
+                        headless)
 
     def mark_as_bad(self, icand, badlistname):
         cand = self.cands.pop(icand)
+        self.numbad[badlistname] = self.numbad.get(badlistname, 0) + 1
         if self.trackbad:
             badlist = self.badlists.setdefault(badlistname, [])
             badlist.append(cand)
 
+    def mark_many_as_bad(self, icands, badlistname):
+        """Move several candidates to a bad-list at once. They are
+            appended in decreasing index order, as repeated calls
+            to mark_as_bad in a reversed loop would do.
+
+            Inputs:
+                icands: The indices of the bad candidates.
+                badlistname: The name of the bad-list.
+
+            Outputs:
+                None
+        """
+        isbad = np.zeros(len(self.cands), dtype=bool)
+        isbad[np.asarray(icands, dtype=np.int64)] = True
+        if not isbad.any():
+            return
+        self.numbad[badlistname] = self.numbad.get(badlistname, 0) + \
+                                        int(np.count_nonzero(isbad))
+        if self.trackbad:
+            badlist = self.badlists.setdefault(badlistname, [])
+            badlist.extend(self.cands[ii] for ii in np.flatnonzero(isbad)[::-1])
+        self.cands = [cand for cand, bad in zip(self.cands, isbad) if not bad]
+
     def mark_as_duplicate(self, icand):
         cand = self.cands.pop(icand)
         if self.trackdupes:
@@ -516,13 +1373,13 @@ class Candlist(object):
 
             Inputs:
                 long_period: The longest allowed period for a 'good' cand.
-                    (Default: Globally defined limit, "long_period")
+                    (Default: config.long_period)
 
             Outputs:
                 None
         """
         if long_period is None:
-            long_period = globals()['long_period']
+            long_period = self.config.long_period
         for ii in reversed(list(range(len(self.cands)))):
             cand = self.cands[ii]
             if (cand.p > long_period):
@@ -536,13 +1393,13 @@ class Candlist(object):
 
             Inputs:
                 short_period: The shortest allowed period for a 'good' cand.
-                    (Default: Globally defined limit, "short_period")
+                    (Default: config.short_period)
 
             Outputs:
                 None
         """
         if short_period is None:
-            short_period = globals()['short_period']
+            short_period = self.config.short_period
         for ii in reversed(list(range(len(self.cands)))):
             cand = self.cands[ii]
             if (cand.p < short_period):
@@ -550,49 +1407,53 @@ class Candlist(object):
                             (cand.p*1000, short_period*1000)
                 self.mark_as_bad(ii, 'shortperiod')
 
-    def reject_knownbirds(self, known_birds_f=[], known_birds_p=[]):
+    def reject_knownbirds(self, known_birds_f=None, known_birds_p=None):
         """Find and remove candidates conincident with known birds.
 
             Inputs:
                 known_birds_f: A list of tuples containing bad frequencies
                     and widths. The tuples should contain
                         (<bad freq (Hz)>, <one-sided width (Hz)>)
-                    (Default: Globally defined "known_birds_f")
+                    A BirdIndex can be given instead.
+                    (Default: config.known_birds_f)
                 known_birds_p: A list of tuples containing bad peridocities
                     and widths. The tuples should contain
                         (<bad freq (ms)>, <one-sided width (ms)>)
-                    (Default: Globally defined "known_birds_p")
+                    A BirdIndex can be given instead.
+                    (Default: config.known_birds_p)
 
             Outputs:
                 None
         """
         if known_birds_f is None:
-            known_birds_f = globals()['known_birds_f']
+            known_birds_f = self.config.known_birds_f
         if known_birds_p is None:
-            known_birds_p = globals()['known_birds_p']
-        for ii in reversed(list(range(len(self.cands)))):
+            known_birds_p = self.config.known_birds_p
+        if not isinstance(known_birds_f, BirdIndex):
+            known_birds_f = BirdIndex(known_birds_f)
+        if not isinstance(known_birds_p, BirdIndex):
+            known_birds_p = BirdIndex(known_birds_p)
+        if not (len(known_birds_f) or len(known_birds_p)):
+            return
+        fs = np.array([cand.f for cand in self.cands], dtype=np.float64)
+        ps_ms = np.array([cand.p*1000.0 for cand in self.cands], \
+                         dtype=np.float64)
+        ibirds_f = known_birds_f.first_match(fs)
+        ibirds_p = known_birds_p.first_match(ps_ms)
+        ibad = np.flatnonzero((ibirds_f >= 0) | (ibirds_p >= 0))
+        for ii in ibad:
             cand = self.cands[ii]
-            known_bird = 0
-            for bird, err in known_birds_f:
-                if (np.fabs(cand.f-bird) < err):
-                    known_bird = 1
-                    cand.note = "Freq (%.2f Hz) is within %g Hz " \
-                                    "of a known birdie centred at %.2f Hz" % \
-                                    (cand.f, err, bird)
-                    break
-            if known_bird:
-                self.mark_as_bad(ii, 'knownbirds')
-                continue
-            for bird, err in known_birds_p:
-                if (np.fabs(cand.p*1000.0-bird) < err):
-                    known_bird = 1
-                    cand.note = "Period (%.2f ms) is within %g ms " \
-                                    "of a known birdie centred at %.2f ms" % \
-                                    (cand.f*1000, err, bird)
-                    break
-            if known_bird:
-                self.mark_as_bad(ii, 'knownbirds')
-                continue
+            if ibirds_f[ii] >= 0:
+                bird, err = known_birds_f[ibirds_f[ii]]
+                cand.note = "Freq (%.2f Hz) is within %g Hz " \
+                                "of a known birdie centred at %.2f Hz" % \
+                                (cand.f, err, bird)
+            else:
+                bird, err = known_birds_p[ibirds_p[ii]]
+                cand.note = "Period (%.2f ms) is within %g ms " \
+                                "of a known birdie centred at %.2f ms" % \
+                                (cand.f*1000, err, bird)
+        self.mark_many_as_bad(ibad, 'knownbirds')
 
     def reject_threshold(self, sigma_threshold=None, \
                     c_pow_threshold=None):
@@ -602,17 +1463,17 @@ class Candlist(object):
 
             Inputs:
                 sigma_threshold: The threshold for sigma.
-                    (Default: Globally defined threshold, "sigma_threshold")
+                    (Default: config.sigma_threshold)
                 c_pow_threshold: The threshold for coherent power.
-                    (Default: Globally defined threshold, "c_pow_threshold")
+                    (Default: config.c_pow_threshold)
 
             Outputs:
                 None
         """
         if sigma_threshold is None:
-            sigma_threshold = globals()['sigma_threshold']
+            sigma_threshold = self.config.sigma_threshold
         if c_pow_threshold is None:
-            c_pow_threshold = globals()['c_pow_threshold']
+            c_pow_threshold = self.config.c_pow_threshold
         for ii in reversed(list(range(len(self.cands)))):
             cand = self.cands[ii]
             
@@ -640,13 +1501,13 @@ class Candlist(object):
 
             Inputs:
                 harm_pow_cutoff: Minimum power for a good harmonic.
-                    (Default: Globally defined "harm_pow_cutoff")
+                    (Default: config.harm_pow_cutoff)
 
             Outputs:
                 None
         """
         if harm_pow_cutoff is None:
-            harm_pow_cutoff = globals()['harm_pow_cutoff']
+            harm_pow_cutoff = self.config.harm_pow_cutoff
         for ii in reversed(list(range(len(self.cands)))):
             cand = self.cands[ii]
             maxharm = np.argmax(cand.harm_pows)
@@ -706,6 +1567,7 @@ class Candlist(object):
         self.reject_harmpowcutoff()
         self.reject_rogueharmpow()
 
+    @profiled
     def remove_duplicate_candidates(self, verbosity=1):
         """Remove lower-significance 'duplicate' (i.e. same period)
             candidates from a list of candidates.  For the highest
@@ -718,55 +1580,133 @@ class Candlist(object):
             Ouputs:
                 None
         """
+        survivors, duplicates = self._cluster_duplicates(verbosity)
+        if self.trackdupes:
+            self.duplicates.extend(duplicates)
+        self.cands = survivors
+        if verbosity >= 1:
+            print("Found %d candidates.\n" % self.get_numcands())
+        self.cands.sort(key=attrgetter('sigma'), reverse=True)
+
+    def _cluster_duplicates(self, verbosity=1):
+        """Sort the candidates by frequency and find the duplicates
+            (see remove_duplicate_candidates). The list itself is
+            left sorted by frequency.
+
+            Inputs:
+                verbosity: Verbosity level. (Default: 1)
+
+            Ouputs:
+                survivors: The highest significance candidates, with
+                    the duplicates added as hits, in frequency order.
+                duplicates: The duplicates.
+        """
         if verbosity >= 1:
             print("  Sorting the %d candidates by frequency..." % \
                         self.get_numcands())
         self.cands.sort(key=attrgetter('r'))
         if verbosity >= 1:
             print("  Searching for dupes...")
-        ii = 0
-        # Find any match
-        while ii < self.get_numcands():
-            jj = ii + 1
-            if jj < self.get_numcands() and \
-                        np.fabs(self.cands[ii].r-self.cands[jj].r) < r_err:
-                # Find others that match
-                jj += 1
-                while jj < self.get_numcands() and \
-                        np.fabs(self.cands[ii].r-self.cands[jj].r) < r_err:
-                    jj += 1
-                matches = self.cands[ii:jj]
-                matches.sort(key=attrgetter('sigma'), reverse=True)
-                bestindex = self.cands.index(matches[0])
-                #sigmas = [c.sigma for c in matches]
-                #bestindex = np.argmax(sigmas)+ii
-                # flag the duplicates
-                bestcand = self.cands[bestindex]
-                # Add other matching cands as hit of highest-sigma cand
-                for matchind in reversed(list(range(ii, jj))):
-                    if matchind == bestindex:
-                        # The current candidate is the highest-sigma cand
-                        # Don't remove it
-                        continue
-                    match = self.cands[matchind]
-                    bestcand.add_as_hit(match)
-                    match.note = "This candidate is a duplicate of %s:%d" % \
-                                (bestcand.filename, bestcand.candnum)
-                    self.mark_as_duplicate(matchind)
-                    if verbosity >= 2:
-                        print("Removing %s:%d (index: %d)" % \
-                                (match.filename, match.candnum, matchind))
-                        print("    %s" % match.note)
-                # If the best candidate isn't at the same freq
-                # as ii, then it's possible even more hits should
-                # be added. So we don't increment the index
-                # (note that the best cand has moved into position ii).
-            else:
-                ii += 1 # No candidates to be added as hits, move on
-        if verbosity >= 1:
-            print("Found %d candidates.\n" % self.get_numcands())
-        self.cands.sort(key=attrgetter('sigma'), reverse=True)
+        cands = self.cands
+        numcands = len(cands)
+        rs = np.array([cand.r for cand in cands], dtype=np.float64)
+        r_err = self.config.r_err
+        sigmas = np.array([cand.sigma for cand in cands], dtype=np.float64)
+        # Split the sorted candidates into runs where consecutive
+        # candidates are closer than r_err. A candidate can never be
+        # a duplicate of a candidate in another run.
+        newrun = np.ones(numcands, dtype=bool)
+        newrun[1:] = ~(np.diff(rs) < r_err)
+        runstarts = np.flatnonzero(newrun)
+        runends = np.append(runstarts[1:], numcands)
+        # Runs spanning less than r_err collapse onto their first
+        # highest-sigma candidate in a single step
+        simple = (rs[runends-1] - rs[runstarts]) < r_err
+        if numcands:
+            maxsigmas = np.repeat(np.maximum.reduceat(sigmas, runstarts), \
+                                  runends-runstarts)
+            ibests = np.minimum.reduceat(np.where(sigmas == maxsigmas, \
+                        np.arange(numcands), numcands), runstarts)
+        else:
+            ibests = np.zeros(0, dtype=np.int64)
+
+        survivors = []
+        duplicates = []
+        for start, end, issimple, ibest in \
+                zip(runstarts, runends, simple, ibests):
+            if end - start == 1:
+                survivors.append(cands[start])
+                continue
+            if issimple:
+                self._merge_duplicates(list(range(start, end)), ibest, \
+                                       len(survivors), duplicates, verbosity)
+                survivors.append(cands[ibest])
+                continue
+            # Scan the run, merging everything within r_err of the
+            # current candidate into the highest-sigma one. If the
+            # best candidate isn't at the same freq as the current
+            # one, it's possible even more hits should be added, so
+            # the best candidate becomes the current candidate.
+            icurr = start
+            inext = start + 1
+            while 1:
+                iend = inext
+                while iend < end and \
+                        np.fabs(rs[icurr]-rs[iend]) < r_err:
+                    iend += 1
+                if iend == inext:
+                    # No candidates to be added as hits, move on
+                    survivors.append(cands[icurr])
+                    if inext == end:
+                        break
+                    icurr = inext
+                    inext += 1
+                    continue
+                imatches = [icurr] + list(range(inext, iend))
+                msigmas = sigmas[imatches]
+                ibest = imatches[int(np.argmax(msigmas == msigmas.max()))]
+                self._merge_duplicates(imatches, ibest, len(survivors), \
+                                       duplicates, verbosity)
+                icurr = ibest
+                inext = iend
+                if inext == end:
+                    survivors.append(cands[icurr])
+                    break
+        return survivors, duplicates
+
+    def _merge_duplicates(self, imatches, ibest, offset, duplicates, \
+                          verbosity=1):
+        """Add matching candidates as hits of the best one and
+            record them as duplicates.
+
+            Inputs:
+                imatches: Indices (into self.cands) of the matching
+                    candidates, in list order.
+                ibest: Index of the highest-sigma candidate.
+                offset: The list position of the first match (only
+                    used for reporting).
+                duplicates: List the duplicates are appended to.
+                verbosity: Verbosity level. (Default: 1)
 
+            Ouputs:
+                None
+        """
+        bestcand = self.cands[ibest]
+        matches = [(ii, self.cands[imatch]) \
+                        for ii, imatch in reversed(list(enumerate(imatches))) \
+                        if imatch != ibest]
+        bestcand.add_as_hits([match for ii, match in matches])
+        note = "This candidate is a duplicate of %s:%d" % \
+                    (bestcand.filename, bestcand.candnum)
+        for ii, match in matches:
+            match.note = note
+            if verbosity >= 2:
+                print("Removing %s:%d (index: %d)" % \
+                        (match.filename, match.candnum, offset+ii))
+                print("    %s" % match.note)
+        duplicates.extend(match for ii, match in matches)
+
+    @profiled
     def remove_harmonics(self, verbosity=1):
         """Remove the candidates that are lower significance harmonics
             of other candidates from the candlist.
@@ -780,83 +1720,76 @@ class Candlist(object):
         # Note:  should probably put the harmonics into the fundamental as hits (use sets)
         numremoved = 0
         self.cands.sort(key=attrgetter('sigma'), reverse=True)
-        f_err = r_err/self.cands[0].T
+        f_err = self.config.r_err/self.cands[0].T
         if verbosity >= 1:
             print("\nSearching for duplicate harmonics...")
-        ii = 0
-        while 1:
+        freqs = np.array([cand.f for cand in self.cands])
+        ifunds, iharms, intkinds, intfactors, iratios = \
+                    find_harmonic_pairs(freqs, f_err)
+        # Candidates are considered as fundamentals in order of
+        # decreasing sigma. A harmonic is removed by the first
+        # (still good) fundamental it matches.
+        good = np.ones(len(self.cands), dtype=bool)
+        removed = []
+        for ii, jj, intkind, factor, iratio in \
+                zip(ifunds, iharms, intkinds, intfactors, iratios):
+            if not (good[ii] and good[jj]):
+                continue
             fundcand = self.cands[ii]
-            jj = len(self.cands) - 1
-            zapj = 0
-            while 1:
-                harmcand = self.cands[jj]
-                if zapj:  print("Hey!")
-                for factor in np.arange(1.0, 17.0):
-                    if np.fabs(fundcand.f - harmcand.f*factor) < f_err*factor:
-                        zapj = 1
-                        harmstr = "1/%dth" % factor
-                    elif np.fabs(fundcand.f - harmcand.f/factor) < f_err/factor:
-                        zapj = 1
-                        if factor==2.0:
-                            harmstr = "%dnd" % factor
-                        else:
-                            harmstr = "%dth" % factor
-                    if zapj:
-                        if verbosity >= 2:
-                            print("Removing %s:%d (%.2f Hz) because it is " \
-                                    "a harmonic (%s) of %s:%d (%.2f Hz)" % \
-                                    (harmcand.filename, \
-                                        harmcand.candnum, \
-                                        harmcand.f, \
-                                        harmstr, \
-                                        fundcand.filename, \
-                                        fundcand.candnum, \
-                                        fundcand.f))
-                        break
-                # Check a few other common ratios
-                for numer,denom in zip([3.0, 5.0, 2.0, 4.0, 5.0, \
-                                        3.0, 5.0, 2.0, 3.0, 4.0],
-                                       [2.0, 2.0, 3.0, 3.0, 3.0, \
-                                        4.0, 4.0, 5.0, 5.0, 5.0]):
-                    factor = numer/denom
-                    if np.fabs(fundcand.f-harmcand.f*factor) < f_err*factor:
-                        if verbosity >= 2:
-                            print("Removing %s:%d (%.2f Hz) because it is " \
-                                    "a harmonic (%d/%dth) of %s:%d (%.2f Hz)" % \
-                                    (harmcand.filename, \
-                                        harmcand.candnum, \
-                                        harmcand.f, \
-                                        denom, \
-                                        numer, \
-                                        fundcand.filename, \
-                                        fundcand.candnum, \
-                                        fundcand.f))
-                        harmstr = "%d/%dth" % (denom, numer)
-                        zapj = 1
-                        break
-                if zapj:
-                    harmcand.note = "This candidate (P=%.4f s, DM=%.2f) is " \
-                                    "a harmonic (%s) of %s:%d " \
-                                    "(P=%.4f s, DM=%.2f)." % \
-                                (harmcand.p, harmcand.DM, harmstr, \
-                                    fundcand.filename, fundcand.candnum, \
-                                    fundcand.p, fundcand.DM)
-                    numremoved += 1
-                    self.mark_as_bad(jj, 'harmonic')
-                    if verbosity >= 2:
-                        print("Removing %s:%d (index: %d)" % \
-                                (harmcand.filename, harmcand.candnum, jj))
-                        print("    %s" % harmcand.note)
-                    zapj = 0
-                jj -= 1
-                if jj == ii:
-                    break
-            ii += 1
-            if ii >= len(self.cands) - 1:
-                break
+            harmcand = self.cands[jj]
+            if intkind == 1:
+                harmstr = "1/%dth" % factor
+            elif intkind == 2:
+                if factor == 2:
+                    harmstr = "%dnd" % factor
+                else:
+                    harmstr = "%dth" % factor
+            if intkind and verbosity >= 2:
+                print("Removing %s:%d (%.2f Hz) because it is " \
+                        "a harmonic (%s) of %s:%d (%.2f Hz)" % \
+                        (harmcand.filename, \
+                            harmcand.candnum, \
+                            harmcand.f, \
+                            harmstr, \
+                            fundcand.filename, \
+                            fundcand.candnum, \
+                            fundcand.f))
+            if iratio >= 0:
+                numer, denom = harm_ratios[iratio]
+                if verbosity >= 2:
+                    print("Removing %s:%d (%.2f Hz) because it is " \
+                            "a harmonic (%d/%dth) of %s:%d (%.2f Hz)" % \
+                            (harmcand.filename, \
+                                harmcand.candnum, \
+                                harmcand.f, \
+                                denom, \
+                                numer, \
+                                fundcand.filename, \
+                                fundcand.candnum, \
+                                fundcand.f))
+                harmstr = "%d/%dth" % (denom, numer)
+            harmcand.note = "This candidate (P=%.4f s, DM=%.2f) is " \
+                            "a harmonic (%s) of %s:%d " \
+                            "(P=%.4f s, DM=%.2f)." % \
+                        (harmcand.p, harmcand.DM, harmstr, \
+                            fundcand.filename, fundcand.candnum, \
+                            fundcand.p, fundcand.DM)
+            numremoved += 1
+            if verbosity >= 2:
+                print("Removing %s:%d (index: %d)" % \
+                        (harmcand.filename, harmcand.candnum, \
+                            jj - np.count_nonzero(~good[:jj])))
+                print("    %s" % harmcand.note)
+            good[jj] = False
+            removed.append(harmcand)
+        self.cands = [cand for cand, isgood in zip(self.cands, good) if isgood]
+        self.numbad['harmonic'] = self.numbad.get('harmonic', 0) + len(removed)
+        if self.trackbad:
+            self.badlists.setdefault('harmonic', []).extend(removed)
         if verbosity >= 1:
             print("Removed a total of %d harmonics.\n" % numremoved)
 
+    @profiled
     def remove_DM_problems(self, numdms, dmlist, low_DM_cutoff, verbosity=1):
         """Remove the candidates where any of the following are true:
             1) The number of hits is < numdms
@@ -872,68 +1805,101 @@ class Candlist(object):
             Ouputs:
                 None
         """
-        # Create a dictionary where the key is the dmstr 
-        # and the values are the index
-        dmdict = {}
+        # The DM grid as a sorted float array.  'dmind' holds the
+        # index each grid DM is known by, i.e. that of the last DM
+        # sharing its '%.2f' string.
         dms = np.unique([float(dm) for dm in dmlist])
         dmstrs = ['%.2f'%dm for dm in dms]
         dmdict = dict(list(zip(dmstrs, list(range(len(dms))))))
-        numremoved = 0
-        num_toofew = 0
-        num_toolow = 0
-        num_gaps = 0
+        dmind = np.asarray([dmdict[dmstr] for dmstr in dmstrs], dtype=np.int64)
         self.cands.sort(key=attrgetter('sigma'), reverse=True)
-        for ii in reversed(list(range(len(self.cands)))):
+
+        # Flatten the hits (DM, SNR, sigma) of all candidates
+        numhits = np.fromiter((len(cand.hits) for cand in self.cands),
+                              dtype=np.int64, count=len(self.cands))
+        offsets = np.concatenate(([0], np.cumsum(numhits)[:-1])).astype(np.int64)
+        hits = Hits.join([cand.hits for cand in self.cands]).data
+        hitdms, hitsigmas = hits['DM'], hits['sigma']
+        candidx = np.repeat(np.arange(len(self.cands)), numhits)
+
+        # 1) Too few DM hits
+        toofew = numhits < numdms
+
+        # 2) The (first) hit with max sigma is at too low a DM
+        imaxs = np.zeros(len(self.cands), dtype=np.int64)
+        toolow = np.zeros(len(self.cands), dtype=bool)
+        nonempty = numhits > 0
+        if len(hits):
+            segmax = np.maximum.reduceat(hitsigmas, offsets[nonempty])
+            # np.argmax() picks the first NaN, if there is one
+            ismax = (hitsigmas == np.repeat(segmax, numhits[nonempty])) | \
+                        np.isnan(hitsigmas)
+            imaxs[nonempty] = np.minimum.reduceat(np.where(ismax, \
+                                np.arange(len(hits)), len(hits)), offsets[nonempty])
+            toolow[nonempty] = hitdms[imaxs[nonempty]] <= low_DM_cutoff
+            toolow &= ~toofew
+
+        # 3) No hits at consecutive DMs.  The hits of the candidates
+        # that get this far are (stably) sorted by DM.
+        gaps = np.zeros(len(self.cands), dtype=bool)
+        tocheck = ~toofew & ~toolow & (numhits > 1)
+        if tocheck.any():
+            uniqdms, dmranks = np.unique(hitdms, return_inverse=True)
+            order = np.argsort(candidx*len(uniqdms) + dmranks.ravel(),
+                               kind='stable')
+            sorted_dms = hitdms[order]
+            hitmask = tocheck[candidx]
+            unsorted = np.zeros(len(self.cands), dtype=bool)
+            unsorted[nonempty] = np.logical_or.reduceat( \
+                            order != np.arange(len(hits)), offsets[nonempty])
+            sorted_hits = hits[order]
+            for ii, off, num in zip(*[arr[tocheck & unsorted].tolist() for arr in \
+                                    (np.arange(len(self.cands)), offsets, numhits)]):
+                self.cands[ii].hits = sorted_hits[off:off+num]
+            # Map the hit DMs onto the grid.  Those that are not exactly
+            # grid DMs are looked up by their '%.2f' string.
+            dm_indices = np.zeros(len(hits), dtype=np.int64)
+            checkdms = sorted_dms[hitmask]
+            pos = np.minimum(np.searchsorted(dms, checkdms), max(len(dms)-1, 0))
+            exact = (dms[pos] == checkdms) if len(dms) else \
+                        np.zeros(len(checkdms), dtype=bool)
+            checkinds = np.where(exact, dmind[pos] if len(dms) else 0, 0)
+            for jj in np.flatnonzero(~exact):
+                checkinds[jj] = dmdict["%.2f"%checkdms[jj]]
+            dm_indices[hitmask] = checkinds
+            diffs = np.empty(len(hits), dtype=np.int64)
+            diffs[:-1] = dm_indices[1:] - dm_indices[:-1]
+            # Mask the differences across candidate boundaries
+            diffs[(offsets + numhits - 1)[nonempty]] = np.iinfo(np.int64).max
+            min_dmind_diff = np.zeros(len(self.cands), dtype=np.int64)
+            min_dmind_diff[nonempty] = np.minimum.reduceat(diffs, offsets[nonempty])
+            gaps = tocheck & (min_dmind_diff > 1)
+
+        isbad = toofew | toolow | gaps
+        numremoved = int(np.sum(isbad))
+        num_toofew = int(np.sum(toofew))
+        num_toolow = int(np.sum(toolow))
+        num_gaps = int(np.sum(gaps))
+        for ii in np.flatnonzero(isbad)[::-1]:
             currcand = self.cands[ii]
-            # Remove all the candidates without enough DM hits
-            if len(currcand.hits) < numdms:
-                numremoved += 1
-                num_toofew += 1
+            if toofew[ii]:
                 currcand.note = "Candidate has only %d DM hits. This is less " \
                                 "than minimum for 'good' cands (%d hits)" % \
                                 (len(currcand.hits), numdms)
-                self.mark_as_bad(ii, 'dmproblem')
-                if verbosity >= 2:
-                    print("Removing %s:%d (index: %d)" % \
-                            (currcand.filename, currcand.candnum, ii))
-                    print("    %s" % currcand.note)
-                continue
-
-            # Remove all the candidates where the max sigma DM is 
-            # less than the cutoff DM
-            # Recall - A hit is a 3-tuple: (DM, SNR, sigma)
-            imax = np.argmax(np.array([hit[2] for hit in currcand.hits]))
-            hitdm, hitsnr, hitsigma = currcand.hits[imax]
-            if float(hitdm) <= low_DM_cutoff:
-                numremoved += 1
-                num_toolow += 1
+            elif toolow[ii]:
+                # Recall - A hit is a 3-tuple: (DM, SNR, sigma)
+                hitdm, hitsnr, hitsigma = currcand.hits[imaxs[ii]-offsets[ii]]
                 currcand.note = "Hit with max sigma (%g) has dm (%.2f) " \
                                 "<= low DM cutoff (%.2f) " % \
                                     (hitsigma, hitdm, low_DM_cutoff)
-                self.mark_as_bad(ii, 'dmproblem')
-                if verbosity >= 2:
-                    print("Removing %s:%d (index: %d)" % \
-                            (currcand.filename, currcand.candnum, ii))
-                    print("    %s" % currcand.note)
-                continue
-
-            # Remove all the candidates where there are no hits at consecutive DMs
-            if len(currcand.hits) > 1:
-                currcand.hits.sort(key=lambda cand: float(cand[0]))
-                dm_indices = np.asarray([dmdict["%.2f"%currcand.hits[jj][0]]
-                                          for jj in range(len(currcand.hits))])
-                min_dmind_diff = min(dm_indices[1:] - dm_indices[:-1])
-                if min_dmind_diff > 1:
-                    numremoved += 1
-                    num_gaps += 1
-                    currcand.note = "DM list of hits has gaps (i.e. " \
-                                    "consecutive DMs don't have hits)."
-                    self.mark_as_bad(ii, 'dmproblem')
-                    if verbosity >= 2:
-                        print("Removing %s:%d (index: %d)" % \
-                                (currcand.filename, currcand.candnum, ii))
-                        print("    %s" % currcand.note)
-                    continue
+            else:
+                currcand.note = "DM list of hits has gaps (i.e. " \
+                                "consecutive DMs don't have hits)."
+            if verbosity >= 2:
+                print("Removing %s:%d (index: %d)" % \
+                        (currcand.filename, currcand.candnum, ii))
+                print("    %s" % currcand.note)
+        self.mark_many_as_bad(np.flatnonzero(isbad), 'dmproblem')
 
         if verbosity >= 1:
             print("Removed %d candidates with DM problems.\n" % numremoved)
@@ -981,31 +1947,24 @@ class Candlist(object):
         if summaryfilenm not in [None, sys.stdout, sys.stderr]:
             summaryfile.close()
   
-    def write_cand_report(self, reportfilenm=None):
+    def write_cand_report(self, reportfilenm=None, compress=None):
         """Write a report of all bad candidates to file (or stdout).
 
             Input:
                 reportfilenm: Name of file to write to. If None write to stdout.
                     (Default: write to stdout).
+                compress: If True, gzip the report. (Default: compress
+                    if reportfilenm ends with '.gz')
 
             Outputs:
                 None
         """
-        if reportfilenm is None:
-            reportfile = sys.stdout
-        else:
-            reportfile = open(reportfilenm, "w")
-        reportfile.write("#" + "file:candnum".center(66) + "DM".center(9) +
-                       "SNR".center(8) + "sigma".center(8) + "numharm".center(9) +
-                       "ipow".center(9) + "cpow".center(9) +  "P(ms)".center(14) +
-                       "r".center(12) + "z".center(8) + "numhits".center(9) + "\n")
         badcands = self.get_all_badcands()
-        for badcand in badcands:
-            reportfile.write("%s (%d)\n" % (str(badcand), len(badcand.hits)))
-            reportfile.write("    Note: %s\n\n" % badcand.note)
-        if reportfilenm is not None:
-            reportfile.close()
-        
+        text, ends = _format_text(cand_fmt + " (%d)\n    Note: %s\n\n",
+                                  _cand_columns(badcands) + \
+                                      [[len(cand.hits) for cand in badcands],
+                                       [cand.note for cand in badcands]])
+        _write_text_output(reportfilenm, report_header + text, compress)
 
     def __add__(self, other):
         copy_of_self = copy.deepcopy(self)
@@ -1042,42 +2001,663 @@ class Candlist(object):
         for key in other.badlists:
             bad = self.badlists.setdefault(key, [])
             bad.extend(other.badlists[key])
+        for key, num in other.numbad.items():
+            self.numbad[key] = self.numbad.get(key, 0) + num
 
-    def to_file(self, candfilenm=None):
+    @profiled
+    def to_file(self, candfilenm=None, compress=None):
         """Write Candlist to file (or stdout).
+
+            The lines of all the candidates (and of their DM hits) are
+            formatted in bulk and written out in one go.
             
             Input:
                 candfilenm: Name of file to write to. If None,
                     write to stdout. (Default: write to stdout).
+                compress: If True, gzip the file. (Default: compress
+                    if candfilenm ends with '.gz')
+
+            Outputs:
+                None
+        """
+        numhits = np.fromiter((len(cand.hits) for cand in self.cands),
+                              dtype=np.int64, count=len(self.cands))
+        candlines = _format_lines(cand_fmt + " %8.2f (%d)\n",
+                                  _cand_columns(self.cands) + \
+                                      [[cand.w for cand in self.cands],
+                                       numhits.tolist()])
+        # The hits of the candidates with more than one are listed in
+        # DM order, and are left sorted that way
+        multi = numhits > 1
+        hits = sort_hits(self.cands, numhits, multi)
+        hits = hits[np.repeat(multi, numhits)]
+        numstars = np.trunc(hits['sigma']/3.0)
+        numstars = np.where(numstars > 0, numstars, 0).astype(np.int64)
+        stars = np.array([b'*'*num for num in \
+                            range(int(numstars.max(initial=0))+1)])
+        hittext, hitends = _format_text("  DM=%6.2f SNR=%5.2f Sigma=%5.2f   %s\n",
+                                        [hits['DM'], hits['snr'], hits['sigma'],
+                                         stars[numstars]])
+        # Interleave the candidate lines and their blocks of hit lines
+        hitends = np.concatenate(([0], hitends))
+        blockends = hitends[np.cumsum(numhits * multi)].tolist()
+        lines = [candfile_header]
+        start = 0
+        for candline, end in zip(candlines, blockends):
+            lines.append(candline)
+            lines.append(hittext[start:end])
+            start = end
+        _write_text_output(candfilenm, "".join(lines), compress)
+
+    def to_columns(self, filenm, format=None):
+        """Write the good candidates as columns to a binary file,
+            either a NumPy .npz file or a Parquet file (this needs
+            pyarrow). There is one row per candidate, as in to_file.
+            The DM hits of all the candidates are concatenated (in DM
+            order) into the 'hit_DM', 'hit_snr' and 'hit_sigma'
+            arrays of an .npz file, with those of candidate i at
+            'hit_offsets[i]:hit_offsets[i+1]'. In a Parquet file each
+            row has lists of its hits instead.
+
+            Input:
+                filenm: Name of file to write to.
+                format: 'npz' or 'parquet'. (Default: 'parquet' if
+                    filenm ends with '.parquet', otherwise 'npz')
 
             Outputs:
                 None
         """
-        if candfilenm is None:
-            candfile = sys.stdout
+        if format is None:
+            format = "parquet" if filenm.endswith(".parquet") else "npz"
+        cands = self.cands
+        numhits = np.fromiter((len(cand.hits) for cand in cands),
+                              dtype=np.int64, count=len(cands))
+        hits = sort_hits(cands, numhits, numhits > 1)
+        hit_offsets = np.zeros(len(cands)+1, dtype=np.int64)
+        np.cumsum(numhits, out=hit_offsets[1:])
+        columns = [('filename', np.array([cand.filename for cand in cands], dtype=str)),
+                   ('candnum', np.array([cand.candnum for cand in cands], dtype=np.int64)),
+                   ('DMstr', np.array([cand.DMstr for cand in cands], dtype=str))]
+        for name in ['DM', 'snr', 'sigma', 'ipow_det', 'cpow', 'p', 'f',
+                     'r', 'z', 'w', 'T']:
+            columns.append((name, np.array([getattr(cand, name) for cand in cands],
+                                           dtype=np.float64)))
+        columns.append(('numharm', np.array([cand.numharm for cand in cands],
+                                            dtype=np.int32)))
+        columns.append(('numhits', numhits))
+        if format == "npz":
+            columns.append(('hit_offsets', hit_offsets))
+            for name in hit_dtype.names:
+                columns.append(('hit_'+name, np.ascontiguousarray(hits[name])))
+            # Write then rename so readers never see a partial file
+            tmpfilenm = filenm + ".tmp.npz"
+            np.savez(tmpfilenm, **dict(columns))
+            os.replace(tmpfilenm, filenm)
+        elif format == "parquet":
+            try:
+                import pyarrow
+                import pyarrow.parquet
+            except ImportError:
+                raise ImportError("Writing Parquet files needs pyarrow")
+            arrays = [pyarrow.array(col) for name, col in columns]
+            names = [name for name, col in columns]
+            for name in hit_dtype.names:
+                arrays.append(pyarrow.ListArray.from_arrays(
+                    pyarrow.array(hit_offsets.astype(np.int32)),
+                    pyarrow.array(np.ascontiguousarray(hits[name]))))
+                names.append('hit_'+name)
+            pyarrow.parquet.write_table(
+                pyarrow.Table.from_arrays(arrays, names=names), filenm)
         else:
-            candfile = open(candfilenm, "w")
-
-        # Write header
-        candfile.write("#" + "file:candnum".center(66) + "DM".center(9) +
-                       "SNR".center(8) + "sigma".center(8) + "numharm".center(9) +
-                       "ipow".center(9) + "cpow".center(9) +  "P(ms)".center(14) +
-                       "r".center(12) + "z".center(8) + "w".center(8) + "numhits".center(9) + "\n")
-        for goodcand in self.cands:
-            candfile.write(
-                         "%s %8.2f (%d)\n"
-                         % (str(goodcand),goodcand.w,len(goodcand.hits)))
-            if (len(goodcand.hits) > 1):
-                goodcand.hits.sort(key=lambda cand: float(cand[0]))
-                for hit in goodcand.hits:
-                    numstars = int(hit[2]/3.0)
-                    candfile.write("  DM=%6.2f SNR=%5.2f Sigma=%5.2f   "%hit + \
-                                    numstars*'*' + '\n')
-        if candfilenm is not None:
-            candfile.close()
-
-
-def candlist_from_candfile(filename, trackbad=False, trackdupes=False):
+            raise ValueError("Unknown columnar format '%s'" % format)
+
+class ColumnarCandlist(object):
+    """An array-backed alternative to Candlist.
+
+        Candidates are stored column-wise in a NumPy structured array
+        (see 'cand_dtype') and their harmonic powers/amplitudes in flat
+        buffers indexed by 'harm_offsets'. The preliminary rejection
+        passes are applied as boolean masks over whole columns, which is
+        much faster than walking a list of Candidate objects when there
+        are millions of candidates.
+
+        The array engine covers the per-file stage of sifting (i.e.
+        before duplicate removal), so every candidate's only hit is
+        itself. Use 'to_candlist' to convert to a regular Candlist
+        for duplicate/DM/harmonic removal.
+    """
+    def __init__(self, data=None, harm_pows=None, harm_amps=None,
+                 harm_offsets=None, filenames=None, DMstrs=None,
+                 notes=None, trackbad=False, trackdupes=False,
+                 badlists=None, config=None):
+        if data is None:
+            data = np.zeros(0, dtype=cand_dtype)
+        self.data = data
+        if harm_offsets is None:
+            harm_offsets = np.zeros(len(data)+1, dtype=np.int64)
+            np.cumsum(data['numharm'], out=harm_offsets[1:])
+        self.harm_offsets = harm_offsets
+        if harm_pows is None:
+            harm_pows = np.zeros(harm_offsets[-1], dtype=np.float64)
+        self.harm_pows = harm_pows
+        if harm_amps is None:
+            harm_amps = np.zeros(harm_offsets[-1], dtype=np.complex64)
+        self.harm_amps = harm_amps
+        # Filenames (and their DM strings) indexed by data['fileidx']
+        self.filenames = [] if filenames is None else filenames
+        self.DMstrs = [] if DMstrs is None else DMstrs
+        if notes is None:
+            notes = np.empty(len(data), dtype=object)
+            notes[:] = ""
+        self.notes = notes
+        self.trackbad = trackbad
+        self.trackdupes = trackdupes
+        self.config = SiftConfig() if config is None else config
+        if badlists is None:
+            badlists = dict((key, ColumnarCandlist(badlists={})) \
+                                for key in badlist_names)
+        self.badlists = badlists
+        self.numbad = dict((key, 0) for key in badlist_names)
+        self.duplicates = []
+
+    @classmethod
+    def from_candlist(cls, candlist):
+        """Build a ColumnarCandlist from a Candlist.
+
+            Inputs:
+                candlist: The Candlist to convert.
+
+            Outputs:
+                colcands: The equivalent ColumnarCandlist.
+        """
+        colcands = cls._from_cands(candlist.cands)
+        colcands.trackbad = candlist.trackbad
+        colcands.trackdupes = candlist.trackdupes
+        colcands.config = candlist.config
+        for key in candlist.badlists:
+            bad = colcands.badlists.setdefault(key, ColumnarCandlist(badlists={}))
+            bad.extend(cls._from_cands(candlist.badlists[key]))
+        colcands.numbad = dict(candlist.numbad)
+        colcands.duplicates = list(candlist.duplicates)
+        return colcands
+
+    @classmethod
+    def _from_cands(cls, cands):
+        filenames = []
+        DMstrs = []
+        fileidxs = {}
+        data = np.zeros(len(cands), dtype=cand_dtype)
+        for ii, cand in enumerate(cands):
+            fullname = os.path.join(cand.path, cand.filename)
+            if fullname not in fileidxs:
+                fileidxs[fullname] = len(filenames)
+                filenames.append(fullname)
+                DMstrs.append(cand.DMstr)
+            data[ii] = (cand.candnum, cand.sigma, cand.numharm,
+                        cand.ipow_det, cand.cpow, cand.r, cand.f, cand.p,
+                        cand.z, cand.w, cand.DM, cand.T, cand.snr,
+                        fileidxs[fullname])
+        colcands = cls(data, filenames=filenames, DMstrs=DMstrs, badlists={})
+        for ii, cand in enumerate(cands):
+            lo, hi = colcands.harm_offsets[ii:ii+2]
+            colcands.harm_pows[lo:hi] = cand.harm_pows
+            colcands.harm_amps[lo:hi] = cand.harm_amps
+        colcands.notes[:] = [cand.note for cand in cands]
+        return colcands
+
+    @classmethod
+    def concatenate(cls, colcandlists, trackbad=False, trackdupes=False,
+                    config=None):
+        """Combine several ColumnarCandlists (including their bad-lists)
+            into a single one in one pass.
+
+            Inputs:
+                colcandlists: A sequence of ColumnarCandlist objects.
+                trackbad: Keep track of bad candidates. (Default: False)
+                trackdupes: Keep track of duplicates. (Default: False)
+                config: The SiftConfig of the combined list.
+                    (Default: the module globals)
+
+            Outputs:
+                colcands: The combined ColumnarCandlist.
+        """
+        filenames = []
+        DMstrs = []
+        fileidxs = {}
+        datas = []
+        harm_pows = []
+        harm_amps = []
+        notes = []
+        duplicates = []
+        for colcands in colcandlists:
+            remap = np.zeros(len(colcands.filenames), dtype=np.int32)
+            for ii, (filenm, DMstr) in \
+                    enumerate(zip(colcands.filenames, colcands.DMstrs)):
+                if filenm not in fileidxs:
+                    fileidxs[filenm] = len(filenames)
+                    filenames.append(filenm)
+                    DMstrs.append(DMstr)
+                remap[ii] = fileidxs[filenm]
+            data = colcands.data.copy()
+            if len(data):
+                data['fileidx'] = remap[data['fileidx']]
+            datas.append(data)
+            harm_pows.append(colcands.harm_pows)
+            harm_amps.append(colcands.harm_amps)
+            notes.append(colcands.notes)
+            duplicates.extend(colcands.duplicates)
+        if not datas:
+            return cls(trackbad=trackbad, trackdupes=trackdupes, config=config)
+        badlists = {}
+        for colcands in colcandlists:
+            for key in colcands.badlists:
+                if key not in badlists:
+                    badlists[key] = cls.concatenate([c.badlists[key] \
+                            for c in colcandlists if key in c.badlists])
+        combined = cls(np.concatenate(datas),
+                       harm_pows=np.concatenate(harm_pows),
+                       harm_amps=np.concatenate(harm_amps),
+                       filenames=filenames, DMstrs=DMstrs,
+                       notes=np.concatenate(notes),
+                       trackbad=trackbad, trackdupes=trackdupes,
+                       badlists=badlists, config=config)
+        for colcands in colcandlists:
+            for key, num in colcands.numbad.items():
+                combined.numbad[key] = combined.numbad.get(key, 0) + num
+        combined.duplicates = duplicates
+        return combined
+
+    def __len__(self):
+        # return the number of good candidates
+        return len(self.data)
+
+    def get_numcands(self):
+        """Get the number of good candidates (i.e. len(self.data)).
+
+            Inputs:
+                None
+
+            Outputs:
+                None
+        """
+        return len(self)
+
+    def __iter__(self):
+        for ii in range(len(self.data)):
+            yield self.get_candidate(ii)
+
+    def __getitem__(self, key):
+        return self.get_candidate(key)
+
+    def get_candidate(self, ii):
+        """Build a Candidate object for row 'ii'.
+
+            Inputs:
+                ii: The index of the candidate.
+
+            Outputs:
+                cand: A Candidate instance.
+        """
+        row = self.data[ii]
+        fileidx = int(row['fileidx'])
+        cand = Candidate(int(row['candnum']), float(row['sigma']),
+                         int(row['numharm']), float(row['ipow']),
+                         float(row['cpow']), float(row['r']),
+                         float(row['z']), self.DMstrs[fileidx],
+                         self.filenames[fileidx], float(row['T']),
+                         float(row['w']))
+        cand.snr = float(row['snr'])
+        lo, hi = self.harm_offsets[ii:ii+2]
+        cand.harm_pows = self.harm_pows[lo:hi].copy()
+        cand.harm_amps = self.harm_amps[lo:hi].copy()
+        cand.hits = [(cand.DM, cand.snr, cand.sigma)]
+        cand.note = self.notes[ii]
+        return cand
+
+    def get_all_cands(self):
+        return self.get_all_goodcands() + self.get_all_badcands()
+
+    def get_all_goodcands(self):
+        return list(self) + self.duplicates
+
+    def get_all_badcands(self):
+        cands = []
+        for key in list(self.badlists.keys()):
+            cands += list(self.badlists[key])
+        return cands
+
+    def to_candlist(self):
+        """Convert to a regular Candlist of Candidate objects.
+
+            Inputs:
+                None
+
+            Outputs:
+                candlist: The equivalent Candlist.
+        """
+        candlist = Candlist(list(self), trackbad=self.trackbad, \
+                            trackdupes=self.trackdupes, config=self.config)
+        for key in self.badlists:
+            candlist.badlists[key] = list(self.badlists[key])
+        candlist.numbad = dict(self.numbad)
+        candlist.duplicates = list(self.duplicates)
+        return candlist
+
+    def take(self, indices):
+        """Return a new ColumnarCandlist (without bad-lists) made
+            of the candidates at 'indices', in that order.
+
+            Inputs:
+                indices: An integer array of candidate indices.
+
+            Outputs:
+                colcands: The selected candidates.
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        data = self.data[indices]
+        offsets = np.zeros(len(indices)+1, dtype=np.int64)
+        np.cumsum(data['numharm'], out=offsets[1:])
+        harmidx = np.repeat(self.harm_offsets[indices] - offsets[:-1], \
+                            data['numharm']) + np.arange(offsets[-1])
+        return ColumnarCandlist(data, harm_pows=self.harm_pows[harmidx],
+                                harm_amps=self.harm_amps[harmidx],
+                                harm_offsets=offsets,
+                                filenames=self.filenames, DMstrs=self.DMstrs,
+                                notes=self.notes[indices], badlists={},
+                                config=self.config)
+
+    def extend(self, other):
+        """Extend ColumnarCandlist with another. This combines
+            the candidates, as well as the lists of bad cands.
+
+            Inputs:
+                other: A second ColumnarCandlist object to extend from.
+
+            Outputs:
+                None - the original object is extended in place.
+        """
+        combined = ColumnarCandlist.concatenate([self, other], \
+                        trackbad=self.trackbad, trackdupes=self.trackdupes,
+                        config=self.config)
+        self.__dict__.update(combined.__dict__)
+
+    def mark_as_bad(self, badmask, badlistname, note=None):
+        """Move the candidates flagged in 'badmask' to a bad-list.
+
+            Candidates are appended to the bad-list in reverse
+            order, the same order Candlist's rejection loops use.
+
+            Inputs:
+                badmask: Boolean array flagging the bad candidates.
+                badlistname: The name of the bad-list.
+                note: A function taking the array of bad indices and
+                    returning their notes. Only called when bad
+                    candidates are tracked. (Default: no note)
+
+            Outputs:
+                None
+        """
+        ibad = np.flatnonzero(badmask)[::-1]
+        if not len(ibad):
+            return
+        self.numbad[badlistname] = self.numbad.get(badlistname, 0) + len(ibad)
+        if self.trackbad:
+            bad = self.take(ibad)
+            if note is not None:
+                bad.notes[:] = note(ibad)
+            badlist = self.badlists.setdefault(badlistname, \
+                                               ColumnarCandlist(badlists={}))
+            badlist.extend(bad)
+        igood = np.flatnonzero(~badmask)
+        if len(igood) < len(self.data):
+            kept = self.take(igood)
+            self.data = kept.data
+            self.harm_pows = kept.harm_pows
+            self.harm_amps = kept.harm_amps
+            self.harm_offsets = kept.harm_offsets
+            self.notes = kept.notes
+
+    def reject_longperiod(self, long_period=None):
+        """Find and remove very long period candidates.
+            Long period candidates are moved to the 'longperiod' bad-list.
+
+            Inputs:
+                long_period: The longest allowed period for a 'good' cand.
+                    (Default: config.long_period)
+
+            Outputs:
+                None
+        """
+        if long_period is None:
+            long_period = self.config.long_period
+        ps = self.data['p']
+        self.mark_as_bad(ps > long_period, 'longperiod', \
+                lambda ibad: ["Period is too long (%g ms > %g ms)" % \
+                              (p*1000, long_period*1000) for p in ps[ibad]])
+
+    def reject_shortperiod(self, short_period=None):
+        """Find and remove very short period candidates.
+            Short period candidates are moved to the 'shortperiod' bad-list.
+
+            Inputs:
+                short_period: The shortest allowed period for a 'good' cand.
+                    (Default: config.short_period)
+
+            Outputs:
+                None
+        """
+        if short_period is None:
+            short_period = self.config.short_period
+        ps = self.data['p']
+        self.mark_as_bad(ps < short_period, 'shortperiod', \
+                lambda ibad: ["Period is too short (%g ms < %g ms)" % \
+                              (p*1000, short_period*1000) for p in ps[ibad]])
+
+    def reject_knownbirds(self, known_birds_f=None, known_birds_p=None):
+        """Find and remove candidates conincident with known birds.
+
+            Inputs:
+                known_birds_f: A list of tuples containing bad frequencies
+                    and widths. The tuples should contain
+                        (<bad freq (Hz)>, <one-sided width (Hz)>)
+                    A BirdIndex can be given instead.
+                    (Default: config.known_birds_f)
+                known_birds_p: A list of tuples containing bad peridocities
+                    and widths. The tuples should contain
+                        (<bad freq (ms)>, <one-sided width (ms)>)
+                    A BirdIndex can be given instead.
+                    (Default: config.known_birds_p)
+
+            Outputs:
+                None
+        """
+        if known_birds_f is None:
+            known_birds_f = self.config.known_birds_f
+        if known_birds_p is None:
+            known_birds_p = self.config.known_birds_p
+        if not isinstance(known_birds_f, BirdIndex):
+            known_birds_f = BirdIndex(known_birds_f)
+        if not isinstance(known_birds_p, BirdIndex):
+            known_birds_p = BirdIndex(known_birds_p)
+        fs = self.data['f']
+        # Index of the first bird matched by each candidate (-1 if none)
+        ibird_f = known_birds_f.first_match(fs)
+        ibird_p = known_birds_p.first_match(self.data['p']*1000.0)
+
+        def note(ibad):
+            notes = []
+            for ii in ibad:
+                if ibird_f[ii] >= 0:
+                    bird, err = known_birds_f[ibird_f[ii]]
+                    notes.append("Freq (%.2f Hz) is within %g Hz " \
+                                 "of a known birdie centred at %.2f Hz" % \
+                                 (fs[ii], err, bird))
+                else:
+                    bird, err = known_birds_p[ibird_p[ii]]
+                    notes.append("Period (%.2f ms) is within %g ms " \
+                                 "of a known birdie centred at %.2f ms" % \
+                                 (fs[ii]*1000, err, bird))
+            return notes
+        self.mark_as_bad((ibird_f >= 0) | (ibird_p >= 0), 'knownbirds', note)
+
+    def reject_threshold(self, sigma_threshold=None, \
+                    c_pow_threshold=None):
+        """Find and remove candidates that don't pass our threshold.
+            The conditions for rejection are different for candidates
+            with a single harmonic, and multiple harmonics.
+
+            Inputs:
+                sigma_threshold: The threshold for sigma.
+                    (Default: config.sigma_threshold)
+                c_pow_threshold: The threshold for coherent power.
+                    (Default: config.c_pow_threshold)
+
+            Outputs:
+                None
+        """
+        if sigma_threshold is None:
+            sigma_threshold = self.config.sigma_threshold
+        if c_pow_threshold is None:
+            c_pow_threshold = self.config.c_pow_threshold
+        sigmas = self.data['sigma']
+        cpows = self.data['cpow']
+        numharms = self.data['numharm']
+        single = numharms == 1
+        badmask = (sigmas < sigma_threshold) & \
+                    (~single | (cpows < c_pow_threshold))
+
+        def note(ibad):
+            notes = []
+            for ii in ibad:
+                if single[ii]:
+                    notes.append("Only 1 harmonic and both sigma " \
+                                 "(%g < %g) and coherent power (%g < %g) are " \
+                                 "too low." % (sigmas[ii], sigma_threshold, \
+                                               cpows[ii], c_pow_threshold))
+                else:
+                    notes.append("%d harmonics and sigma " \
+                                 "(%g < %g) is too low." % \
+                                 (numharms[ii], sigmas[ii], sigma_threshold))
+            return notes
+        self.mark_as_bad(badmask, 'threshold', note)
+
+    def reject_harmpowcutoff(self, harm_pow_cutoff=None):
+        """Find and remove the candidates where the harmonic with the
+            highest power is not more than harm_pow_cutoff.
+
+            Inputs:
+                harm_pow_cutoff: Minimum power for a good harmonic.
+                    (Default: config.harm_pow_cutoff)
+
+            Outputs:
+                None
+        """
+        if harm_pow_cutoff is None:
+            harm_pow_cutoff = self.config.harm_pow_cutoff
+        if not len(self.data):
+            return
+        maxpows = np.maximum.reduceat(self.harm_pows, self.harm_offsets[:-1])
+        self.mark_as_bad(maxpows < harm_pow_cutoff, 'harmpowcutoff', \
+                lambda ibad: ["All harmonics have power < %g" % \
+                              harm_pow_cutoff] * len(ibad))
+
+    def reject_rogueharmpow(self):
+        """Find and remove candidates which are dominated by a single
+            high-power but high-numbered harmonic.
+
+            Inputs:
+                None
+
+            Ouputs:
+                None
+        """
+        numharms = self.data['numharm']
+        maxharms = np.zeros(len(self.data), dtype=np.int64)
+        badmask = np.zeros(len(self.data), dtype=bool)
+        # Candidates with the same number of harmonics can be
+        # handled together as a 2-D (numcands x numharm) array
+        for numharm in np.unique(numharms[numharms >= 4]):
+            icands = np.flatnonzero(numharms == numharm)
+            harmidx = self.harm_offsets[icands][:,np.newaxis] + \
+                        np.arange(numharm)
+            pows = self.harm_pows[harmidx]
+            maxharm = np.argmax(pows, axis=1)
+            maxpow = pows[np.arange(len(icands)), maxharm]
+            nextpow = np.sort(pows, axis=1)[:,-2]
+            # Max-power harmonic is at least 2x more powerful than the
+            # next highest-power harmonic, and is the 4+th harmonic
+            # our of 8+ harmonics, or at least 3x more powerful and
+            # the 2+th harmonic our of 4+ harmonics
+            rogue = (maxharm > 2) & (maxpow > 3*nextpow)
+            if numharm >= 8:
+                rogue |= (maxharm > 4) & (maxpow > 2*nextpow)
+            maxharms[icands] = maxharm
+            badmask[icands] = rogue
+        self.mark_as_bad(badmask, 'rogueharmpow', \
+                lambda ibad: ["High-numbered harmonic (%d) has too " \
+                              "much power" % maxharms[ii] for ii in ibad])
+
+    def default_rejection(self):
+        """Run all rejection methonds with default arguments.
+
+            Inputs:
+                None
+
+            Outputs:
+                None
+        """
+        self.reject_longperiod()
+        self.reject_shortperiod()
+        self.reject_knownbirds()
+        self.reject_threshold()
+        self.reject_harmpowcutoff()
+        self.reject_rogueharmpow()
+
+    def print_cand_summary(self, summaryfilenm=None):
+        """Write a summary of all candidates to file (or stdout).
+            See Candlist.print_cand_summary.
+        """
+        self.to_candlist().print_cand_summary(summaryfilenm)
+
+    def plot_summary(self, usefreqs=True, headless=False):
+        """Produce a plot summarizing the sifiting performed, straight
+            from the candidate columns. See Candlist.plot_summary.
+        """
+        return _plotting().plot_summary(self, usefreqs,
+                        self.config.short_period, self.config.long_period,
+                        headless)
+
+    def plot_rejects(self, usefreqs=True, headless=False):
+        """Produce a plot showing why candidates were rejected, straight
+            from the candidate columns. See Candlist.plot_rejects.
+        """
+        return _plotting().plot_rejects(self, usefreqs,
+                        self.config.short_period, self.config.long_period,
+                        headless)
+
+    def write_cand_report(self, reportfilenm=None, compress=None):
+        """Write a report of all bad candidates to file (or stdout).
+            See Candlist.write_cand_report.
+        """
+        self.to_candlist().write_cand_report(reportfilenm, compress)
+
+    def to_file(self, candfilenm=None, compress=None):
+        """Write ColumnarCandlist to file (or stdout).
+            See Candlist.to_file.
+        """
+        self.to_candlist().to_file(candfilenm, compress)
+
+    def to_columns(self, filenm, format=None):
+        """Write the good candidates as columns to a binary file.
+            See Candlist.to_columns.
+        """
+        self.to_candlist().to_columns(filenm, format)
+
+
+def candlist_from_candfile(filename, trackbad=False, trackdupes=False,
+                           config=None):
+    if config is None:
+        config = SiftConfig()
     candfile = open(filename, 'r')
     # First identify the length of the observation searched
     for line in candfile:
@@ -1092,6 +2672,8 @@ def candlist_from_candfile(filename, trackbad=False, trackdupes=False):
 
     cands = []
     candnums = []
+    # The candidates whose harmonics have all been read in
+    finished = []
     current_goodcandnum = 0
     last_candnum = 0
     last_goodcandnum = 0
@@ -1124,8 +2706,7 @@ def candlist_from_candfile(filename, trackbad=False, trackdupes=False):
             DMstr = DM_re.search(filename).groups()[0]
             cand = Candidate(candnum, sigma, numharm,
                                           i_pow_det, c_pow, bin, z, 
-                                          DMstr, filename, tobs)
-            cand.w = w   # === JERK SUPPORT ===
+                                          DMstr, filename, tobs, w)
             cands.append(cand)
             candnums.append(candnum)
             last_candnum = candnum
@@ -1141,28 +2722,21 @@ def candlist_from_candfile(filename, trackbad=False, trackdupes=False):
             if candnum in candnums:
                 cand = cands[candnums.index(candnum)]
                 cand.harm_pows = np.zeros(cand.numharm, dtype=np.float64)
-                cand.harm_amps = np.zeros(cand.numharm, dtype=np.complex64) 
+                cand.harm_phases = np.zeros(cand.numharm, dtype=np.float64)
                 power = parse_power(split_line[3])
                 phase = float(split_line[9].split("(")[0])
                 cand.harm_pows[0] = power
-                cand.harm_amps[0] = np.sqrt(power) * np.exp(phase*1.0j)
+                cand.harm_phases[0] = phase
                 if (cand.numharm > 1):
                     current_goodcandnum = candnum
                     current_harmnum = 1
                 else:
                     last_goodcandnum = candnum
                     current_goodcandnum = 0
-                    # Compute the S/N
-                    cand.harms_to_snr()
                     # These are the "optimized" power...
                     opt_ipow = cand.harm_pows[0]
-                    # and sigma (calculated assuming _1_ trial!)
-                    opt_sigma = candidate_sigma(opt_ipow, 1, 1)
-                    cand.sigma = opt_sigma
-                    # Now that S/N and sigma are available
-                    # List candidate as a hit of itself
-                    cand.hits = [(cand.DM, cand.snr, cand.sigma)]
                     cand.ipow_det = opt_ipow
+                    finished.append(cand)
             continue
 
         # Parse the higher (than the first) harmonic powers
@@ -1171,27 +2745,352 @@ def candlist_from_candfile(filename, trackbad=False, trackdupes=False):
             power = parse_power(line.split()[2])
             phase = float(line.split()[8].split("(")[0])
             cand.harm_pows[current_harmnum] = power
-            cand.harm_amps[current_harmnum] = np.sqrt(power) * np.exp(phase*1.0j)
+            cand.harm_phases[current_harmnum] = phase
             current_harmnum += 1
             # Calculate other stats after all harmonics have been read in
             if (current_harmnum==cand.numharm):
-                # Compute the S/N
-                cand.harms_to_snr()
-                # Compute sigma and incoherent power
+                # Compute the incoherent power
                 opt_ipow = sum(cand.harm_pows)
-                opt_sigma = candidate_sigma(opt_ipow, cand.numharm, 1)
-                cand.sigma = opt_sigma
-                # Now that S/N and sigma are available
-                # List candidate as a hit of itself
-                cand.hits = [(cand.DM, cand.snr, cand.sigma)]
                 cand.ipow_det = opt_ipow
+                finished.append(cand)
                 last_goodcandnum = candnum
                 current_goodcandnum = 0
     candfile.close()
-    return Candlist(cands, trackbad=trackbad, trackdupes=trackdupes)
+    # Compute the S/Ns all at once
+    offsets = np.zeros(len(finished)+1, dtype=np.int64)
+    np.cumsum([cand.numharm for cand in finished], out=offsets[1:])
+    snrs = harms_to_snrs(np.concatenate([cand.harm_pows for cand in finished] + \
+                                        [np.zeros(0)]), offsets)
+    for cand, snr in zip(finished, snrs.tolist()):
+        cand.snr = snr
+    # and the sigmas (calculated assuming _1_ trial!)
+    sigmas = candidate_sigmas([cand.ipow_det for cand in finished],
+                              [cand.numharm for cand in finished],
+                              config.sigma_tol)
+    for cand, sigma in zip(finished, sigmas.tolist()):
+        cand.sigma = sigma
+        # Now that S/N and sigma are available
+        # List candidate as a hit of itself
+        cand.hits = [(cand.DM, cand.snr, cand.sigma)]
+    return Candlist(cands, trackbad=trackbad, trackdupes=trackdupes,
+                    config=config)
+
+
+def accelfile_tobs(filename, text=None):
+    """Return the length (s) of the observation searched to produce
+        an ACCEL file. The header values are read from the end of the
+        ACCEL file, or else from the companion .inf file.
+
+        Inputs:
+            filename: The name of the ACCEL file.
+            text: The contents of the ACCEL file, if already read.
+                (Default: read the file)
+
+        Output:
+            tobs: The observation length (s).
+    """
+    if text is None:
+        with open(filename, 'r') as candfile:
+            text = candfile.read()
+    numsamp = dt = None
+    ii = text.rfind("\n Number of bins in the time series")
+    if ii >= 0:
+        numsamp = int(text[ii:text.find("\n", ii+1)].split()[-1])
+    ii = text.rfind("\n Width of each time series bin (sec)")
+    if ii >= 0:
+        dt = float(text[ii:text.find("\n", ii+1)].split()[-1])
+    if numsamp is None or dt is None:
+        from presto import infodata
+        inf = infodata.infodata(filename.split("_ACCEL_")[0] + ".inf")
+        numsamp, dt = inf.N, inf.dt
+    return numsamp * dt
+
+
+def columnar_candlist_from_candfile(filename, trackbad=False, trackdupes=False,
+                                    config=None):
+    """Read the candidates in an ACCEL file into a ColumnarCandlist.
+
+        This produces the same candidates as candlist_from_candfile,
+        but the file is only read once, harmonics are matched to their
+        candidate with a dictionary, and the harmonic powers are
+        collected in preallocated buffers.
+
+        Inputs:
+            filename: The ACCEL file to read.
+            trackbad: Keep track of bad candidates. (Default: False)
+            trackdupes: Keep track of duplicates. (Default: False)
+            config: The SiftConfig of the list. (Default: the module
+                globals)
+
+        Output:
+            colcands: A ColumnarCandlist of the candidates.
+    """
+    with open(filename, 'r') as candfile:
+        text = candfile.read()
+    tobs = accelfile_tobs(filename, text)
+    lines = text.splitlines()
+
+    # The candidates are listed at the top of the file
+    fundlines = [line.split() for line in lines if fund_re.match(line)]
+    numcands = len(fundlines)
+    data = np.zeros(numcands, dtype=cand_dtype)
+    candnums = np.zeros(numcands, dtype=np.int64)
+    last_candnum = 0
+    for ii, split_line in enumerate(fundlines):
+        candnum = int(split_line[0])
+        if ii and len(split_line[0])==4 and candnums[ii-1] >= 9999:
+            candnum = last_candnum + 1
+        candnums[ii] = candnum
+        last_candnum = candnum
+        # === JERK SUPPORT ===
+        w = 0.0
+        if len(split_line) >= 12:
+            try:
+                w = float(split_line[10].split("(")[0])
+            except ValueError:
+                w = 0.0
+        data[ii] = (candnum, float(split_line[1]), int(split_line[4]),
+                    float(split_line[2]), float(split_line[3]),
+                    float(split_line[7].split("(")[0]), 0.0, 0.0,
+                    float(split_line[9].split("(")[0]), w, 0.0, 0.0, 0.0, 0)
+    DMstr = DM_re.search(filename).groups()[0]
+    data['f'] = data['r'] / tobs    # Spin freq in hz
+    data['p'] = 1.0 / data['f']     # Spin period in sec
+    data['DM'] = float(DMstr)
+    data['T'] = tobs
+    # The first occurrence of a candnum owns its harmonics
+    candidx = {}
+    for ii, candnum in enumerate(candnums.tolist()):
+        candidx.setdefault(candnum, ii)
+
+    colcands = ColumnarCandlist(data, filenames=[filename], DMstrs=[DMstr],
+                                trackbad=trackbad, trackdupes=trackdupes,
+                                config=config)
+    harm_pows = colcands.harm_pows
+    harm_phases = np.zeros(len(harm_pows), dtype=np.float64)
+    numharms = data['numharm']
+    offsets = colcands.harm_offsets
+    complete = np.zeros(numcands, dtype=bool)
+
+    # Then the powers and phases of their harmonics
+    last_goodcandnum = 0
+    numlines = len(lines)
+    ii = 0
+    while ii < numlines:
+        line = lines[ii]
+        ii += 1
+        if not harms_re.match(line):
+            continue
+        split_line = line.split()
+        candnum = int(split_line[0])
+        # For rare cases where >10K cands, candnum is wrong in ACCEL file
+        if len(split_line[0])==4 and last_goodcandnum >= 9999:
+            candnum = last_goodcandnum + 1
+        icand = candidx.get(candnum)
+        if icand is None:
+            continue
+        offset = offsets[icand]
+        harm_pows[offset] = parse_power(split_line[3])
+        harm_phases[offset] = float(split_line[9].split("(")[0])
+        numharm = numharms[icand]
+        # Parse the higher (than the first) harmonic powers
+        for harmnum in range(1, numharm):
+            if ii >= numlines:
+                break
+            split_line = lines[ii].split()
+            ii += 1
+            harm_pows[offset+harmnum] = parse_power(split_line[2])
+            harm_phases[offset+harmnum] = float(split_line[8].split("(")[0])
+        else:
+            complete[icand] = True
+            last_goodcandnum = candnum
+    colcands.harm_amps[:] = np.sqrt(harm_pows) * np.exp(harm_phases*1.0j)
+
+    # Calculate other stats for the candidates whose
+    # harmonics have all been read in, starting with their S/Ns
+    data['snr'][complete] = harms_to_snrs(harm_pows, offsets)[complete]
+    for numharm in np.unique(numharms):
+        icands = np.flatnonzero(complete & (numharms == numharm))
+        pows = harm_pows[offsets[icands][:,np.newaxis] + np.arange(numharm)]
+        # These are the "optimized" incoherent powers (summed
+        # in harmonic order)...
+        opt_ipows = np.zeros(len(icands), dtype=np.float64)
+        for harmnum in range(numharm):
+            opt_ipows += pows[:,harmnum]
+        data['ipow'][icands] = opt_ipows
+        # and sigmas (calculated assuming _1_ trial!)
+        data['sigma'][icands] = candidate_sigmas(opt_ipows, numharm, \
+                                                 colcands.config.sigma_tol)
+    return colcands
+
+
+class CandCache(object):
+    """A binary cache of parsed ACCEL files.
+
+        For every ACCEL file, the candidate columns and the harmonic
+        powers/amplitudes of a ColumnarCandlist are saved as two .npy
+        files (which, unlike .npz files, can be memory-mapped). An
+        index records the path, size and modification time of the
+        ACCEL file each entry was made from, so stale entries are
+        re-parsed. The cache is kept below 'maxbytes' by evicting the
+        least recently used entries.
+
+        The cache holds candidates *before* any rejection, so it can be
+        reused when sifting with different parameters.
+    """
+    def __init__(self, cachedir, maxbytes=4*1024**3, rebuild=False):
+        self.cachedir = cachedir
+        self.maxbytes = maxbytes
+        self.rebuild = rebuild
+        if not os.path.isdir(cachedir):
+            os.makedirs(cachedir)
+        self.indexfilenm = os.path.join(cachedir, "index.json")
+        self.index = {}
+        if os.path.exists(self.indexfilenm):
+            try:
+                with open(self.indexfilenm) as indexfile:
+                    self.index = json.load(indexfile)
+            except ValueError:
+                self.index = {}
+
+    def cachefiles(self, filenm):
+        """Return the names of the cache files for an ACCEL file.
+        """
+        import hashlib
+        path = os.path.abspath(filenm)
+        key = "%s.%s" % (os.path.basename(path), \
+                hashlib.sha1(path.encode()).hexdigest()[:12])
+        return (os.path.join(self.cachedir, key + ".cands.npy"),
+                os.path.join(self.cachedir, key + ".harms.npy"))
+
+    def lookup(self, filenm, sigma_tol=None):
+        """Check if an ACCEL file has a valid cache entry.
+
+            Inputs:
+                filenm: The name of the ACCEL file.
+                sigma_tol: The sigma_tol the candidate sigmas must
+                    have been computed with. (Default: None)
+
+            Outputs:
+                cachefiles: The names of the cache files.
+                valid: True if the cache files are up to date.
+        """
+        cachefiles = self.cachefiles(filenm)
+        entry = self.index.get(os.path.abspath(filenm))
+        if self.rebuild or entry is None:
+            return cachefiles, False
+        stat = os.stat(filenm)
+        valid = (entry['size'] == stat.st_size) and \
+                (entry['mtime_ns'] == stat.st_mtime_ns) and \
+                (entry.get('sigma_tol') == sigma_tol) and \
+                all(os.path.exists(fn) for fn in cachefiles)
+        return cachefiles, valid
+
+    def record(self, filenm, sigma_tol=None):
+        """Mark the cache entry of an ACCEL file as (re)written or used.
+        """
+        stat = os.stat(filenm)
+        cachefiles = self.cachefiles(filenm)
+        self.index[os.path.abspath(filenm)] = \
+                {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+                 'sigma_tol': sigma_tol,
+                 'cachefiles': [os.path.basename(fn) for fn in cachefiles],
+                 'nbytes': sum(os.path.getsize(fn) for fn in cachefiles),
+                 'atime': time.time()}
+
+    def evict(self):
+        """Remove the least recently used entries until the cache is
+            no larger than maxbytes.
+        """
+        paths = sorted(self.index, key=lambda path: self.index[path]['atime'])
+        totbytes = sum(entry['nbytes'] for entry in self.index.values())
+        for path in paths:
+            if totbytes <= self.maxbytes:
+                break
+            entry = self.index.pop(path)
+            totbytes -= entry['nbytes']
+            for fn in entry['cachefiles']:
+                fn = os.path.join(self.cachedir, fn)
+                if os.path.exists(fn):
+                    os.remove(fn)
+
+    def save(self):
+        """Apply the size cap and write out the cache index.
+        """
+        self.evict()
+        tmpfilenm = self.indexfilenm + ".tmp"
+        with open(tmpfilenm, "w") as indexfile:
+            json.dump(self.index, indexfile)
+        os.replace(tmpfilenm, self.indexfilenm)
+
+
+harms_dtype = np.dtype([('pow', np.float64), ('amp', np.complex64)])
+
+
+def store_cached_candfile(cachefiles, colcands):
+    """Write the candidates of a freshly parsed ACCEL file to its
+        cache files.
+    """
+    candsfn, harmsfn = cachefiles
+    harms = np.zeros(len(colcands.harm_pows), dtype=harms_dtype)
+    harms['pow'] = colcands.harm_pows
+    harms['amp'] = colcands.harm_amps
+    for filenm, arr in [(candsfn, colcands.data), (harmsfn, harms)]:
+        # Write then rename so readers never see a partial file
+        tmpfilenm = filenm + ".tmp.npy"
+        np.save(tmpfilenm, arr)
+        os.replace(tmpfilenm, filenm)
+
 
+def load_cached_candfile(cachefiles, filename, trackbad=False,
+                         trackdupes=False, config=None):
+    """Memory-map the cached candidates of an ACCEL file.
 
-def read_candidates(filenms, prelim_reject=True, track=False):
+        Output:
+            colcands: A ColumnarCandlist of the candidates.
+    """
+    candsfn, harmsfn = cachefiles
+    data = np.load(candsfn, mmap_mode='r')
+    harms = np.load(harmsfn, mmap_mode='r')
+    DMstr = DM_re.search(filename).groups()[0]
+    return ColumnarCandlist(data, harm_pows=harms['pow'],
+                            harm_amps=harms['amp'], filenames=[filename],
+                            DMstrs=[DMstr], trackbad=trackbad,
+                            trackdupes=trackdupes, config=config)
+
+
+def sift_globals():
+    """Return the module-level sifting parameters as a dictionary.
+    """
+    return SiftConfig().as_dict()
+
+
+def _read_candfile(filenm, prelim_reject, track, config, cachefiles=None,
+                   cached=False):
+    """Parse (and optionally reject) one ACCEL file in a worker process.
+        The sifting parameters are passed in 'config' (resolved, since
+        workers don't necessarily share the globals of the parent).
+        The returned ColumnarCandlist pickles as a few arrays.
+
+        If 'cached' is True the candidates are loaded from 'cachefiles',
+        otherwise, if 'cachefiles' is given, they are written to them.
+    """
+    if cached:
+        colcands = load_cached_candfile(cachefiles, filenm, trackbad=track, \
+                                        trackdupes=track, config=config)
+    else:
+        colcands = columnar_candlist_from_candfile(filenm, trackbad=track, \
+                                        trackdupes=track, config=config)
+        if cachefiles is not None:
+            store_cached_candfile(cachefiles, colcands)
+    if prelim_reject:
+        colcands.default_rejection()
+    return colcands
+
+
+@profiled
+def read_candidates(filenms, prelim_reject=True, track=False, columnar=False,
+                    workers=None, cache=None, config=None):
     """Read in accelsearch candidates from the test ACCEL files.
         Return a Candlist object of Candidate instances.
 
@@ -1201,31 +3100,839 @@ def read_candidates(filenms, prelim_reject=True, track=False):
                 candidates. (Default: True)
             track: If True, keep track of bad/duplicate candidates.
                 (Default: False)
+            columnar: If True, parse the files straight into
+                ColumnarCandlists so the preliminary rejection is
+                done with array operations. (Default: False)
+            workers: Number of worker processes used to parse and
+                reject the files in parallel (implies columnar).
+                The results are merged in the order of 'filenms'.
+                (Default: read the files serially)
+            cache: A CandCache used to skip re-parsing ACCEL files
+                that haven't changed since they were last read
+                (implies columnar). (Default: don't cache)
+            config: The SiftConfig used for the preliminary rejection,
+                and given to the Candlist. (Default: the module globals)
 
     """
-    candlist = Candlist(trackbad=track, trackdupes=track)
+    if config is None:
+        config = SiftConfig()
+    candlist = Candlist(trackbad=track, trackdupes=track, config=config)
     numfiles = len(filenms)
     if filenms:
         print("\nReading candidates from %d files...." % len(filenms))
-        for ii, filenm in enumerate(filenms):
-            curr_candlist = candlist_from_candfile(filenm, trackbad=track, trackdupes=track)
-            if prelim_reject:
-                curr_candlist.default_rejection()
-            candlist.extend(curr_candlist)
-            sys.stdout.write(" Read %d of %d files (%d cands)\r" % (ii+1, numfiles, len(candlist)))
-            sys.stdout.flush()
+        colcandlists = []
+        numcands = 0
+        if cache is not None:
+            columnar = True
+            lookups = [cache.lookup(filenm, config.sigma_tol) for filenm in filenms]
+        else:
+            lookups = [(None, False)] * numfiles
+        cachefiles = [lookup[0] for lookup in lookups]
+        cached = [lookup[1] for lookup in lookups]
+        if workers is not None and workers > 1:
+            import concurrent.futures
+            columnar = True
+            params = config.resolved()
+            chunksize = max(1, numfiles // (workers*16))
+            with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+                results = executor.map(_read_candfile, filenms,
+                                       [prelim_reject]*numfiles,
+                                       [track]*numfiles, [params]*numfiles,
+                                       cachefiles, cached,
+                                       chunksize=chunksize)
+                for ii, curr_candlist in enumerate(results):
+                    colcandlists.append(curr_candlist)
+                    numcands += len(curr_candlist)
+                    sys.stdout.write(" Read %d of %d files (%d cands)\r" % (ii+1, numfiles, numcands))
+                    sys.stdout.flush()
+        else:
+            for ii, filenm in enumerate(filenms):
+                if columnar:
+                    curr_candlist = _read_candfile(filenm, prelim_reject, \
+                                        track, config, cachefiles[ii], cached[ii])
+                else:
+                    curr_candlist = candlist_from_candfile(filenm, trackbad=track, trackdupes=track,
+                                                           config=config)
+                    if prelim_reject:
+                        curr_candlist.default_rejection()
+                if columnar:
+                    colcandlists.append(curr_candlist)
+                    numcands += len(curr_candlist)
+                else:
+                    candlist.extend(curr_candlist)
+                    numcands = len(candlist)
+                sys.stdout.write(" Read %d of %d files (%d cands)\r" % (ii+1, numfiles, numcands))
+                sys.stdout.flush()
+        if columnar:
+            candlist = ColumnarCandlist.concatenate(colcandlists, \
+                            trackbad=track, trackdupes=track,
+                            config=config).to_candlist()
+        if cache is not None:
+            for filenm in filenms:
+                cache.record(filenm, config.sigma_tol)
+            cache.save()
         print("\nDone")
     else:
         print("Error:  There are no candidate files to read!")
     return candlist
 
 
-def sift_directory(dir, outbasenm):
+class SiftState(object):
+    """The sifting of a search whose ACCEL files arrive over time
+        (e.g. one chunk of DM trials at a time), kept up to date as
+        they do and saved to disk between runs.
+
+        The candidates that pass the preliminary rejection are kept
+        in a pool sorted by frequency. As in remove_duplicate_candidates,
+        the pool splits into runs of candidates closer than r_err,
+        and duplicates are only ever found within a run. For every
+        run the state keeps the surviving candidates (with their
+        hits) and whether they have DM problems. When new candidates
+        are merged in, only the runs they fall in are clustered and
+        checked again. The DM checks of the other runs are only
+        redone if new DMs are added inside the DM grid. The (fast)
+        harmonic removal is done over all the survivors whenever a
+        Candlist is made.
+
+        With the files read in sorted order, the good candidates are
+        the same as those of sifting all the files at once.
+
+        The state keeps (resolved) the SiftConfig it was made with.
+    """
+    # The sifting parameters a saved state depends on
+    param_names = ['r_err', 'short_period', 'long_period',
+                   'sigma_threshold', 'c_pow_threshold', 'harm_pow_cutoff',
+                   'sigma_tol']
+    # and the known birds, which are compared as lists of tuples
+    bird_names = ['known_birds_f', 'known_birds_p']
+
+    def __init__(self, numdms=2, low_DM_cutoff=2.0, track=False, config=None):
+        self.numdms = numdms
+        self.low_DM_cutoff = low_DM_cutoff
+        self.track = track
+        self.config = (SiftConfig() if config is None else config).resolved()
+        self.filenms = set()
+        self.dmstrs = []
+        # The pool of candidates, sorted by (r, file, read order)
+        self.pool = []
+        self.pool_r = np.zeros(0, dtype=np.float64)
+        self.pool_files = np.zeros(0, dtype=str)
+        self.pool_seqs = np.zeros(0, dtype=np.int64)
+        self.numread = 0
+        # The first pool index of each run, and its result:
+        # (survivors, whether each is free of DM problems, duplicates)
+        self.runstarts = np.zeros(0, dtype=np.int64)
+        self.runs = []
+        # The candidates that failed the preliminary rejection
+        self.badlists = dict((key, []) for key in badlist_names)
+        self.numbad = dict((key, 0) for key in badlist_names)
+
+    @classmethod
+    def load(cls, filenm, config=None):
+        """Read a state saved with SiftState.save. The sifting
+            parameters of 'config' (Default: the module globals),
+            including the known birds, must be those the state was
+            made with, or a ValueError is raised.
+        """
+        import pickle
+        if config is None:
+            config = SiftConfig()
+        with open(filenm, "rb") as statefile:
+            state = pickle.load(statefile)
+        for name in cls.param_names:
+            if getattr(config, name) != getattr(state.config, name):
+                raise ValueError("The sift state in '%s' was made with " \
+                                 "%s = %r (not %r)" % (filenm, name, \
+                                        getattr(state.config, name),
+                                        getattr(config, name)))
+        for name in cls.bird_names:
+            if [tuple(bird) for bird in getattr(config, name)] != \
+               [tuple(bird) for bird in getattr(state.config, name)]:
+                raise ValueError("The sift state in '%s' was made with " \
+                                 "other %s (%d birds, not %d)" % \
+                                 (filenm, name, len(getattr(state.config, name)),
+                                  len(getattr(config, name))))
+        return state
+
+    def save(self, filenm):
+        """Write the state to a file (atomically).
+        """
+        import pickle
+        tmpfilenm = filenm + ".tmp"
+        with open(tmpfilenm, "wb") as statefile:
+            pickle.dump(self, statefile, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmpfilenm, filenm)
+
+    def add_files(self, filenms, dmstrs=(), workers=None, cache=None,
+                  verbosity=1):
+        """Read the candidates of the ACCEL files not yet in the state
+            (in sorted order) and merge them in.
+
+            Inputs:
+                filenms: A list of ACCEL files.
+                dmstrs: DMs (as strings) to add to the DM grid.
+                workers, cache: See read_candidates.
+                verbosity: Verbosity level. (Default: 1)
+
+            Outputs:
+                numnew: The number of files read.
+        """
+        newfilenms = sorted(set(filenms) - self.filenms)
+        if newfilenms:
+            candlist = read_candidates(newfilenms, track=self.track,
+                                       workers=workers, cache=cache,
+                                       config=self.config)
+        else:
+            candlist = Candlist(trackbad=self.track, config=self.config)
+        self.filenms.update(newfilenms)
+        self.add_candlist(candlist, dmstrs, verbosity)
+        return len(newfilenms)
+
+    def add_candlist(self, candlist, dmstrs=(), verbosity=1):
+        """Merge in new candidates that have been through the
+            preliminary rejection.
+
+            Inputs:
+                candlist: A Candlist of the new candidates, in the
+                    order they were read.
+                dmstrs: DMs (as strings) to add to the DM grid.
+                    The DMs of the new candidates are always added.
+                verbosity: Verbosity level. (Default: 1)
+
+            Outputs:
+                None
+        """
+        for key in candlist.badlists:
+            self.badlists.setdefault(key, []).extend(candlist.badlists[key])
+        for key, num in candlist.numbad.items():
+            self.numbad[key] = self.numbad.get(key, 0) + num
+        newcands = candlist.cands
+
+        # Extend the DM grid
+        olddms = [float(dmstr) for dmstr in self.dmstrs]
+        newdmstrs = (set(dmstrs) | set(cand.DMstr for cand in newcands)) - \
+                        set(self.dmstrs)
+        regrid = bool(olddms) and \
+                    any(float(dmstr) <= max(olddms) for dmstr in newdmstrs)
+        self.dmstrs = sorted(set(self.dmstrs) | newdmstrs, key=float)
+
+        # Merge the new candidates into the pool
+        numold = len(self.pool)
+        rs = np.concatenate((self.pool_r, [cand.r for cand in newcands]))
+        files = np.concatenate((self.pool_files, \
+                    [os.path.join(cand.path, cand.filename) for cand in newcands]))
+        seqs = np.concatenate((self.pool_seqs, \
+                    np.arange(len(newcands)) + self.numread))
+        self.numread += len(newcands)
+        order = np.lexsort((seqs, files, rs))
+        allcands = self.pool + newcands
+        self.pool = [allcands[ii] for ii in order]
+        self.pool_r, self.pool_files, self.pool_seqs = \
+                rs[order], files[order], seqs[order]
+        newpos = np.empty(len(order), dtype=np.int64)
+        newpos[order] = np.arange(len(order))
+        oldruns = dict(zip(newpos[self.runstarts].tolist(), self.runs))
+
+        # Split the pool into runs, as remove_duplicate_candidates does,
+        # and find those with new candidates
+        numcands = len(self.pool)
+        newrun = np.ones(numcands, dtype=bool)
+        newrun[1:] = ~(np.diff(self.pool_r) < self.config.r_err)
+        runstarts = np.flatnonzero(newrun)
+        runends = np.append(runstarts[1:], numcands)
+        if numcands:
+            dirty = np.logical_or.reduceat(order >= numold, runstarts)
+        else:
+            dirty = np.zeros(0, dtype=bool)
+        runs = [None if isdirty else oldruns[start] for start, isdirty in \
+                    zip(runstarts.tolist(), dirty.tolist())]
+
+        # Cluster the dirty runs again, starting from their candidates
+        # as they were read
+        runidx = np.repeat(np.arange(len(runstarts)), runends-runstarts)
+        members = np.flatnonzero(dirty[runidx])
+        candruns = {}
+        for ii in members.tolist():
+            cand = self.pool[ii]
+            cand.hits = [(cand.DM, cand.snr, cand.sigma)]
+            cand.note = ""
+            candruns[id(cand)] = runidx[ii]
+        survivors, duplicates = [], []
+        if len(members):
+            dirtycands = Candlist([self.pool[ii] for ii in members.tolist()],
+                                  config=self.config)
+            survivors, duplicates = dirtycands._cluster_duplicates(verbosity=0)
+        for irun in np.flatnonzero(dirty).tolist():
+            runs[irun] = ([], [], [])
+        for cand in survivors:
+            runs[candruns[id(cand)]][0].append(cand)
+        for cand in duplicates:
+            runs[candruns[id(cand)]][2].append(cand)
+
+        # Check the survivors for DM problems
+        if regrid:
+            tocheck = np.arange(len(runs))
+        else:
+            tocheck = np.flatnonzero(dirty)
+        checkcands = [cand for irun in tocheck.tolist() for cand in runs[irun][0]]
+        for cand in checkcands:
+            cand.note = ""
+        isgood = set()
+        if checkcands:
+            checklist = Candlist(list(checkcands), trackbad=True,
+                                 config=self.config)
+            checklist.remove_DM_problems(self.numdms, self.dmstrs,
+                                         self.low_DM_cutoff, verbosity=0)
+            isgood = set(id(cand) for cand in checklist.cands)
+        for irun in tocheck.tolist():
+            runs[irun] = (runs[irun][0], \
+                          [id(cand) in isgood for cand in runs[irun][0]], \
+                          runs[irun][2])
+        self.runstarts = runstarts
+        self.runs = runs
+        if verbosity >= 1:
+            print("Merged %d new candidates: re-sifted %d of %d runs " \
+                  "(%d candidates)" % (len(newcands), \
+                        int(np.count_nonzero(dirty)), len(runs), len(members)))
+
+    def candlist(self, verbosity=1):
+        """Return a Candlist of the good candidates, i.e. the
+            survivors without DM problems, after harmonic removal.
+            If the state tracks bad candidates, so does the Candlist.
+
+            Inputs:
+                verbosity: Verbosity level. (Default: 1)
+
+            Outputs:
+                candlist: The sifted Candlist.
+        """
+        survivors = [(cand, isgood) for run in self.runs \
+                        for cand, isgood in zip(run[0], run[1])]
+        survivors.sort(key=lambda survivor: survivor[0].sigma, reverse=True)
+        goodcands = [cand for cand, isgood in survivors if isgood]
+        for cand in goodcands:
+            cand.note = ""
+        candlist = Candlist(goodcands, trackbad=self.track,
+                            trackdupes=self.track, config=self.config)
+        dmbad = [cand for cand, isgood in survivors if not isgood][::-1]
+        candlist.numbad.update(self.numbad)
+        candlist.numbad['dmproblem'] = len(dmbad)
+        if self.track:
+            for key in self.badlists:
+                candlist.badlists[key] = list(self.badlists[key])
+            candlist.badlists['dmproblem'] = dmbad
+            candlist.duplicates = [cand for run in self.runs for cand in run[2]]
+        if len(candlist):
+            candlist.remove_harmonics(verbosity)
+        return candlist
+
+
+# The names of finished ACCEL (or JERK) search files
+accelfile_re = re.compile(r"_ACCEL_\d+(_JERK_\d+)?$")
+
+
+class DirectoryWatcher(object):
+    """Find the files of a directory as they are finished.
+
+        If the inotify_simple module is available, files are reported
+        as soon as they are closed after writing (or moved into the
+        directory). Otherwise (and for the files already there when
+        watching starts) the directory is polled, and a file is
+        reported once its size and modification time have not changed
+        for 'settle' seconds.
+    """
+    def __init__(self, dir, match, settle=2.0, use_inotify=True):
+        """Inputs:
+                dir: The directory to watch.
+                match: A function of a file name that is True for
+                    the files to report.
+                settle: The time (s) a polled file must be unchanged
+                    for to be reported. (Default: 2 s)
+                use_inotify: Use inotify if available. (Default: True)
+        """
+        self.dir = dir
+        self.match = match
+        self.settle = settle
+        self.seen = set()
+        # Files given back with forget(): name -> (size, mtime_ns) then
+        self.forgotten = {}
+        # Files not yet settled: name -> (size, mtime_ns, time seen)
+        self.pending = {}
+        self.inotify = None
+        if use_inotify:
+            try:
+                import inotify_simple
+                self.flags = inotify_simple.flags
+                self.inotify = inotify_simple.INotify()
+                self.inotify.add_watch(dir, self.flags.CLOSE_WRITE | \
+                                            self.flags.MOVED_TO)
+            except (ImportError, OSError):
+                self.inotify = None
+        self.rescan = True
+
+    def poll(self, timeout=1.0):
+        """Wait (up to 'timeout' s) for files to be finished.
+
+            Outputs:
+                filenms: The (sorted) paths of the newly finished files.
+        """
+        done = []
+        if self.inotify is not None:
+            for event in self.inotify.read(timeout=int(timeout*1000)):
+                if event.mask & self.flags.Q_OVERFLOW:
+                    self.rescan = True
+                elif event.name and self.match(event.name) and \
+                        event.name not in self.seen:
+                    self.seen.add(event.name)
+                    self.pending.pop(event.name, None)
+                    self.forgotten.pop(event.name, None)
+                    done.append(event.name)
+        elif not self.rescan:
+            time.sleep(timeout)
+        if self.inotify is None or self.rescan or self.pending:
+            now = time.time()
+            for entry in os.scandir(self.dir):
+                name = entry.name
+                if name in self.seen or not self.match(name):
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                if name in self.forgotten:
+                    if self.forgotten[name] == (stat.st_size, stat.st_mtime_ns):
+                        continue
+                    del self.forgotten[name]
+                prev = self.pending.get(name)
+                if prev is not None and \
+                        prev[:2] == (stat.st_size, stat.st_mtime_ns):
+                    if now - prev[2] >= self.settle:
+                        self.seen.add(name)
+                        del self.pending[name]
+                        done.append(name)
+                else:
+                    self.pending[name] = (stat.st_size, stat.st_mtime_ns, now)
+            self.rescan = False
+        return [os.path.normpath(os.path.join(self.dir, name)) \
+                    for name in sorted(done)]
+
+    def forget(self, filenm):
+        """Report a file again once it has changed (e.g. one that
+            could not be read yet).
+        """
+        name = os.path.basename(filenm)
+        self.seen.discard(name)
+        try:
+            stat = os.stat(os.path.join(self.dir, name))
+            self.forgotten[name] = (stat.st_size, stat.st_mtime_ns)
+        except OSError:
+            self.forgotten.pop(name, None)
+
+    def close(self):
+        if self.inotify is not None:
+            self.inotify.close()
+
+
+def watch_directory(dir, outfilenm="cands.txt", statefilenm=None,
+                    globaccel=None, globinf="*DM*.inf", numdms=2,
+                    low_DM_cutoff=2.0, workers=None, cadence=30.0,
+                    settle=2.0, idle_timeout=None, stopfilenm=None,
+                    config=None, verbosity=1):
+    """Sift the candidates of a search while it runs. New ACCEL files
+        are parsed (and the preliminary rejection done) as soon as they
+        are finished, and at most every 'cadence' seconds they are
+        merged into a SiftState and the good candidates are written
+        to 'outfilenm' (atomically, so it can be read at any time).
+        The DM grid is made of the DMs of the .inf files found.
+
+        Inputs:
+            dir: The directory accelsearch writes to.
+            outfilenm: Name of the candidate file to keep up to date.
+                Names ending in '.gz' are gzipped. (Default: cands.txt)
+            statefilenm: Name of a file to keep the SiftState in. If it
+                exists, sifting carries on from it. (Default: none)
+            globaccel: Pattern of the ACCEL file names. (Default: any
+                '*_ACCEL_<zmax>' or '*_ACCEL_<zmax>_JERK_<wmax>' file)
+            globinf: Pattern of the .inf file names. (Default: *DM*.inf)
+            numdms, low_DM_cutoff: See Candlist.remove_DM_problems.
+            workers: Number of processes to parse the ACCEL files with.
+                (Default: parse them in this process)
+            cadence: Minimum time (s) between updates. (Default: 30 s)
+            settle: See DirectoryWatcher. (Default: 2 s)
+            idle_timeout: Stop once no new files have been found for
+                this long (s). (Default: don't stop)
+            stopfilenm: Stop once this file exists. (Default: none)
+            config: The SiftConfig to sift with. (Default: the module
+                globals)
+            verbosity: Verbosity level. (Default: 1)
+
+        Outputs:
+            state: The final SiftState.
+
+        Watching also stops on KeyboardInterrupt. The candidates
+        found by then are always merged in and written out.
+    """
+    import fnmatch
+    if statefilenm is not None and os.path.exists(statefilenm):
+        state = SiftState.load(statefilenm, config)
+    else:
+        state = SiftState(numdms, low_DM_cutoff, config=config)
+    if globaccel is None:
+        isaccel = lambda name: bool(accelfile_re.search(name))
+    else:
+        isaccel = lambda name: fnmatch.fnmatch(name, globaccel)
+    isinf = lambda name: fnmatch.fnmatch(name, globinf)
+    watcher = DirectoryWatcher(dir, lambda name: isaccel(name) or isinf(name),
+                               settle=settle)
+    executor = None
+    if workers is not None and workers > 1:
+        import concurrent.futures
+        executor = concurrent.futures.ProcessPoolExecutor(workers)
+    parsed = {}
+    dmstrs = set()
+    lastupdate = lastfound = time.time()
+    changed = False
+
+    def unreadable(filenm, err):
+        # Skip a file that can't be read (e.g. one that the polling
+        # saw before it was finished) until it changes again
+        sys.stderr.write("[watch] can't read %s (%s: %s), skipping it " \
+                         "until it changes\n" % (filenm, type(err).__name__, err))
+        watcher.forget(filenm)
+
+    def update():
+        # Merge the parsed files (in sorted order) into the state
+        filenms = sorted(filenm for filenm, result in parsed.items() \
+                            if executor is None or result.done())
+        colcandlists = [parsed.pop(filenm) for filenm in filenms]
+        if executor is not None:
+            results = zip(filenms, colcandlists)
+            filenms, colcandlists = [], []
+            for filenm, result in results:
+                try:
+                    colcandlists.append(result.result())
+                    filenms.append(filenm)
+                except Exception as err:
+                    unreadable(filenm, err)
+        candlist = ColumnarCandlist.concatenate(colcandlists, \
+                        trackbad=state.track, trackdupes=state.track,
+                        config=state.config).to_candlist()
+        state.filenms.update(filenms)
+        state.add_candlist(candlist, dmstrs, verbosity=0)
+        cands = state.candlist(verbosity=0)
+        tmpfilenm = os.path.join(os.path.dirname(outfilenm) or ".",
+                                 ".tmp." + os.path.basename(outfilenm))
+        cands.to_file(tmpfilenm, compress=outfilenm.endswith(".gz"))
+        os.replace(tmpfilenm, outfilenm)
+        if statefilenm is not None:
+            state.save(statefilenm)
+        if verbosity >= 1:
+            print("[watch] %s: %d ACCEL files, %d candidates, %d good" % \
+                    (time.strftime("%H:%M:%S"), len(state.filenms), \
+                     len(state.pool), len(cands)))
+            sys.stdout.flush()
+
+    try:
+        while True:
+            for filenm in watcher.poll(min(1.0, cadence)):
+                name = os.path.basename(filenm)
+                lastfound = time.time()
+                if isinf(name):
+                    dmstr = DM_re.search(name)
+                    if dmstr is not None:
+                        dmstrs.add(dmstr.groups()[0])
+                        changed = True
+                elif filenm not in state.filenms and filenm not in parsed:
+                    if executor is None:
+                        try:
+                            parsed[filenm] = _read_candfile(filenm, True, state.track,
+                                                            state.config)
+                        except Exception as err:
+                            unreadable(filenm, err)
+                            continue
+                    else:
+                        parsed[filenm] = executor.submit(_read_candfile, filenm,
+                                                         True, state.track,
+                                                         state.config)
+                    changed = True
+            now = time.time()
+            if changed and now - lastupdate >= cadence:
+                update()
+                lastupdate = now
+                changed = bool(parsed)
+            if (idle_timeout is not None and now - lastfound >= idle_timeout) or \
+                    (stopfilenm is not None and os.path.exists(stopfilenm)):
+                break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=True)
+        watcher.close()
+    if changed or parsed:
+        update()
+    return state
+
+
+def beam_dmstrs(inffiles, candfiles):
+    """Return the DMs (as strings, sorted by DM) searched in a
+        directory, from the names of its .inf files, or those of its
+        ACCEL files for short (segmented) searches, as ACCEL_sift.py
+        does.
+    """
+    if inffiles and re.findall("_[0-9][0-9][0-9]M_", inffiles[0]):
+        dmstrs = [x.split("DM")[-1].split("_")[0] for x in candfiles]
+    else:
+        dmstrs = [x.split("DM")[-1].split(".inf")[0] for x in inffiles]
+    valid_dmstrs = []
+    for dmstr in dmstrs:
+        match = re.search(r'[-+]?\d*\.\d+|[-+]?\d+', dmstr)
+        if match:
+            valid_dmstrs.append(match.group())
+    return sorted(valid_dmstrs, key=float)
+
+
+def _beam_files(beamdir, globaccel, globinf):
+    """Return the (sorted) ACCEL files of one beam directory and
+        its DMs (see beam_dmstrs).
+    """
+    if globaccel is None:
+        candfiles = sorted(filenm for filenm in \
+                        glob.glob(os.path.join(beamdir, "*_ACCEL_*")) \
+                        if accelfile_re.search(filenm))
+    else:
+        candfiles = sorted(glob.glob(os.path.join(beamdir, globaccel)))
+    inffiles = sorted(glob.glob(os.path.join(beamdir, globinf)))
+    return candfiles, beam_dmstrs(inffiles, candfiles)
+
+
+def _sift_beam(colcandlists, dmstrs, numdms, low_DM_cutoff, config, track,
+               verbosity):
+    """Sift the candidates of one beam (in a worker process), given
+        the ColumnarCandlists of its ACCEL files from _read_candfile.
+        Returns the Candlist of good candidates, sorted by sigma.
+    """
+    out = sys.stdout if verbosity >= 2 else open(os.devnull, "w")
+    with contextlib.redirect_stdout(out):
+        cands = ColumnarCandlist.concatenate(colcandlists, \
+                        trackbad=track, trackdupes=track,
+                        config=config).to_candlist()
+        print("\nRead %d candidates from %d files" % \
+                    (len(cands), len(colcandlists)))
+        if len(cands):
+            cands.remove_duplicate_candidates()
+        if len(cands):
+            cands.remove_DM_problems(numdms, dmstrs, low_DM_cutoff)
+        if len(cands):
+            cands.remove_harmonics()
+    if out is not sys.stdout:
+        out.close()
+    cands.sort(key=attrgetter('sigma'), reverse=True)
+    return cands
+
+
+def find_beam_coincidences(candlists, r_err=None, dm_err=None):
+    """Find the signals detected in more than one beam.
+
+        Candidates of different beams are the same signal if their
+        frequencies are within r_err Fourier bins (chained, as in
+        remove_duplicate_candidates) and, if dm_err is given, their
+        DMs within dm_err of each other.
+
+        Inputs:
+            candlists: A list of Candlists, one per beam.
+            r_err: Frequency tolerance (in Fourier bins).
+                (Default: the r_err of the first Candlist's config)
+            dm_err: DM tolerance (pc/cc). (Default: ignore the DMs)
+
+        Outputs:
+            groups: A list of the signals seen in at least two beams,
+                sorted by frequency. Each is a list of (ibeam, cand),
+                and may hold several candidates of the same beam.
+    """
+    beams = np.concatenate([np.full(len(candlist), ii, dtype=np.int64) \
+                                for ii, candlist in enumerate(candlists)] + \
+                           [np.zeros(0, dtype=np.int64)])
+    cands = [cand for candlist in candlists for cand in candlist]
+    if not cands:
+        return []
+    if r_err is None:
+        r_err = candlists[0].config.r_err
+    fs = np.array([cand.f for cand in cands], dtype=np.float64)
+    Ts = np.array([cand.T for cand in cands], dtype=np.float64)
+    DMs = np.array([cand.DM for cand in cands], dtype=np.float64)
+    order = np.argsort(fs, kind='stable')
+    newgroup = np.ones(len(cands), dtype=bool)
+    newgroup[1:] = ~(np.diff(fs[order]) < r_err/Ts[order][:-1])
+    if dm_err is not None:
+        # Split the frequency groups where the DMs are too far apart
+        group = np.cumsum(newgroup)
+        bydm = np.lexsort((DMs[order], group))
+        order = order[bydm]
+        group = group[bydm]
+        newgroup[1:] = (np.diff(group) != 0) | \
+                       (np.diff(DMs[order]) > dm_err)
+    starts = np.flatnonzero(newgroup)
+    ends = np.append(starts[1:], len(cands))
+    groups = []
+    for start, end in zip(starts.tolist(), ends.tolist()):
+        members = order[start:end]
+        if len(set(beams[members].tolist())) > 1:
+            groups.append([(int(beams[ii]), cands[ii]) for ii in members])
+    return groups
+
+
+def write_multibeam_report(reportfilenm, beamnames, candlists, groups,
+                           max_beams):
+    """Write a report of the sifting of several beams: the number of
+        good candidates and of multi-beam RFI of every beam, then the
+        signals seen in more than one beam (strongest first) with
+        their detections in each beam.
+
+        Inputs:
+            reportfilenm: Name of file to write to. If None write to
+                stdout. Names ending in '.gz' are gzipped.
+            beamnames: The name of every beam.
+            candlists: The sifted Candlist of every beam.
+            groups: The multi-beam signals (see find_beam_coincidences).
+            max_beams: Signals seen in more beams than this are RFI.
+
+        Outputs:
+            None
+    """
+    numbeams = [len(set(ibeam for ibeam, cand in group)) for group in groups]
+    numrfi = sum(1 for num in numbeams if num > max_beams)
+    lines = ["# Sifting of %d beams: %d signals in more than %d beams (RFI), "
+             "%d in 2 to %d beams\n#\n" % (len(beamnames), numrfi, max_beams,
+                                         len(groups)-numrfi, max_beams),
+             "#%-39s %7s %7s\n" % ("beam".center(39), "good", "RFI")]
+    for beamname, candlist in zip(beamnames, candlists):
+        lines.append(" %-39s %7d %7d\n" % (beamname, len(candlist), \
+                                          candlist.numbad.get('multibeam', 0)))
+    lines.append("#\n# Signals seen in more than one beam:\n#\n")
+    order = sorted(range(len(groups)), key=lambda ii: \
+                        -max(cand.sigma for ibeam, cand in groups[ii]))
+    for igroup, ii in enumerate(order):
+        best = max(groups[ii], key=lambda member: member[1].sigma)[1]
+        lines.append("# Signal %d: %s, %d beams, P(ms) = %.6f, f(Hz) = %.6f, " \
+                     "DM = %.2f, sigma = %.2f\n" % (igroup+1, \
+                        "RFI" if numbeams[ii] > max_beams else "source", \
+                        numbeams[ii], best.p*1000, best.f, best.DM, best.sigma))
+        for ibeam, cand in sorted(groups[ii], key=lambda member: \
+                                        (member[0], -member[1].sigma)):
+            lines.append("  %-20s %s\n" % (beamnames[ibeam], cand))
+        lines.append("\n")
+    _write_text_output(reportfilenm, "".join(lines))
+
+
+@profiled
+def sift_beams(beamdirs, outfilenm="cands.txt",
+               reportfilenm="multibeam_report.txt", globaccel=None,
+               globinf="*DM*.inf", numdms=2, low_DM_cutoff=2.0, max_beams=7,
+               dm_err=None, workers=None, config=None, track=False,
+               verbosity=1):
+    """Sift the candidates of several beams (e.g. the 19 beams of a
+        FAST pointing) in one process. A single pool of worker
+        processes first parses the ACCEL files of all of the beams,
+        then clusters the candidates of each beam (one beam per
+        worker), then the candidates are compared across beams:
+        signals seen in more
+        than 'max_beams' beams are RFI and are moved to the
+        'multibeam' bad-list of every beam they were seen in, while
+        those seen in fewer beams are grouped as (possibly) the same
+        source in the combined report.
+
+        Inputs:
+            beamdirs: The ACCEL directories, one per beam.
+            outfilenm: Name of the candidate file written in each
+                beam directory. (Default: cands.txt)
+            reportfilenm: Name of the combined report (see
+                write_multibeam_report). (Default: multibeam_report.txt)
+            globaccel: Pattern of the ACCEL file names. (Default: any
+                '*_ACCEL_<zmax>' or '*_ACCEL_<zmax>_JERK_<wmax>' file)
+            globinf: Pattern of the .inf file names. (Default: *DM*.inf)
+            numdms, low_DM_cutoff: See Candlist.remove_DM_problems.
+            max_beams: Signals seen in more beams than this are RFI.
+                (Default: 7, a beam and its 6 neighbours)
+            dm_err: See find_beam_coincidences. (Default: None)
+            workers: Number of worker processes. (Default: read and
+                sift the beams one after the other in this process)
+            config: The SiftConfig to sift with. (Default: the module
+                globals)
+            track: If True, keep track of bad/duplicate candidates.
+                (Default: False)
+            verbosity: Verbosity level. At 1 only a line per beam is
+                printed, at 2 the usual sifting output too. (Default: 1)
+
+        Outputs:
+            candlists: The sifted Candlist of every beam.
+            groups: The multi-beam signals (see find_beam_coincidences).
+    """
+    config = (SiftConfig() if config is None else config).resolved()
+    beamnames = [os.path.normpath(beamdir) for beamdir in beamdirs]
+    beamfiles = [_beam_files(beamdir, globaccel, globinf) \
+                    for beamdir in beamdirs]
+    filenms = [filenm for candfiles, dmstrs in beamfiles \
+                    for filenm in candfiles]
+    numfiles = len(filenms)
+
+    def beam_args(colcandlists):
+        # Split the parsed files back up by beam
+        args, start = [], 0
+        for candfiles, dmstrs in beamfiles:
+            args.append((colcandlists[start:start+len(candfiles)], dmstrs,
+                         numdms, low_DM_cutoff, config, track, verbosity))
+            start += len(candfiles)
+        return args
+
+    if workers is not None and workers > 1:
+        import concurrent.futures
+        with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+            # The files of all of the beams are parsed as one batch, so
+            # all of the workers stay busy however many beams there are
+            chunksize = max(1, numfiles // (workers*16))
+            colcandlists = list(executor.map(_read_candfile, filenms,
+                                             [True]*numfiles, [track]*numfiles,
+                                             [config]*numfiles,
+                                             chunksize=chunksize))
+            args = beam_args(colcandlists)
+            candlists = list(executor.map(_sift_beam, *zip(*args)))
+    else:
+        colcandlists = [_read_candfile(filenm, True, track, config) \
+                            for filenm in filenms]
+        args = beam_args(colcandlists)
+        candlists = [_sift_beam(*arg) for arg in args]
+
+    groups = find_beam_coincidences(candlists, config.r_err, dm_err)
+    rfi = dict((ii, []) for ii in range(len(candlists)))
+    for group in groups:
+        numbeams = len(set(ibeam for ibeam, cand in group))
+        if numbeams > max_beams:
+            for ibeam, cand in group:
+                cand.note = "Seen in %d beams" % numbeams
+                rfi[ibeam].append(cand)
+    for ibeam, candlist in enumerate(candlists):
+        isrfi = set(id(cand) for cand in rfi[ibeam])
+        candlist.mark_many_as_bad([ii for ii, cand in enumerate(candlist) \
+                                        if id(cand) in isrfi], 'multibeam')
+        candlist.to_file(os.path.join(beamdirs[ibeam], outfilenm))
+        if verbosity >= 1:
+            print("%s: %d good candidates (%d multi-beam RFI)" % \
+                  (beamnames[ibeam], len(candlist), len(rfi[ibeam])))
+    if reportfilenm is not None:
+        write_multibeam_report(reportfilenm, beamnames, candlists, groups,
+                               max_beams)
+    return candlists, groups
+
+
+def sift_directory(dir, outbasenm, config=None):
     """Sift candidates in given directory.
         
         Inputs:
             dir: The directory containing candidates to sift.
             outbasenm: The base name of the output files.
+            config: The SiftConfig to sift with. (Default: the module
+                globals, with sigma_threshold = 5.0)
 
         Outputs:
             None
@@ -1235,17 +3942,20 @@ def sift_directory(dir, outbasenm):
     # TODO: Remove hard-coded values in this function
     #       replace with command line options.
 
-    global sigma_threshold
-    sigma_threshold = 5.0
+    from presto import infodata
+    import matplotlib.pyplot as plt
+
+    if config is None:
+        config = SiftConfig(sigma_threshold=5.0)
 
-    print_sift_globals()
+    print_sift_globals(config)
     # Get list of DMs from *.inf files
     inffns = glob.glob(os.path.join(dir, '*.inf'))
     dmstrs = ['%.2f'%infodata.infodata(inffn).DM for inffn in inffns]
 
     # Read candidates found in low acceleration searching
     lo_accel_fns = glob.glob(os.path.join(dir, '*ACCEL_0'))
-    lo_accel_cands = read_candidates(lo_accel_fns, track=True)
+    lo_accel_cands = read_candidates(lo_accel_fns, track=True, config=config)
     print("Read %d candidates from %d files" % \
                 (len(lo_accel_cands), len(lo_accel_fns)))
     print("%d candidates passed default rejection" % len(lo_accel_cands))
@@ -1257,7 +3967,7 @@ def sift_directory(dir, outbasenm):
 
     # Read candidates found in high acceleration searching
     hi_accel_fns = glob.glob(os.path.join(dir, '*ACCEL_50'))
-    hi_accel_cands = read_candidates(hi_accel_fns, track=True)
+    hi_accel_cands = read_candidates(hi_accel_fns, track=True, config=config)
     print("Read %d candidates from %d files" % \
                 (len(hi_accel_cands), len(hi_accel_fns)))
     print("%d candidates passed default rejection" % len(hi_accel_cands))
@@ -1276,8 +3986,9 @@ def sift_directory(dir, outbasenm):
         all_accel_cands.to_file(outbasenm+".accelcands")
     all_accel_cands.write_cand_report(outbasenm+".accelcands.report")
     all_accel_cands.print_cand_summary()
-    all_accel_cands.plot_rejects(usefreqs=True)
-    plt.savefig(outbasenm+".accelcands.rejects.png")
+    # Only saved, so it is drawn straight with Agg
+    fig = all_accel_cands.plot_rejects(usefreqs=True, headless=True)
+    fig.savefig(outbasenm+".accelcands.rejects.png")
     #all_accel_cands.plot_goodcands(usefreqs=False)
     #plt.savefig(outbasenm+".accelcands.goodcands.png")
     all_accel_cands.plot_summary(usefreqs=True)
@@ -1285,69 +3996,28 @@ def sift_directory(dir, outbasenm):
     plt.show()
 
 
-def LogLinScaleFactory(b):
-    class LogLinScale(matplotlib.scale.ScaleBase):
-        name = 'loglin'
-
-        def __init__(self, axis, **kwargs):
-            matplotlib.scale.ScaleBase.__init__(self)
-            self.thresh = kwargs.pop("thresh", 1e-5)
-            if self.thresh <= 0.0:
-                raise ValueError("thresh must be larger than 0")
-
-        def get_transform(self):
-            return self.LogLinTransform(self.thresh)
-
-        def set_default_locators_and_formatters(self, axis):
-            pass
-
-        def limit_range_for_scale(self, vmin, vmax, minpos):
-            return max(vmin, self.thresh), vmax
-
-        class LogLinTransform(matplotlib.transforms.Transform):
-            input_dims = 1
-            output_dims = 1
-            is_separable = True
-            brk = b
-
-            def __init__(self, thresh):
-                matplotlib.transforms.Transform.__init__(self)
-                self.thresh = thresh
+def _plotting():
+    """Import (on first use) and return the sifting_plot module.
+    """
+    try:
+        from . import sifting_plot
+    except ImportError:
+        import sifting_plot
+    return sifting_plot
+
+
+def __getattr__(name):
+    # Names that used to be imported or defined here at import time
+    if name in ("sigma_to_size", "LogLinScaleFactory"):
+        return getattr(_plotting(), name)
+    if name == "candidate_sigma":
+        from presto.presto import candidate_sigma
+        return candidate_sigma
+    if name == "infodata":
+        from presto import infodata
+        return infodata
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
 
-            def transform(self, a):
-                aa = np.ma.masked_where(a<self.thresh, a)
-                if aa.mask.any():
-                    aa[a<self.brk] = np.ma.log10(a[a<self.brk]) - \
-                                        np.log10(self.brk)+self.brk
-                else:
-                    aa[a<self.brk] = np.log10(a[a<self.brk]) - \
-                                        np.log10(self.brk)+self.brk
-                return aa
-
-            def inverted(self):
-                return LogLinScale.InvertedLogLinTransform(self.thresh)
-
-        class InvertedLogLinTransform(matplotlib.transforms.Transform):
-            input_dims = 1
-            output_dims = 1
-            is_separable = True
-            brk = b
-
-            def __init__(self, thresh):
-                matplotlib.transforms.Transform.__init__(self)
-                self.thresh = thresh
-
-            def transform(self, a):
-                aa = a.copy()
-                aa[a<self.brk] = np.ma.power(10, a[a<self.brk]-self.brk + \
-                                                np.log10(self.brk))
-                return aa
-
-            def inverted(self):
-                return LogLinScale.LogLinTransform(self.thresh)
-    return LogLinScale
-
-matplotlib.scale.register_scale(LogLinScaleFactory(1))
 
 def main():
     # Sift candidates in PWD
@@ -0,0 +1,462 @@
+#!/usr/bin/env python
+# Plotting routines of sifting.py. They live in their own module so
+# that sifting (and ACCEL_sift.py) don't pay for importing matplotlib
+# unless a plot is actually made.
+from builtins import zip
+import numpy as np
+import matplotlib
+import matplotlib.pyplot as plt
+
+# Plots of more candidates than this don't draw a marker sized by
+# sigma for every one of them (which takes minutes and a lot of memory
+# for millions of candidates): plot_summary bins them in a 2-D
+# histogram and the other plots draw them as single pixels
+max_scatter_points = 200000
+
+# The columns the plots need
+plot_columns = ['f', 'p', 'DM', 'sigma', 'numharm']
+
+
+def sigma_to_size(sigmas):
+    """Given a numpy array of sigma values, return an array
+        of same size with sizes of markers to plot.
+
+        Inputs:
+            sigmas: Numpy array of sigma values.
+
+        Output:
+            sizes: Numpy array of marker sizes.
+    """
+    # return 8+sigmas**1.7
+    return np.clip(20**(sigmas/6), 5, 400)
+
+
+def new_figure(headless=False, figsize=(10,8)):
+    """Return a new matplotlib figure.
+
+        Inputs:
+            headless: If True, the figure is made without pyplot and
+                drawn by Agg, so no GUI backend is loaded and pyplot
+                doesn't keep the figure. Save it with fig.savefig.
+                (Default: False)
+            figsize: The size of the figure (inches). (Default: 10x8)
+
+        Output:
+            fig: A matplotlib figure instance.
+    """
+    if headless:
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        fig = Figure(figsize=figsize)
+        FigureCanvasAgg(fig)
+    else:
+        fig = plt.figure(figsize=figsize)
+    return fig
+
+
+def cand_columns(cands):
+    """Return the columns of candidates the plots need.
+
+        Inputs:
+            cands: A list of Candidates, or a ColumnarCandlist, whose
+                arrays are used directly.
+
+        Output:
+            cols: A dictionary of arrays, keyed by the names in
+                plot_columns.
+    """
+    data = getattr(cands, 'data', None)
+    if data is not None:
+        return dict((name, np.asarray(data[name], dtype=np.float64)) \
+                        for name in plot_columns)
+    cols = np.array([(c.f, c.p, c.DM, c.sigma, c.numharm) for c in cands],
+                    dtype=np.float64).reshape(-1, len(plot_columns))
+    return dict(zip(plot_columns, cols.T))
+
+
+def cand_groups(candlist):
+    """Return the columns (see cand_columns) of the candidates of a
+        Candlist or ColumnarCandlist, by group: the name of each
+        bad-list, 'good' and 'duplicates'.
+    """
+    goodcands = candlist if hasattr(candlist, 'data') else candlist.cands
+    groups = {'good': cand_columns(goodcands),
+              'duplicates': cand_columns(candlist.duplicates)}
+    for key, cands in candlist.badlists.items():
+        groups[key] = cand_columns(cands)
+    return groups
+
+
+def _concatenate_groups(groups, keys):
+    return dict((name, np.concatenate([groups[key][name] for key in keys] + \
+                                      [np.zeros(0)])) for name in plot_columns)
+
+
+def _loglin(x, inverse=False):
+    # The 'loglin' scale (see LogLinScaleFactory) with its break at 1
+    x = np.asarray(x, dtype=np.float64)
+    if inverse:
+        return np.where(x < 1.0, 10.0**(x - 1.0), x)
+    return np.where(x < 1.0, np.log10(np.maximum(x, 1e-300)) + 1.0, x)
+
+
+def _bin_edges(lo, hi, scale, numbins):
+    """Return the edges of 'numbins' bins between 'lo' and 'hi' that
+        are the same width on an axis of the given scale.
+    """
+    if scale == "log":
+        return np.logspace(np.log10(lo), np.log10(hi), numbins+1)
+    if scale == "loglin":
+        return _loglin(np.linspace(_loglin(lo), _loglin(hi), numbins+1),
+                       inverse=True)
+    return np.linspace(lo, hi, numbins+1)
+
+
+def _format_axes(ax, usefreqs, xdata, dms, short_period, long_period):
+    """Set the scales, limits, ticks and labels of the candidate
+        axes of plot_summary and plot_rejects. 'xdata' and 'dms' are
+        those of all the candidates.
+    """
+    if usefreqs:
+        ax.set_xscale("log")
+        ax.set_xlabel("Freq (Hz)")
+    else:
+        ax.set_xscale("loglin")
+        ax.set_xlabel("Period (s)")
+    mindm = np.min(dms)
+    maxdm = np.max(dms)
+    dmrange = np.ptp(dms)
+
+    # Use log-scale y-axis if max DM > 2000
+    yscale = "log" if maxdm > 2000.0 else "linear"
+    ax.set_yscale(yscale)
+
+    if yscale == "log":
+        ax.set_ylim(1.0, maxdm+0.1*dmrange)
+    else:
+        ax.set_ylim(mindm-0.1*dmrange, maxdm+0.1*dmrange)
+
+    ax.set_ylabel(r"DM (pc cm$^{-3}$)")
+    if not usefreqs:
+        ax.xaxis.set_ticks(np.concatenate((\
+                                    np.logspace(-4,0,4, endpoint=False), \
+                                    np.linspace(1,15,8))))
+        ax.xaxis.set_ticks(np.logspace(-4,0,40), minor=True)
+        ax.xaxis.set_ticklabels([r"10$^{-4}$", r"10$^{-3}$", \
+                    r"10$^{-2}$", r"10$^{-1}$", "1", "3", "5", "7", \
+                    "9", "11", "13", "15"])
+        ax.set_xlim(max(short_period/5.0, np.min(xdata)/5.0), \
+                    min(long_period+0.5, np.max(xdata)+0.5))
+    else:
+        ax.set_xlim(np.min(xdata)/5.0, np.max(xdata)*2.0)
+
+
+def plot_summary(candlist, usefreqs=True, short_period=0.0005, long_period=15.0,
+                 headless=False, max_points=None):
+    """Produce a plot summarizing the sifiting performed.
+
+        Input:
+            candlist: The Candlist (or ColumnarCandlist) to plot.
+            usefreqs: If True, the horizontal axis will use
+                frequency. If False, use period.
+            short_period, long_period: The period range (s)
+                candidates were restricted to.
+            headless: See new_figure. (Default: False)
+            max_points: With more candidates than this, plot a 2-D
+                histogram, each bin coloured by the number of harmonics
+                of its most significant candidate.
+                (Default: max_scatter_points)
+
+        Output:
+            fig: A matplotlib figure instance.
+    """
+    if max_points is None:
+        max_points = max_scatter_points
+    fig = new_figure(headless)
+    ax = fig.add_axes((0.08, 0.18, 0.87, 0.80))
+
+    # Get all candidates and sort by sigma
+    groups = cand_groups(candlist)
+    cols = _concatenate_groups(groups, ['good', 'duplicates'] + \
+                                        list(candlist.badlists))
+    isort = cols['sigma'].argsort()
+    sigmas = cols['sigma'][isort]
+    xdata = cols['f' if usefreqs else 'p'][isort]
+    dms = cols['DM'][isort]
+    lognumharms = np.log2(cols['numharm'][isort])
+
+    # Plot the all candidates
+    if len(sigmas) <= max_points:
+        scatt = ax.scatter(xdata, dms, s=sigma_to_size(sigmas), \
+                           c=lognumharms, cmap="Spectral", \
+                           marker='o', alpha=0.7, zorder=-1)
+    else:
+        _format_axes(ax, usefreqs, xdata, dms, short_period, long_period)
+        xedges = _bin_edges(np.min(xdata), np.max(xdata), ax.get_xscale(), 400)
+        yedges = _bin_edges(max(np.min(dms), 1.0) if ax.get_yscale() == "log" \
+                                else np.min(dms), \
+                            max(np.max(dms), np.min(dms)+1.0), \
+                            ax.get_yscale(), 300)
+        ix = np.clip(np.searchsorted(xedges, xdata, 'right') - 1, 0, 399)
+        iy = np.searchsorted(yedges, dms, 'right') - 1
+        inside = (iy >= 0) & (dms <= yedges[-1])
+        ibin = (np.minimum(iy, 299)*400 + ix)[inside]
+        # The last (i.e. most significant) candidate of every bin
+        ibin, ilast = np.unique(ibin[::-1], return_index=True)
+        image = np.ma.masked_all(300*400)
+        image[ibin] = lognumharms[inside][::-1][ilast]
+        scatt = ax.pcolormesh(xedges, yedges, image.reshape(300, 400), \
+                              cmap="Spectral", vmin=np.min(lognumharms), \
+                              vmax=np.max(lognumharms), zorder=-1, \
+                              rasterized=True)
+
+    # Add colorbar
+    fmtr = matplotlib.ticker.FuncFormatter(lambda x, pos: "%d" % 2**x)
+    cax = fig.add_axes((0.18, 0.06, 0.67, 0.035))
+    cb = fig.colorbar(scatt, cax=cax, ticks=(0,1,2,3,4), format=fmtr, \
+                        orientation="horizontal")
+    cb.set_label("Num harmonics summed")
+
+    _format_axes(ax, usefreqs, xdata, dms, short_period, long_period)
+    ax.format_coord = lambda x,y: "x=%g, y=%g" % (x,y)
+    return fig
+
+def plot_rejects(candlist, usefreqs=True, short_period=0.0005, long_period=15.0,
+                 headless=False, max_points=None):
+    """Produce a plot showing why candidates were rejected by
+        the sifiting performed.
+
+        Input:
+            candlist: The Candlist (or ColumnarCandlist) to plot.
+            usefreqs: If True, the horizontal axis will use
+                frequency. If False, use period.
+            short_period, long_period: The period range (s)
+                candidates were restricted to.
+            headless: See new_figure. (Default: False)
+            max_points: With more candidates than this, draw them as
+                single pixels (the good candidates too, if there are
+                more of them than this). (Default: max_scatter_points)
+
+        Output:
+            fig: A matplotlib figure instance.
+    """
+    if max_points is None:
+        max_points = max_scatter_points
+    fig = new_figure(headless)
+    ax = fig.add_axes((0.08, 0.18, 0.87, 0.80))
+
+    # Plot bad candidates
+    groups = cand_groups(candlist)
+    keys = ['knownbirds', 'longperiod', 'shortperiod', 'threshold', \
+            'harmpowcutoff', 'rogueharmpow', 'harmonic', 'dmproblem', \
+            'good', 'duplicates']
+    labels = ['Known birdires', 'Long period', 'Short period', \
+                'Threshold', 'Harm power cutoff', 'Rogue harm power', \
+                'Harmonic cand', 'DM problem', 'Good cands', 'Hits']
+    colours = ['#FF0000', '#800000', '#008000', '#00FF00', \
+                '#00FFFF', '#0000FF', '#FF00FF', '#800080', 'r', 'k']
+    markers = ['o', 'o', 'o', 'o', 'o', 'o', 'o', 'o', 'x', 's']
+    zorders = [-2, -2, -2, -2, -2, -2, -2, -2, 0, 0]
+    sizes = [50, 50, 50, 50, 50, 50, 50, 50, 100, 10]
+    fixedsizes = [0, 0, 0, 0, 0, 0, 0, 0, 1, 1]
+    lws = [1,1,1,1,1,1,1,1,2,1]
+    numpoints = sum(len(groups[key]['sigma']) for key in keys)
+    handles = []
+    for key, colour, marker, zorder, size, fixedsize, lw in \
+            zip(keys, colours, markers, zorders, sizes, fixedsizes, lws):
+        cols = groups[key]
+        if len(cols['sigma']):
+            isort = cols['sigma'].argsort()
+            sigmas = cols['sigma'][isort]
+            xdata = cols['f' if usefreqs else 'p'][isort]
+            dms = cols['DM'][isort]
+
+            # Plot the candidates
+            if numpoints > max_points and (key != 'good' or \
+                                            len(sigmas) > max_points):
+                ax.plot(xdata, dms, ',', color=colour, zorder=zorder, \
+                        rasterized=True)
+            elif fixedsize:
+                ax.scatter(xdata, dms, s=size, lw=lw, \
+                           c=colour, marker=marker, alpha=0.7, zorder=zorder)
+            else:
+                ax.scatter(xdata, dms, s=sigma_to_size(sigmas), lw=lw, \
+                           c=colour, marker=marker, alpha=0.7, zorder=zorder)
+        handles.append(ax.scatter([], [], s=size, c=colour, \
+                                  marker=marker, alpha=0.7))
+
+    fig.legend(handles, labels, loc='lower center', \
+                    prop={'size':'x-small'}, ncol=4)
+
+    allcols = _concatenate_groups(groups, ['good', 'duplicates'] + \
+                                           list(candlist.badlists))
+    _format_axes(ax, usefreqs, allcols['f' if usefreqs else 'p'], \
+                 allcols['DM'], short_period, long_period)
+    return fig
+
+def plot_goodcands(candlist, usefreqs=True, short_period=0.0005, long_period=15.0,
+                   headless=False, max_points=None):
+    """Produce a plot highlighting good candidates as selected by
+        the sifiting performed.
+
+        Input:
+            candlist: The Candlist to plot.
+            usefreqs: If True, the horizontal axis will use
+                frequency. If False, use period.
+            short_period, long_period: The period range (s)
+                candidates were restricted to.
+            headless: See new_figure. (Default: False)
+            max_points: With more hits than this, draw them as
+                single pixels. (Default: max_scatter_points)
+
+        Output:
+            fig: A matplotlib figure instance.
+    """
+    if max_points is None:
+        max_points = max_scatter_points
+    fig = new_figure(headless)
+    ax = fig.add_axes((0.08, 0.18, 0.87, 0.80))
+
+    # Plot candidates
+    labels = []
+    candlists = []
+    for key in candlist.badlists:
+        labels.append(key.title())
+        candlists.append(candlist.badlists[key])
+    candlists.append(candlist.cands)
+    labels.append('Good cands')
+    colours = ['#FF0000', '#800000', '#008000', '#00FF00', \
+                '#00FFFF', '#0000FF', '#FF00FF', '#800080', 'r']
+    markers = ['o', 'o', 'o', 'o', 'o', 'o', 'o', 'o', 'o']
+    zorders = [-2, -2, -2, -2, -2, -2, -2, -2, 0]
+    sizes = [10, 10, 10, 10, 10, 10, 10, 10, 50]
+    fixedsizes = [1, 1, 1, 1, 1, 1, 1, 1, 0]
+    lws = [1,1,1,1,1,1,1,1,1,1]
+    ecs = ['none', 'none', 'none', 'none', 'none', 'none', 'none', 'none', 'k']
+    alphas = [1,1,1,1,1,1,1,1,0.7]
+    # Every hit of every candidate is plotted
+    hitcols = []
+    for cands in candlists:
+        if not len(cands):
+            hitcols.append((np.zeros(0), np.zeros(0), np.zeros(0)))
+            continue
+        hits = np.concatenate([c.hits.data for c in cands])
+        xvals = np.array([c.f if usefreqs else c.p for c in cands])
+        numhits = np.array([len(c.hits) for c in cands], dtype=np.int64)
+        hitcols.append((hits['sigma'], hits['DM'], np.repeat(xvals, numhits)))
+    numpoints = sum(len(sigmas) for sigmas, dms, xdata in hitcols)
+    handles = []
+    for (sigmas, dms, xdata), colour, marker, zorder, size, fixedsize, lw, alpha, ec in \
+            zip(hitcols, colours, markers, zorders, sizes, fixedsizes, lws, alphas, ecs):
+        isort = sigmas.argsort()
+        sigmas = sigmas[isort]
+        dms = dms[isort]
+        xdata = xdata[isort]
+        if usefreqs:
+            xlabel = "Freq (Hz)"
+            xscale = "log"
+        else:
+            xlabel = "Period (s)"
+            xscale = "loglin"
+
+        # Plot the candidates
+        if numpoints > max_points:
+            ax.plot(xdata, dms, ',', color=colour, zorder=zorder, \
+                    rasterized=True)
+        elif fixedsize:
+            ax.scatter(xdata, dms, s=size, lw=lw, edgecolors=ec, \
+                       c=colour, marker=marker, alpha=alpha, zorder=zorder)
+        else:
+            ax.scatter(xdata, dms, s=sigma_to_size(sigmas), lw=lw, edgecolors=ec, \
+                       c=colour, marker=marker, alpha=alpha, zorder=zorder)
+        handles.append(ax.scatter([], [], s=size, c=colour, \
+                                  marker=marker, alpha=0.7))
+
+    fig.legend(handles, labels, loc='lower center', \
+                    prop={'size':'x-small'}, ncol=4)
+
+    ax.set_xscale(xscale)
+    ax.set_xlabel(xlabel)
+    mindm = np.min(dms)
+    maxdm = np.max(dms)
+    dmrange = np.ptp(dms)
+    ax.set_ylim(mindm-0.1*dmrange, maxdm+0.1*dmrange)
+    ax.set_ylabel(r"DM (pc cm$^{-3}$)")
+    if not usefreqs:
+        ax.xaxis.set_ticks(np.concatenate((\
+                                    np.logspace(-4,0,4, endpoint=False), \
+                                    np.linspace(1,15,8))))
+        ax.xaxis.set_ticks(np.logspace(-4,0,40), minor=True)
+        ax.xaxis.set_ticklabels([r"10$^{-4}$", r"10$^{-3}$", \
+                    r"10$^{-2}$", r"10$^{-1}$", "1", "3", "5", "7", \
+                    "9", "11", "13", "15"])
+        ax.set_xlim(max(short_period/5.0, min(xdata)/5.0), \
+                    min(long_period+0.5, max(xdata)+0.5))
+    return fig
+
+
+def LogLinScaleFactory(b):
+    class LogLinScale(matplotlib.scale.ScaleBase):
+        name = 'loglin'
+
+        def __init__(self, axis, **kwargs):
+            matplotlib.scale.ScaleBase.__init__(self, axis)
+            self.thresh = kwargs.pop("thresh", 1e-5)
+            if self.thresh <= 0.0:
+                raise ValueError("thresh must be larger than 0")
+
+        def get_transform(self):
+            return self.LogLinTransform(self.thresh)
+
+        def set_default_locators_and_formatters(self, axis):
+            pass
+
+        def limit_range_for_scale(self, vmin, vmax, minpos):
+            return max(vmin, self.thresh), vmax
+
+        class LogLinTransform(matplotlib.transforms.Transform):
+            input_dims = 1
+            output_dims = 1
+            is_separable = True
+            brk = b
+
+            def __init__(self, thresh):
+                matplotlib.transforms.Transform.__init__(self)
+                self.thresh = thresh
+
+            def transform(self, a):
+                a = np.asarray(a, dtype=np.float64)
+                aa = np.ma.masked_where(a<self.thresh, a)
+                if aa.mask.any():
+                    aa[a<self.brk] = np.ma.log10(a[a<self.brk]) - \
+                                        np.log10(self.brk)+self.brk
+                else:
+                    aa[a<self.brk] = np.log10(a[a<self.brk]) - \
+                                        np.log10(self.brk)+self.brk
+                return aa
+
+            def inverted(self):
+                return LogLinScale.InvertedLogLinTransform(self.thresh)
+
+        class InvertedLogLinTransform(matplotlib.transforms.Transform):
+            input_dims = 1
+            output_dims = 1
+            is_separable = True
+            brk = b
+
+            def __init__(self, thresh):
+                matplotlib.transforms.Transform.__init__(self)
+                self.thresh = thresh
+
+            def transform(self, a):
+                a = np.asarray(a, dtype=np.float64)
+                aa = a.copy()
+                aa[a<self.brk] = np.ma.power(10, a[a<self.brk]-self.brk + \
+                                                np.log10(self.brk))
+                return aa
+
+            def inverted(self):
+                return LogLinScale.LogLinTransform(self.thresh)
+    return LogLinScale
+
+matplotlib.scale.register_scale(LogLinScaleFactory(1))